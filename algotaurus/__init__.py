@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+AlgoTaurus package
+==================
+The modules import each other by their names, so they can be run as scripts from this directory (e.g. python
+evaluate.py). When the package is installed (e.g. the algotaurus.algotaurus:AlgoTaurusGui entry point), the
+directory is added to the module search path, and the package provides the names of the algotaurus module, which
+the other modules use as algotaurus.Labyrinth, algotaurus._ etc.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import os
+import sys
+
+package_dir = os.path.dirname(os.path.abspath(__file__))
+if package_dir not in sys.path:
+    sys.path.append(package_dir)
+
+from .algotaurus import *
+from .algotaurus import _
@@ -10,15 +10,15 @@ Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
 AlgoTaurus is distributed under the terms of the GNU General Public License 3.
 """
 
-import random
 import time
 import numpy as np
-import sys
 import os
 import appdirs
 import configparser
 import gettext
 
+import generators
+
 __version__  = '1.2beta'
 copyright_years = '2015-2021'
 
@@ -41,7 +41,9 @@ _ = t.gettext
 [_('left'), _('right'), _('step'), _('wall?'), _('exit?'), _('quit'), _('goto')]  # for the generate_pot script
 local_commands = [_(command) for command in ['left', 'right', 'step', 'wall?', 'exit?', 'quit', 'goto']]
 
-labyr_type_names = [_('Four walls'), _('Depth first')]
+labyr_type_names = [_('Four walls'), _('Depth first'), _('Binary tree'), _('Sidewinder'), _('Kruskal'),
+                    _('Kruskal with loops')]
+labyr_sizes = [51, 101, 251, 501, 1001]  # fixed labyrinth sizes in the GUI besides fitting to the window
 
 
 class Labyrinth:
@@ -57,191 +59,351 @@ class Labyrinth:
         2: exit
         """
 
-        # x and y should be odd numbers
-        x = x if x % 2 else x-1
-        y = y if y % 2 else y-1
-        
-        # Create exits        
-        self.labyr = np.ones((y+4, x+4))*2
-        self.labyr[2:-2, 2:-2] = 0
-
-        if labyr_type == 0:
-            #self.labyr[-3, -3] = 1  # TODO on GUI (not sure about TUI) these are y and x coordinates, not x and y
-            self.labyr[5:-5, 3] = 1
-            self.labyr[5:-5, -4] = 1
-            self.labyr[3, 5:-5] = 1
-            self.labyr[-4, 5:-5] = 1
-        elif labyr_type == 1:
-            def find_new_cell(current_cell):
-                """ Depth first search algorithm
-                http://en.wikipedia.org/wiki/Maze_generation_algorithm
-                This one is building the wall, not carving the path.
-                """
-                self.labyr[tuple(current_cell)] = 1
-                neighb_cells = [[-2, 0], [2, 0], [0, 2], [0, -2]]
-                random.shuffle(neighb_cells)
-                for pos in neighb_cells:
-                    next_cell = current_cell+pos
-                    if self.labyr[tuple(next_cell)] == 0:
-                        self.labyr[tuple((next_cell+current_cell)//2)] = 1
-                        find_new_cell(next_cell)
-                return
-            find_new_cell(np.array([2, 2]))
+        self.labyr = generators.labyrinth(x, y, labyr_type).astype(float)
+        self.build_tables()
+
+    @classmethod
+    def from_array(cls, labyr):
+        """Create a Labyrinth object of an existing labyrinth array, e.g. of generators.generate_labyrinths().
+        The array is copied, so the robot does not modify it.
+        """
+        lab = cls.__new__(cls)
+        lab.labyr = np.array(labyr, dtype=float)
+        lab.build_tables()
+        return lab
+
+    def build_tables(self):
+        """Precompute the sensor lookup tables of the labyrinth.
+        Call it again, if the labyrinth array is modified.
+        offsets: flat index offsets of the right, down, left and up neighbours
+        wall_mask, exit_mask: for every square (flat index), bit d is set if the neighbour in direction d
+        is wall or exit
+        """
+        labyr = np.where(self.labyr < 10, self.labyr, 0).ravel()  # robot stands on a path
+        cols = self.labyr.shape[1]
+        self.offsets = (1, cols, -1, -cols)
+        self.wall_mask = np.zeros(labyr.size, dtype=np.uint8)
+        self.exit_mask = np.zeros(labyr.size, dtype=np.uint8)
+        for direction, offset in enumerate(self.offsets):
+            neighb = np.roll(labyr, -offset)  # the border squares are exits, the robot never stands there
+            self.wall_mask |= (neighb == 1).astype(np.uint8) << direction
+            self.exit_mask |= (neighb == 2).astype(np.uint8) << direction
         
 
 class Robot:
     """Create a robot in the labyrinth.
     The position and the state (direction) of the robot is stored in the
     labyrinth numpy array.
+    The position is also stored as a flat index of the labyrinth array, so the commands use only
+    the lookup tables of the labyrinth.
 
     Operate the robot with various commands.
     """
-    def __init__(self, labyr):
+    def __init__(self, labyr, start=None):
         """labyr: Labyrinth object
+        start: (flat index, direction) of the robot, e.g. of generators.generate_labyrinths(),
+        by default a random position and direction
         """
         self.labyr = labyr.labyr
-        
-        # Place the robot somewhere in the middle
-        while True:
-            self.pos = np.array([self.labyr.shape[0]//2 + random.choice([-1, -0, 1]),
-                                 self.labyr.shape[1]//2 + random.choice([-1, -0, 1])])
-            if self.labyr[tuple(self.pos)] == 0:
-                break
-        self.previous_pos = self.pos[:]
-
-        # Create a random direction
-        self.dir = random.choice(range(4))
-        self.dir_vectors = {0: [0, 1], 1: [1, 0], 2: [0, -1], 3: [-1, 0]}  # right, down, left, up
-        self.facing_pos = self.pos+self.dir_vectors[self.dir]
+        self.flat_labyr = self.labyr.reshape(-1)  # view of the labyrinth array
+        self.cols = self.labyr.shape[1]
+        self.offsets = labyr.offsets
+        # bytes are faster to index than numpy arrays
+        self.walls = labyr.wall_mask.tobytes()
+        self.exits = labyr.exit_mask.tobytes()
+
+        if start is None:
+            # Place the robot somewhere in the middle with a random direction
+            start = generators.start_pose(self.labyr)
+        self.index, self.dir = int(start[0]), int(start[1])  # dir: right, down, left, up
+        self.previous_index = self.index
+        self.moves = 0  # number of steps made
         self.update_robot()
 
+    @property
+    def pos(self):
+        """(row, col) position of the robot"""
+        return divmod(self.index, self.cols)
+
     def update_robot(self):
         """Update the robot in the labyr np array.
         """
-        self.labyr[tuple(self.previous_pos)] = 0
-        self.labyr[tuple(self.pos)] = self.dir+10  # add 10 to have 10-13 codes for the robot
+        self.flat_labyr[self.previous_index] = 0
+        self.flat_labyr[self.index] = self.dir+10  # add 10 to have 10-13 codes for the robot
     
     ### Commands ###
     
     def step(self):
-        if self.labyr[tuple(self.facing_pos)] == 1:
+        if self.walls[self.index] >> self.dir & 1:
             return _('Bad news. AlgoTaurus run into wall.')
-        elif self.labyr[tuple(self.facing_pos)] == 2:
+        elif self.exits[self.index] >> self.dir & 1:
             return _('Bad news. AlgoTaurus stepped into exit.')
         else:
-            self.previous_pos = self.pos[:]
-            self.pos = self.facing_pos
-            self.facing_pos = self.pos+self.dir_vectors[self.dir]
+            self.previous_index = self.index
+            self.index += self.offsets[self.dir]
+            self.moves += 1
         self.update_robot()
         return 'go on'
         
     def right(self):
         self.dir = (self.dir+1) % 4
-        self.facing_pos = self.pos+self.dir_vectors[self.dir]
         self.update_robot()
         
     def left(self):
         self.dir = (self.dir-1) % 4
-        self.facing_pos = self.pos+self.dir_vectors[self.dir]
         self.update_robot()
     
     def robot_quit(self):
-        if self.labyr[tuple(self.facing_pos)] == 2:
+        if self.exits[self.index] >> self.dir & 1:
             return _('Congratulations! AlgoTaurus successfully reached the exit.')
         else:
             return _('Bad news. AlgoTaurus was not in the exit yet.')
     
     def wall(self):
-        return True if self.labyr[tuple(self.facing_pos)] == 1 else False
+        return self.walls[self.index] >> self.dir & 1 == 1
         
     def robot_exit(self):
-        return True if self.labyr[tuple(self.facing_pos)] == 2 else False
+        return self.exits[self.index] >> self.dir & 1 == 1
+
+    ### State ###
+
+    def snapshot(self):
+        """returns: the state of the robot: (flat index of the position, dir, moves)"""
+        return self.index, self.dir, self.moves
+
+    def restore(self, state):
+        """Restore a state of the robot returned by snapshot()"""
+        self.previous_index = self.index
+        self.index, self.dir, self.moves = state
+        self.update_robot()
+
+
+def compile_code(code):
+    """Compile the code to a list of instructions, the list index is the line number.
+    code: multi line string
+
+    returns: list of instruction tuples, the first item is the command:
+    ('empty',), ('step',), ('left',), ('right',), ('quit',), ('goto', line), ('wall?', yes_line, no_line),
+    ('exit?', yes_line, no_line), ('error', message)
+    Syntax errors are reported only when the erroneous line is executed.
+    """
+    commands = dict(zip(local_commands, ['left', 'right', 'step', 'wall?', 'exit?', 'quit', 'goto']))
+    program = [('empty',)]  # line 0
+    for line in code.splitlines():
+        # Skip empty line
+        if line.rstrip() == '':
+            program.append(('empty',))
+            continue
+
+        command = line.split(' ')[0].lower()
+        params = line.split(' ')[1:]
+
+        # Check if command is correct
+        if not (command in local_commands):
+            program.append(('error', _('Syntax error. Unknown command.')))
+            continue
+        command = commands[command]
+        if command in ['step', 'left', 'right', 'quit']:
+            program.append((command,))
+        elif command == 'wall?':
+            if len(params) < 2:
+                program.append(('error', _('Syntax error. Wall test needs two parameters.')))
+                continue
+            try:
+                program.append((command, int(params[0]), int(params[1])))
+            except ValueError:
+                program.append(('error', _('Syntax error. Wall test needs two numbers.')))
+        elif command == 'exit?':
+            if len(params) < 2:
+                program.append(('error', _('Syntax error. Exit test needs two parameters.')))
+                continue
+            try:
+                program.append((command, int(params[0]), int(params[1])))
+            except ValueError:
+                program.append(('error', _('Syntax error. Exit test needs two numbers.')))
+        elif command == 'goto':
+            if len(params) == 0:
+                program.append(('error', _('Syntax error. Goto command needs a parameter.')))
+                continue
+            try:
+                program.append((command, int(params[0])))
+            except ValueError:
+                program.append(('error', _('Syntax error. Goto command needs a number.')))
+    return program
 
 
 class Script:
     """Interpret the script.
     """
-    def __init__(self, code, robot, max_line=20):
+    def __init__(self, code, robot, max_line=20, recorder=None):
         """
         code: multi line string
         robot: robot object
         max line: maximum length of the code
+        recorder: optional runtrace.TraceRecorder object to record the run
         """
         self.code = code.splitlines()
         self.code.insert(0, '')  # list index is the row number now
+        self.program = compile_code(code)
         self.robot = robot
         self.current_line = 1
         self.max_line = max_line
-        
+        self.recorder = recorder
+        self.steps = 0  # number of executed lines
+
+    def snapshot(self):
+        """returns: the state of the run: (current_line, position index, dir, moves, steps)
+        The labyrinth does not change during the run, so it is not part of the state.
+        """
+        return (self.current_line,) + self.robot.snapshot() + (self.steps,)
+
+    def restore(self, state):
+        """Restore a state of the run returned by snapshot()"""
+        self.current_line = state[0]
+        self.robot.restore(state[1:4])
+        self.steps = state[4]
+
     def execute_command(self):
         """Execute a single line.
         """
+        self.steps += 1
+        result = self.run_line()
+        if self.recorder is not None:
+            self.recorder.record(self)
+        return result
+
+    def run_line(self):
+        """Run the compiled instruction of the current line.
+        Lines outside of the code are empty lines.
+        """
         
         # Check if we reached the end without a solution
         if self.current_line > self.max_line:
             return _('Bad news. Code ended.')
 
-        # Skip empty line
-        if self.code[self.current_line].rstrip() == '':
-            self.current_line += 1
-            return 'go on'
-
-        command = self.code[self.current_line].split(' ')[0].lower()
-        params = self.code[self.current_line].split(' ')[1:]
+        if 0 < self.current_line < len(self.program):
+            instruction = self.program[self.current_line]
+        else:
+            instruction = ('empty',)
+        command = instruction[0]
 
-        # Check if command is correct
-        if not (command in local_commands):
-            return _('Syntax error. Unknown command.')
-        
         # Run the command
-        if command == _('step'):
+        if command == 'step':
             self.current_line += 1
             return self.robot.step()
-        elif command == _('right'):
+        elif command == 'wall?':
+            self.current_line = instruction[1] if self.robot.wall() else instruction[2]
+            return 'go on'
+        elif command == 'exit?':
+            self.current_line = instruction[1] if self.robot.robot_exit() else instruction[2]
+            return 'go on'
+        elif command == 'goto':
+            self.current_line = instruction[1]
+            return 'go on'
+        elif command == 'right':
             self.current_line += 1
             self.robot.right()
             return 'go on'
-        elif command == _('left'):
+        elif command == 'left':
             self.current_line += 1
             self.robot.left()
             return 'go on'
-        elif command == _('wall?'):
-            if len(params) < 2:
-                return _('Syntax error. Wall test needs two parameters.')
-            try:
-                yes_line = int(params[0])
-                no_line = int(params[1])
-            except:
-                return _('Syntax error. Wall test needs two numbers.')
-            self.current_line = yes_line if self.robot.wall() else no_line
-            return 'go on'
-        elif command == _('exit?'):
-            if len(params) < 2:
-                return _('Syntax error. Exit test needs two parameters.')
-            try:
-                yes_line = int(params[0])
-                no_line = int(params[1])
-            except:
-                return _('Syntax error. Exit test needs two numbers.')
-            self.current_line = yes_line if self.robot.robot_exit() else no_line
-            return 'go on'
-        elif command == _('quit'):
+        elif command == 'quit':
             return self.robot.robot_quit()
-        elif command == _('goto'):
-            if len(params) == 0:
-                return _('Syntax error. Goto command needs a parameter.')
-            try:
-                self.current_line = int(params[0])
-            except:
-                return _('Syntax error. Goto command needs a number.')
+        elif command == 'empty':
+            self.current_line += 1
             return 'go on'
+        else:  # syntax error
+            return instruction[1]
+
+
+class History:
+    """Ring buffer of the recent states of a script to step back in the run.
+    The states are stored in a preallocated array, so the memory use does not grow with the length of the run.
+    """
+    def __init__(self, script, size=100000):
+        """script: Script object
+        size: number of states kept
+        """
+        self.script = script
+        self.states = np.zeros((size, 5), dtype=np.int64)
+        self.end = 0  # number of states stored so far
+        self.count = 0  # number of states available
+
+    def execute_command(self):
+        """Store the state and execute a single line of the script."""
+        self.states[self.end % len(self.states)] = self.script.snapshot()
+        self.end += 1
+        self.count = min(self.count+1, len(self.states))
+        return self.script.execute_command()
+
+    def clear(self):
+        """Forget the stored states, e.g. after lines were run without the history"""
+        self.count = 0
+
+    def step_back(self):
+        """Restore the state before the last executed line.
+        returns: False if there is no stored state
+        """
+        if self.count == 0:
+            return False
+        self.end -= 1
+        self.count -= 1
+        self.script.restore(tuple(int(i) for i in self.states[self.end % len(self.states)]))
+        return True
+
+    def run_back_to_line(self, line):
+        """Restore the last state before line was executed.
+        returns: False if no such state is stored, the state is not changed then
+        """
+        lines = self.states[np.arange(self.end-self.count, self.end) % len(self.states), 0]
+        found = np.flatnonzero(lines == line)
+        if len(found) == 0:
+            return False
+        # Drop the newer states, and restore the found one
+        self.end -= self.count - (found[-1]+1)
+        self.count = found[-1]+1
+        return self.step_back()
+
+
+class StepScheduler:
+    """Schedule the steps of a continuous run.
+    The run speed depends on the interval, not on the time of the displaying: if the steps are late, the due steps
+    are run together.
+    """
+    def __init__(self, interval, max_batch=10000):
+        """interval: time between the steps in seconds
+        max_batch: maximum number of steps run together, so the user interface stays responsive
+        """
+        self.interval = interval
+        self.max_batch = max_batch
+        self.start()
+
+    def start(self):
+        self.next_time = time.monotonic()
+
+    def timeout(self):
+        """returns: seconds until the next step is due"""
+        return max(0.0, self.next_time - time.monotonic())
+
+    def due(self):
+        """returns: number of steps due now"""
+        now = time.monotonic()
+        if now < self.next_time:
+            return 0
+        steps = min(self.max_batch, 1 + int((now-self.next_time) / self.interval))
+        self.next_time = max(self.next_time + steps*self.interval, now - self.interval)  # do not catch up forever
+        return steps
 
 
 class AlgoTaurusTui:
     """Text UI for the AlgoTaurus game.
+    Parameters:
+    record: trace file to record the runs into (the last run is kept)
+    replay: trace file to replay instead of editing and running code
     """
 
-    def __init__(self):
+    def __init__(self, record=None, replay=None):
         try:
             import curses
             import curses.textpad
@@ -296,26 +458,74 @@ class AlgoTaurusTui:
         self.command_win.refresh()
         self.command_win.keypad(True)
 
-        self.main_loop()
+        self.record = record
+        if replay:
+            from runtrace import Trace
+            self.replay_loop(Trace.load(replay))
+        else:
+            self.main_loop()
+
+        curses.echo()
+        curses.curs_set(1)
+        curses.endwin()
 
-    def display_labyr(self):
+    def display_labyr(self, labyr):
         labyr_char = {0: ' ', 1: '0', 2: '.', 10: '>', 11: 'v', 12: '<', 13: '^'}
         # FIXME is it possible to use unicode chars?
 
         # Create string
-        labyr_str = ''.join([''.join([labyr_char[c] for c in row[1:-1]])+'\n' for row in self.labyr.labyr[1:-1]])
+        labyr_str = ''.join([''.join([labyr_char[c] for c in row[1:-1]])+'\n' for row in labyr[1:-1]])
         self.labyr_win.addstr(0, 0, labyr_str[:-1])
         self.labyr_win.refresh()        
     
+    def wait_key(self, timeout=None):
+        """Wait for a key press without using the processor.
+        timeout: maximum waiting time in seconds, None to wait until a key is pressed
+
+        returns: the key or None, if no key was pressed
+        """
+        self.command_win.timeout(-1 if timeout is None else int(timeout*1000))
+        try:
+            return self.command_win.getkey()
+        except self.curses.error:
+            return None
+
+    def show_current_line(self, line):
+        """Mark the current line with > and the lines with breakpoints with *"""
+        self.edit_current_win.erase()
+        for mark_line, mark in [(break_line, '*') for break_line in self.debugger.lines] + [(line, '>')]:
+            if 0 < mark_line <= self.maxy-7:
+                self.edit_current_win.insstr(mark_line-1, 0, mark)  # insstr can write the last square
+        self.edit_current_win.refresh()
+
+    def show_watches(self):
+        """Show the values of the watch expressions after the mode"""
+        text = '  '.join('%s=%s' % value for value in self.debugger.watch_values())
+        self.command_win.addstr(3, 14, text[:self.maxx-16].ljust(self.maxx-16))
+        self.command_win.refresh()
+
+    def prompt(self, text):
+        """Read a line of text in the command window"""
+        self.command_win.addstr(3, 1, text.ljust(self.maxx-3))
+        self.command_win.timeout(-1)
+        self.curses.echo()
+        self.curses.curs_set(1)
+        answer = self.command_win.getstr(3, 1+len(text), self.maxx-4-len(text)).decode('utf-8', 'replace')
+        self.curses.noecho()
+        self.curses.curs_set(0)
+        return answer.strip()
+
     def main_loop(self):
         curses = self.curses
 
-        run_timer = 0.0005
+        scheduler = StepScheduler(0.001)
+        from debugger import Debugger
+        self.debugger = Debugger()  # breakpoints and watch expressions, kept for the next runs
 
         edit_help = 'Ctrl+G: Execute code   Ctrl+O: Insert line'
         edit_help_2 = 'Ctrl+K: Delete line (at the beginning of the line)'
-        run_help = 'F5:Run   F6:Step   F7:Stop   +:Faster run   -:Slower run'
-        run_help_2 = 'F10: Exit AlgoTaurus'
+        run_help = 'F4:Run to breakpoint  F5:Run  F6:Step  F7:Stop  +:Faster  -:Slower'
+        run_help_2 = 'F8:Step back  F9:Run back to line  F10:Exit  b:Breakpoint  w:Watch'
         command_help = '''Help AlgoTaurus to find the exit.
 
 Available commands:
@@ -349,47 +559,105 @@ GOTO x     continue with line x'''
             # Run the code
             self.labyr = Labyrinth(y=self.maxy-9, x=self.maxx-23)
             self.robot = Robot(self.labyr)
-            self.script = Script(edited_text, self.robot, max_line=self.maxy-7)
-            self.display_labyr()
+            if self.record:
+                from runtrace import TraceRecorder
+                recorder = TraceRecorder(self.robot, edited_text)
+            else:
+                recorder = None
+            self.script = Script(edited_text, self.robot, max_line=self.maxy-7, recorder=recorder)
+            self.debugger.attach(self.script)
+            # Stepping back would break the recorded trace
+            history = History(self.script) if recorder is None else None
+            self.display_labyr(self.labyr.labyr)
             self.command_win.erase()
             self.command_win.addstr(1, 1, run_help)
             self.command_win.addstr(2, 1, run_help_2)
             self.command_win.refresh()
-            self.command_win.nodelay(True)
     
             result = 'go on'
             mode = 'step'
             while (result == 'go on') or (mode == 'stop'):
-                try:
-                    user_key = self.command_win.getkey()
-                except:
-                    user_key = None
+                # Sleep until a key is pressed or the next step is due
+                user_key = self.wait_key({'run': scheduler.timeout(), 'wait': None}.get(mode, 0))
                 if user_key is None:
                     pass
                 elif user_key == 'KEY_F(5)':
                     mode = 'run'
+                    scheduler.start()
                 elif user_key == 'KEY_F(6)':
                     mode = 'step'
                 elif user_key == 'KEY_F(7)':
                     mode = 'stop'
+                elif user_key == 'KEY_F(8)' and history is not None:
+                    mode = 'back'
+                elif user_key == 'KEY_F(9)' and history is not None:
+                    text = self.prompt('Run back to line: ')
+                    if text.isdigit():
+                        back_line = int(text)
+                        mode = 'run back'
+                    else:
+                        if text:
+                            self.command_win.addstr(3, 1, ('Not a line number: %s' % text)[:self.maxx-3]
+                                                    .ljust(self.maxx-3))
+                        self.show_current_line(self.script.current_line)
                 elif user_key == 'KEY_F(10)':
                     mode = 'quit'
+                elif user_key == 'KEY_F(4)':
+                    mode = 'fast'
+                elif user_key in ['b', 'w']:
+                    # Add a breakpoint or a watch expression, see debugger.py
+                    text = self.prompt('Breakpoint: ' if user_key == 'b' else 'Watch: ')
+                    try:
+                        if text and user_key == 'b':
+                            self.debugger.add(text)
+                        elif text:
+                            self.debugger.add_watch(text)
+                    except ValueError as error:
+                        self.command_win.addstr(3, 1, str(error)[:self.maxx-3].ljust(self.maxx-3))
+                    self.show_current_line(self.script.current_line)
                 elif user_key == '+':
-                    run_timer //= 2
+                    scheduler.interval /= 2
                 elif user_key == '-':
-                    run_timer *= 2
+                    scheduler.interval *= 2
                 if mode != 'wait':
                     self.command_win.addstr(3, 1, 'Mode: '+mode.ljust(5).capitalize())
                     self.command_win.refresh()
-                
-                if mode in ['run', 'step']:
-                    self.edit_current_win.erase()
-                    self.edit_current_win.addstr(self.script.current_line-1, 0, '>')
-                    self.edit_current_win.refresh()
-                    time.sleep(run_timer)
-                    result = self.script.execute_command()
-                    self.display_labyr()
-                    time.sleep(run_timer)
+
+                if mode == 'fast':
+                    # Run without displaying until a breakpoint, the keys are checked between the chunks. The lines
+                    # are not stored in the history, so stepping back could only jump to the state before the run.
+                    result = self.debugger.run()
+                    if history is not None:
+                        history.clear()
+                    if result != 'go on':
+                        self.show_current_line(self.script.current_line)
+                        self.display_labyr(self.labyr.labyr)
+                        self.show_watches()
+                    if result == 'break':
+                        result = 'go on'
+                        mode = 'wait'
+                steps = scheduler.due() if mode == 'run' else 1 if mode == 'step' else 0
+                if steps:
+                    # Run the due steps, and display only the last one
+                    for i in range(steps):
+                        line = self.script.current_line
+                        result = (history or self.script).execute_command()
+                        if result != 'go on':
+                            break
+                    self.show_current_line(line)
+                    self.display_labyr(self.labyr.labyr)
+                    if mode == 'step':
+                        self.show_watches()
+                elif mode in ['back', 'run back']:
+                    found = history.step_back() if mode == 'back' else history.run_back_to_line(back_line)
+                    self.show_current_line(self.script.current_line)
+                    self.display_labyr(self.labyr.labyr)
+                    self.show_watches()
+                    if mode == 'run back' and not found:
+                        self.command_win.addstr(3, 1, ('Line %d is not in the history' % back_line)[:self.maxx-3]
+                                                .ljust(self.maxx-3))
+                        self.command_win.refresh()
+                    mode = 'wait'
                 if mode == 'step':
                     mode = 'wait'
                 if mode == 'stop':
@@ -398,23 +666,83 @@ GOTO x     continue with line x'''
                 elif mode == 'quit':
                     break
             
+            if recorder is not None:
+                recorder.trace(result).save(self.record)
             if mode == 'quit':
                 break
             
             # Display result message
-            self.result_win.erase()
-            self.result_border_win.border()
-            self.result_border_win.refresh()
-            self.result_win.addstr(0, 0, result)
-            self.result_win.refresh()
-            while self.command_win.getch() == -1:
-                pass
+            self.display_result(result)
+            self.wait_key()
             self.edit_current_win.erase()
             self.edit_current_win.refresh()
 
-        curses.echo()
-        curses.curs_set(1)
-        curses.endwin()
+    def display_result(self, result):
+        self.result_win.erase()
+        self.result_border_win.border()
+        self.result_border_win.refresh()
+        self.result_win.addstr(0, 0, result)
+        self.result_win.refresh()
+
+    def replay_loop(self, trace):
+        """Replay a recorded trace.
+        """
+        from runtrace import TracePlayer
+
+        scheduler = StepScheduler(0.001)
+        seek_steps = 1000
+        replay_help = 'F5:Run   F6:Step   F8:Step back   +:Faster run   -:Slower run'
+        replay_help_2 = 'Home/End/PgUp/PgDn: Jump   F10: Exit AlgoTaurus'
+
+        player = TracePlayer(trace)
+        for line_i, line in enumerate(trace.code.splitlines()[:self.maxy-7]):
+            self.edit_win.addstr(line_i, 0, line[:11])
+        self.edit_win.refresh()
+        self.command_win.erase()
+        self.command_win.addstr(1, 1, replay_help)
+        self.command_win.addstr(2, 1, replay_help_2)
+
+        mode = 'wait'
+        while True:
+            # Sleep until a key is pressed or the next step is due
+            user_key = self.wait_key({'run': scheduler.timeout(), 'wait': None}.get(mode, 0))
+            if user_key == 'KEY_F(5)':
+                mode = 'run'
+                scheduler.start()
+            elif user_key == 'KEY_F(6)':
+                mode = 'step'
+            elif user_key in ['KEY_F(7)', 'KEY_F(8)']:
+                mode = 'back' if user_key == 'KEY_F(8)' else 'wait'
+            elif user_key == 'KEY_F(10)':
+                break
+            elif user_key == '+':
+                scheduler.interval /= 2
+            elif user_key == '-':
+                scheduler.interval *= 2
+            elif user_key in ['KEY_HOME', 'KEY_END', 'KEY_PPAGE', 'KEY_NPAGE']:
+                player.seek({'KEY_HOME': 0, 'KEY_END': trace.steps,
+                             'KEY_PPAGE': player.step-seek_steps, 'KEY_NPAGE': player.step+seek_steps}[user_key])
+                mode = 'seek'
+
+            if mode == 'run':
+                for i in range(scheduler.due()):
+                    if not player.forward():
+                        break
+            elif mode == 'step':
+                player.forward()
+            elif mode == 'back':
+                player.back()
+            if mode != 'wait':
+                self.edit_current_win.erase()
+                self.edit_current_win.addstr(max(1, min(player.current_line, self.maxy-7))-1, 0, '>')
+                self.edit_current_win.refresh()
+                self.display_labyr(player.labyr)
+                self.command_win.addstr(3, 1, ('Step: %d/%d' % (player.step, trace.steps)).ljust(30))
+                self.command_win.refresh()
+                if player.finished():
+                    self.display_result(trace.result)
+                if mode != 'run' or player.finished():
+                    mode = 'wait'
 
 
 class AlgoTaurusGui:
@@ -422,11 +750,16 @@ class AlgoTaurusGui:
     Parameters:
     size: size of each squares in the labyrinth in pixels (default:15)
     lines: number of lines in the coder (default:30)
+    replay: trace file to replay after starting (default:None)
+    record: trace file to record the runs into, the last run is kept (default:None)
+    profile: show the frames and the executed lines per second, see telemetry.py (default:False)
+    Labyrinths larger than the canvas can be scrolled (scrollbars, dragging) and zoomed (mouse wheel),
+    only the visible part of the labyrinth is rendered.
     Set up GUI with custom parameters:
     AlgoTaurusGui(size=__, lines=__)
     """
 
-    def __init__(self, size=15, lines=30):
+    def __init__(self, size=15, lines=30, replay=None, profile=False, record=None):
         import os
         import tkinter as tk
         from tkinter import filedialog
@@ -445,10 +778,31 @@ class AlgoTaurusGui:
         self.lines = lines
         self.x = 27
         self.y = 27
+        # Viewport of the canvas: size of the squares in pixels (zoom) and the top left visible square
+        self.cell_size = size
+        self.view_row = 0
+        self.view_col = 0
+        self.view_labyr = None
+        self.view_robot = None
+        self.palette = np.array([[255, 255, 255], [0, 0, 0], [190, 190, 190]], dtype=np.uint8)  # path, wall, exit
+        # Heat overlay: the visits of a heatmap on a logarithmic scale, from light yellow to dark orange
+        self.heat_palette = np.linspace([255, 250, 200], [220, 80, 0], 256).astype(np.uint8)
+        self.heatmap = None
+        self.heat_levels = None
+        self.live = None  # LiveEvaluator, created at the first edit
+        self.live_timer = None
+        self.telemetry_text = None  # text of the profile overlay
         self.run_timer = 5.0
         self.mode = None
         self.execute = False
         self.exit_flag=False
+        self.replay_player = None
+        self.last_trace = None
+        self.history = None
+        self.back_line = None
+        self.current_pos = 'end'
+        from debugger import Debugger
+        self.debugger = Debugger()  # breakpoints and watch expressions, kept for the next runs
         self.root = tk.Tk()
         self.root.title('AlgoTaurus')
 
@@ -488,6 +842,15 @@ class AlgoTaurusGui:
         self.lang_value.set(language)
         self.labyr_type = tk.IntVar()
         self.labyr_type.set(1)
+        self.labyr_size = tk.IntVar()
+        self.labyr_size.set(0)  # 0: fit to the window
+        self.follow_robot = tk.BooleanVar()
+        self.follow_robot.set(True)
+        self.record = record
+        self.record_trace = tk.BooleanVar()
+        self.record_trace.set(record is not None)
+        self.live_evaluation = tk.BooleanVar()
+        self.live_evaluation.set(True)
         self.menu = tk.Menu(self.root, relief=tk.FLAT)
         self.root.config(menu=self.menu)
         self.filemenu = tk.Menu(self.menu, tearoff=False)
@@ -506,9 +869,43 @@ class AlgoTaurusGui:
         self.menu.add_cascade(label=_('Labyrinth'), menu=self.labyrmenu)
         self.typemenu = tk.Menu(self.labyrmenu, tearoff=False)
         self.labyrmenu.add_cascade(label=_('Type'), menu=self.typemenu)
-        for labyr_type in [0, 1]:
+        for labyr_type in range(len(labyr_type_names)):
             self.typemenu.add_radiobutton(label=labyr_type_names[labyr_type], variable=self.labyr_type, value=labyr_type,
                                           command=self.change_labyr_type)
+        self.sizemenu = tk.Menu(self.labyrmenu, tearoff=False)
+        self.labyrmenu.add_cascade(label=_('Size'), menu=self.sizemenu)
+        self.sizemenu.add_radiobutton(label=_('Fit to window'), variable=self.labyr_size, value=0,
+                                      command=self.change_labyr_type)
+        for labyr_size in labyr_sizes:
+            self.sizemenu.add_radiobutton(label='%d x %d' % (labyr_size, labyr_size), variable=self.labyr_size,
+                                          value=labyr_size, command=self.change_labyr_type)
+        self.labyrmenu.add_separator()
+        self.labyrmenu.add_command(label=_('Zoom in'), command=lambda: self.zoom(2))
+        self.labyrmenu.add_command(label=_('Zoom out'), command=lambda: self.zoom(0.5))
+        self.labyrmenu.add_checkbutton(label=_('Follow AlgoTaurus'), variable=self.follow_robot)
+        self.tracemenu = tk.Menu(self.menu, tearoff=False)
+        self.menu.add_cascade(label=_('Trace'), menu=self.tracemenu)
+        self.tracemenu.add_checkbutton(label=_('Record runs'), variable=self.record_trace)
+        self.tracemenu.add_command(label=_('Save last trace...'), command=self.save_trace_command)
+        self.tracemenu.add_command(label=_('Replay trace...'), command=self.replay_command)
+        self.tracemenu.add_command(label=_('Go to step...'), command=self.seek_command, accelerator='F9')
+        self.tracemenu.add_command(label=_('Run back to line...'), command=self.run_back_command)
+        self.tracemenu.add_separator()
+        self.tracemenu.add_command(label=_('Heatmap of the code'), command=self.heatmap_command)
+        self.tracemenu.add_command(label=_('Load heatmap...'), command=self.load_heatmap_command)
+        self.tracemenu.add_command(label=_('Export heatmap...'), command=self.export_heatmap_command)
+        self.tracemenu.add_command(label=_('Hide heatmap'), command=lambda: self.show_heatmap(None))
+        self.tracemenu.add_separator()
+        self.tracemenu.add_checkbutton(label=_('Live evaluation'), variable=self.live_evaluation,
+                                       command=self.code_modified)
+        self.debugmenu = tk.Menu(self.menu, tearoff=False)
+        self.menu.add_cascade(label=_('Debug'), menu=self.debugmenu)
+        self.debugmenu.add_command(label=_('Run to breakpoint'), command=self.fastmode, accelerator='F4')
+        self.debugmenu.add_separator()
+        self.debugmenu.add_command(label=_('Add breakpoint...'), command=self.add_breakpoint_command)
+        self.debugmenu.add_command(label=_('Remove breakpoints'), command=self.clear_breakpoints_command)
+        self.debugmenu.add_command(label=_('Add watch expression...'), command=self.add_watch_command)
+        self.debugmenu.add_command(label=_('Remove watch expressions'), command=self.clear_watches_command)
         self.helpmenu = tk.Menu(self.menu, tearoff=False)
         self.menu.add_cascade(label=_('AlgoTaurus'), menu=self.helpmenu)
         self.languagemenu = tk.Menu(self.helpmenu, tearoff=False)
@@ -540,12 +937,16 @@ class AlgoTaurusGui:
         self.root.bind('<F5>', self.runmode)
         self.root.bind('<F6>', self.stepmode)
         self.root.bind('<F7>', self.stopcommand)
+        self.root.bind('<F8>', self.backmode)
+        self.root.bind('<F9>', self.seek_command)
+        self.root.bind('<F4>', self.fastmode)
         self.root.bind('<F2>', self.speed_down)
         self.root.bind('<F3>', self.speed_up)
         
         # Build menu item shortcuts
-        for menu in [self.menu, self.filemenu, self.editmenu, self.labyrmenu,
-                     self.typemenu, self.helpmenu, self.languagemenu, self.rclickmenu]:
+        for menu in [self.menu, self.filemenu, self.editmenu, self.labyrmenu, self.typemenu,
+                     self.sizemenu, self.tracemenu, self.debugmenu, self.helpmenu, self.languagemenu,
+                     self.rclickmenu]:
             ch_list = []
             for i in range(menu.index('end')+1):
                 if menu.type(i) not in ['tearoff', 'separator']:
@@ -567,18 +968,31 @@ class AlgoTaurusGui:
         self.linebox = tk.Text(self.mainframe, width=3, height=self.lines, state='normal')
         self.linebox.insert('1.0', numbers)
         self.linebox.configure(bg='grey', fg='black', state='disabled', relief='flat')
+        self.linebox.tag_configure('breakpoint', background='tomato')
+        self.linebox.bind('<Button-1>', self.toggle_breakpoint)  # click a line number to set a breakpoint
         self.codertitle = ttk.Label(self.mainframe, background=self.mainframe['background'], text=_('Coder'), justify='center')
         self.textPad.bind('<Button-3>', self.rclick)
         self.textPad.bind('<Key>', self.validate_input)        
+        self.textPad.bind('<<Modified>>', self.code_modified)
+        self.live_label = ttk.Label(self.mainframe, background=self.mainframe['background'], text='')
+        self.watch_label = ttk.Label(self.mainframe, background=self.mainframe['background'], text='',
+                                     justify='left')
         # Creating canvas and drawing sample labyrinth
         self.canvas = tk.Canvas(self.mainframe, width=self.size*(self.x+4), height=self.size*(self.y+4))
+        self.xscroll = ttk.Scrollbar(self.mainframe, orient='horizontal', command=self.xview)
+        self.yscroll = ttk.Scrollbar(self.mainframe, orient='vertical', command=self.yview)
+        self.canvas.bind('<ButtonPress-1>', self.drag_start)
+        self.canvas.bind('<B1-Motion>', self.drag_view)
+        self.canvas.bind('<MouseWheel>', self.wheel_zoom)
+        self.canvas.bind('<Button-4>', self.wheel_zoom)
+        self.canvas.bind('<Button-5>', self.wheel_zoom)
         samplab = Labyrinth(x=self.x, y=self.y, labyr_type=self.labyr_type.get())
-        Robot(samplab)
-        self.draw_labyr(samplab.labyr)
+        self.draw_labyr(samplab.labyr, Robot(samplab))
         self.instr = ttk.Label(self.mainframe, background=self.mainframe['background'], text=command_help, justify='left', padding=10)
         # Creating buttons
         self.buttstop = ttk.Button(self.controlframe, text=_('Stop code\nexecution (F7)'), command=self.stopcommand, state='disabled')
         self.buttstep = ttk.Button(self.controlframe, text=_('Try the code\nLine by line (F6)'), command=self.stepmode)
+        self.buttback = ttk.Button(self.controlframe, text=_('Step back (F8)'), command=self.backmode, state='disabled')
         self.buttrun = ttk.Button(self.controlframe, text=_('Try the code\nContinuously (F5)'), command=self.runmode)
         self.buttspdown = ttk.Button(self.controlframe, text=_('Slower (F2)'), command=self.speed_down)
         self.buttspup = ttk.Button(self.controlframe, text=_('Faster (F3)'), command=self.speed_up)
@@ -587,10 +1001,14 @@ class AlgoTaurusGui:
 
         # Widgets in mainframe
         self.codertitle.grid(column=1, row=0, columnspan=2, pady=10)
+        self.live_label.grid(column=3, row=0, sticky='w', padx=(20, 0))
+        self.watch_label.grid(column=3, row=3, sticky='w', padx=(20, 0))
         self.instr.grid(column=0, row=1, sticky='n')
         self.linebox.grid(column=1, row=1, sticky='en')
         self.textPad.grid(column=2, row=1, sticky='wn')
-        self.canvas.grid(column=3, row=1, sticky='ws', padx=20)
+        self.canvas.grid(column=3, row=1, sticky='ws', padx=(20, 0))
+        self.yscroll.grid(column=4, row=1, sticky='ns')
+        self.xscroll.grid(column=3, row=2, sticky='new', padx=(20, 0))
 
         # Widgets in buttonframe
 
@@ -598,6 +1016,7 @@ class AlgoTaurusGui:
         self.buttspup.grid(row=1, column=1, padx=5, pady=10)
         self.buttrun.grid(row=0, column=0, columnspan=2, padx=10)
         self.buttstep.grid(row=0, column=2, padx=10)
+        self.buttback.grid(row=1, column=2, padx=10)
         self.buttstop.grid(row=0, column=3, padx=10)
         self.controlframe.grid(column=0, row=2, columnspan=3, padx=10, pady=10)
         # Center the window and set the minimal size
@@ -611,6 +1030,11 @@ class AlgoTaurusGui:
         self.root.geometry("%dx%d+%d+%d" % (size + (x, y)))
         self.root.update()
         self.root.minsize(self.root.winfo_width(), self.root.winfo_height())
+        if replay:
+            from runtrace import Trace
+            self.root.after(100, self.replay, Trace.load(replay))
+        if profile:
+            self.root.after(1000, self.show_telemetry, 0, None, 0, time.perf_counter())
         self.root.mainloop()
 
     # Building menu and coder options
@@ -621,9 +1045,13 @@ class AlgoTaurusGui:
                                                'the labyrinth.\nAre you sure you want to change the labyrinth type?')):
                 self.mode = 'stop'
         if self.mode not in ['step', 'run']:
+            if self.labyr_size.get():
+                self.x = self.y = self.labyr_size.get()
+            else:
+                self.x, self.y = self.fit_canvas()
             samplab = Labyrinth(x=self.x, y=self.y, labyr_type=self.labyr_type.get())
-            Robot(samplab)
-            self.draw_labyr(samplab.labyr)
+            self.draw_labyr(samplab.labyr, Robot(samplab))
+            self.code_modified()  # evaluate the code in the labyrinths of the new type
 
     def change_language(self, event=None):
         if config.get('settings', 'language') != self.lang_value.get():
@@ -664,6 +1092,127 @@ class AlgoTaurusGui:
             at_file.write(data)
             at_file.close()
 
+    def save_trace_command(self, event=None):
+        if self.last_trace is None:
+            self.messagebox.showinfo(_('Info'), _('There is no recorded run yet. Switch on Record runs and run the code.'))
+            return
+        filename = self.filedialog.asksaveasfilename(defaultextension='.attrace', initialfile='lab01.attrace',
+                                                     filetypes=[(_('AlgoTaurus traces'), '*.attrace'),
+                                                                (_('all files'), '.*')])
+        if filename:
+            self.last_trace.save(filename)
+
+    def replay_command(self, event=None):
+        if self.execute:
+            return
+        filename = self.filedialog.askopenfilename(parent=self.root, title=_('Select a file'),
+                                                   filetypes=[(_('AlgoTaurus traces'), '*.attrace'),
+                                                              (_('all files'), '.*')])
+        if filename:
+            from runtrace import Trace
+            self.replay(Trace.load(filename))
+
+    def seek_command(self, event=None):
+        if self.replay_player is None:
+            return
+        from tkinter import simpledialog
+        step = simpledialog.askinteger(_('Go to step'), _('Step (0-%d):') % self.replay_player.trace.steps,
+                                       parent=self.root, minvalue=0, maxvalue=self.replay_player.trace.steps)
+        if step is not None:
+            self.replay_player.seek(step)
+            self.show_current_line(self.replay_player.current_line)
+            self.move_robot(self.replay_player)
+
+    def code_modified(self, event=None):
+        """Evaluate the code in the background, when the typing pauses for half a second"""
+        if event is not None:
+            if not self.textPad.edit_modified():
+                return  # the event of resetting the modified flag
+            self.textPad.edit_modified(False)
+        if self.live is not None:
+            self.live.cancel()
+        if self.live_timer is not None:
+            self.root.after_cancel(self.live_timer)
+        self.live_label.configure(text='')
+        if self.live_evaluation.get():
+            self.live_timer = self.root.after(500, self.live_evaluate)
+
+    def live_evaluate(self):
+        self.live_timer = None
+        code = self.textPad.get('1.0', 'end'+'-1c')
+        if code.strip() == '':
+            return
+        # The suite has small labyrinths to be fast, of the selected type
+        if self.live is None or self.live.labyr_type != self.labyr_type.get():
+            from live import LiveEvaluator
+            if self.live is not None:
+                self.live.close()
+            self.live = LiveEvaluator(labyr_type=self.labyr_type.get())
+        self.show_live_status(self.live.submit(code))
+
+    def show_live_status(self, generation):
+        """Show the status of the live evaluation until it is finished, unless a newer code is submitted"""
+        status = self.live.status
+        if status is None or status[0] != generation:
+            return
+        generation, passed, evaluated, labyrinths = status
+        if evaluated < labyrinths:
+            self.live_label.configure(text=_('Evaluating... %d/%d') % (evaluated, labyrinths))
+            self.root.after(100, self.show_live_status, generation)
+        else:
+            self.live_label.configure(text=_('Passes %d/%d labyrinths') % (passed, labyrinths))
+
+    def heatmap_command(self, event=None):
+        """Run the code in 100 labyrinths of the current size and type, and show where the robot went"""
+        if self.execute:
+            return
+        code = self.textPad.get('1.0', 'end'+'-1c').rstrip()
+        if code == '':
+            self.messagebox.showinfo(_('Info'), _('There is no command to execute!'))
+            return
+        import evaluate
+        rows, cols = self.view_labyr.shape
+        self.root.config(cursor='watch')
+        self.root.update()
+        results, heatmaps = evaluate.evaluate_codes([code], 100, cols-4, rows-4, self.labyr_type.get(),
+                                                    reference=None, return_heatmaps=True)
+        self.root.config(cursor='')
+        self.show_heatmap(heatmaps[0])
+
+    def load_heatmap_command(self, event=None):
+        filename = self.filedialog.askopenfilename(parent=self.root, title=_('Select a file'),
+                                                   filetypes=[(_('AlgoTaurus heatmaps'), '*.npz'),
+                                                              (_('all files'), '.*')])
+        if filename:
+            from analysis import Heatmap
+            self.show_heatmap(Heatmap.load(filename))
+
+    def export_heatmap_command(self, event=None):
+        if self.heatmap is None:
+            self.messagebox.showinfo(_('Info'), _('There is no heatmap yet.'))
+            return
+        filename = self.filedialog.asksaveasfilename(defaultextension='.npz', initialfile='lab01.heatmap.npz',
+                                                     filetypes=[(_('AlgoTaurus heatmaps'), '*.npz'),
+                                                                (_('all files'), '.*')])
+        if filename:
+            self.heatmap.save(filename)
+
+    def show_heatmap(self, heatmap):
+        """Show the visits of an analysis.Heatmap on the paths of the labyrinth, or hide the overlay if heatmap is
+        None. The heatmap is shown only on labyrinths of its size.
+        """
+        if heatmap is not None and heatmap.shape != self.view_labyr.shape:
+            self.messagebox.showinfo(_('Info'), _('The heatmap is of a %d x %d labyrinth. Set this size in the '
+                                                  'Labyrinth menu, and run the code.') %
+                                     (heatmap.shape[1]-4, heatmap.shape[0]-4))
+        self.heatmap = heatmap
+        if heatmap is None:
+            self.heat_levels = None
+        else:
+            visits = np.log1p(heatmap.cells)
+            self.heat_levels = (visits / max(visits.max(), 1e-9) * 255).astype(np.intp)
+        self.render_view()
+
     def exit_command(self, event=None):
         if self.messagebox.askokcancel(_('Quit'), _('Do you really want to quit?')):
             self.exit_flag=True
@@ -698,41 +1247,171 @@ class AlgoTaurusGui:
     def rclick(self, event):
         self.rclickmenu.tk_popup(event.x_root, event.y_root)
 
-    def draw_labyr(self, labyr):
+    def fit_canvas(self):
+        """Resize the canvas to the current window size.
+        returns: width and height of the labyrinth fitting to the canvas
+        """
+        self.root.update()
+        w, h = self.root.winfo_width(), self.root.winfo_height()
+        view_x, view_y = (w-self.padding[0])//self.size, (h-self.padding[1])//self.size
+        self.canvas.configure(width=self.size*(view_x+4), height=self.size*(view_y+4))
+        self.root.update()
+        return view_x, view_y
+
+    def draw_labyr(self, labyr, robot):
         """Drawing the labyr on the canvas from the numpy array"""
-        for col, index in enumerate(labyr):
-            for row, element in enumerate(index):            
-                if element in [0, 1, 2]:
-                    coords = tuple(loc*self.size for loc in (row, col, row+1, col+1))
-                    colors = {0: 'white', 1: 'black', 2: 'grey'}
-                    self.canvas.create_rectangle(*coords, width=0, fill=colors[element])
-                else: 
-                    locs = {10: [row, col, row, col+1, row+1, col+0.5],
-                            11: [row, col, row+0.5, col+1, row+1, col],
-                            12: [row, col+0.5, row+1, col+1, row+1, col],
-                            13: [row+0.5, col, row, col+1, row+1, col+1]}
-                    coords1 = tuple(loc*self.size for loc in (row, col, row+1, col+1))
-                    coords2 = tuple(loc*self.size for loc in locs[element])
-                    self.canvas.create_rectangle(*coords1, width=0, fill='white')
-                    self.labrobot = self.canvas.create_polygon(*coords2, fill='red')
-    
-    def move_robot(self, labyr):
-        """Moving the robot on the canvas"""
-        self.canvas.delete(self.labrobot)
-        robot = labyr.max()
-        col, row = tuple(int(i) for i in (np.where(labyr == robot)))
-        locs = {10: [row, col, row, col+1, row+1, col+0.5],
-                11: [row, col, row+0.5, col+1, row+1, col],
-                12: [row, col+0.5, row+1, col+1, row+1, col],
-                13: [row+0.5, col, row, col+1, row+1, col+1]}
-        coords = tuple(loc*self.size for loc in locs[robot])
+        self.view_labyr = labyr
+        self.view_robot = robot
+        if self.labyr_size.get() == 0:
+            self.cell_size = self.size
+        self.center_view(robot.pos)
+
+    def view_shape(self):
+        """Number of rows and columns of squares visible on the canvas"""
+        width, height = int(self.canvas.cget('width')), int(self.canvas.cget('height'))
+        return -(-height//self.cell_size), -(-width//self.cell_size)
+
+    def render_view(self):
+        """Rendering the visible part of the labyrinth as a single image and drawing the robot.
+        The rendering cost depends on the size of the canvas, not on the size of the labyrinth.
+        """
+        rows, cols = self.view_labyr.shape
+        view_rows, view_cols = self.view_shape()
+        self.view_row = max(0, min(self.view_row, rows-view_rows))
+        self.view_col = max(0, min(self.view_col, cols-view_cols))
+        block = self.view_labyr[self.view_row:self.view_row+view_rows, self.view_col:self.view_col+view_cols]
+        rgb = self.palette[np.where(block < 10, block, 0).astype(np.intp)]  # the robot is drawn separately
+        if self.heat_levels is not None and self.heat_levels.shape == self.view_labyr.shape:
+            heat = self.heat_levels[self.view_row:self.view_row+view_rows, self.view_col:self.view_col+view_cols]
+            visited = (heat > 0) & (block != 1)
+            rgb[visited] = self.heat_palette[heat[visited]]
+        rgb = np.repeat(np.repeat(rgb, self.cell_size, axis=0), self.cell_size, axis=1)
+        ppm = b'P6 %d %d 255\n' % (rgb.shape[1], rgb.shape[0]) + rgb.tobytes()
+        self.labimage = self.tk.PhotoImage(data=ppm, format='PPM')  # keep a reference, otherwise the image is lost
+        self.canvas.delete('all')
+        self.canvas.create_image(0, 0, anchor='nw', image=self.labimage)
+        self.labrobot = None
+        self.draw_robot()
+        if self.telemetry_text is not None:
+            self.draw_telemetry()
+        self.xscroll.set(self.view_col/cols, min(1.0, (self.view_col+view_cols)/cols))
+        self.yscroll.set(self.view_row/rows, min(1.0, (self.view_row+view_rows)/rows))
+
+    def draw_robot(self):
+        """Drawing the robot polygon relative to the viewport"""
+        if self.labrobot is not None:
+            self.canvas.delete(self.labrobot)
+        row, col = self.view_robot.pos
+        row, col = row-self.view_row, col-self.view_col
+        locs = {10: [col, row, col, row+1, col+1, row+0.5],
+                11: [col, row, col+0.5, row+1, col+1, row],
+                12: [col, row+0.5, col+1, row+1, col+1, row],
+                13: [col+0.5, row, col, row+1, col+1, row+1]}
+        coords = tuple(loc*self.cell_size for loc in locs[self.view_robot.dir+10])
         self.labrobot = self.canvas.create_polygon(*coords, fill='red')
+
+    def show_telemetry(self, frames, script, steps, last_time):
+        """Update the profile overlay every second with the frames and the executed lines per second.
+        The executed lines are counted by the steps of the script of the run, so the full speed runs of the native
+        backend are counted too.
+        """
+        import telemetry
+        now = time.perf_counter()
+        new_frames = telemetry.calls('canvas drawing')
+        new_script = self.debugger.script
+        new_steps = 0 if new_script is None else new_script.steps
+        if new_script is not script:
+            steps = 0  # a new run
+        self.telemetry_text = '%.0f fps  %.0f steps/s' % ((new_frames-frames) / (now-last_time),
+                                                          max(new_steps-steps, 0) / (now-last_time))
+        self.draw_telemetry()
+        self.root.after(1000, self.show_telemetry, new_frames, new_script, new_steps, now)
+
+    def draw_telemetry(self):
+        self.canvas.delete('telemetry')
+        text = self.canvas.create_text(5, 5, anchor='nw', text=self.telemetry_text, fill='blue', tags='telemetry')
+        self.canvas.create_rectangle(self.canvas.bbox(text), fill='white', outline='', tags='telemetry')
+        self.canvas.tag_raise(text)
+
+    def center_view(self, pos):
+        view_rows, view_cols = self.view_shape()
+        self.view_row = pos[0] - view_rows//2
+        self.view_col = pos[1] - view_cols//2
+        self.render_view()
+
+    def move_robot(self, robot):
+        """Moving the robot on the canvas"""
+        view_rows, view_cols = self.view_shape()
+        row, col = robot.pos[0]-self.view_row, robot.pos[1]-self.view_col
+        # Follow the robot, if it gets close to the edge of the viewport
+        if self.follow_robot.get() and not (view_rows//4 <= row < view_rows-view_rows//4 and
+                                            view_cols//4 <= col < view_cols-view_cols//4):
+            self.center_view(robot.pos)
+        else:
+            self.draw_robot()
         self.canvas.update()
-    
+
+    def zoom(self, factor):
+        if self.view_labyr is None:
+            return
+        cell_size = max(1, min(60, int(self.cell_size*factor)))
+        if cell_size != self.cell_size:
+            # Keep the center of the viewport in place
+            view_rows, view_cols = self.view_shape()
+            center = (self.view_row+view_rows//2, self.view_col+view_cols//2)
+            self.cell_size = cell_size
+            self.center_view(center)
+
+    def wheel_zoom(self, event):
+        self.zoom(2 if event.num == 4 or event.delta > 0 else 0.5)
+
+    def drag_start(self, event):
+        self.drag_pos = (event.y, event.x, self.view_row, self.view_col)
+
+    def drag_view(self, event):
+        y, x, view_row, view_col = self.drag_pos
+        self.view_row = view_row - (event.y-y)//self.cell_size
+        self.view_col = view_col - (event.x-x)//self.cell_size
+        self.render_view()
+
+    def scroll_view(self, args, axis):
+        """Scrolling the view with the scrollbars: args are the arguments of the tk scrollbar command"""
+        size, view_size = self.view_labyr.shape[axis], self.view_shape()[axis]
+        start = self.view_col if axis else self.view_row
+        if args[0] == 'moveto':
+            start = int(float(args[1])*size)
+        elif args[0] == 'scroll':
+            start += int(args[1]) * (view_size if args[2] == 'pages' else 1)
+        if axis:
+            self.view_col = start
+        else:
+            self.view_row = start
+        self.render_view()
+
+    def xview(self, *args):
+        self.scroll_view(args, axis=1)
+
+    def yview(self, *args):
+        self.scroll_view(args, axis=0)
+
     # Button commands
     def stopcommand(self, event=None):
         self.mode = 'stop'
 
+    def backmode(self, event=None):
+        if self.replay_player is not None or self.history is not None:
+            self.mode = 'back'
+
+    def run_back_command(self, event=None):
+        if self.history is None:
+            return
+        from tkinter import simpledialog
+        line = simpledialog.askinteger(_('Run back to line'), _('Line:'), parent=self.root, minvalue=1,
+                                       maxvalue=self.lines)
+        if line is not None:
+            self.back_line = line
+            self.mode = 'back'
+
     def stepmode(self, event=None):
         self.mode = 'step'
         self.buttrun.configure(state='normal')
@@ -744,6 +1423,68 @@ class AlgoTaurusGui:
         self.buttrun.configure(state='disabled')
         if self.execute == False:
             self.execute_code()
+
+    def fastmode(self, event=None):
+        """Run the code at full speed until a breakpoint, see debugger.py"""
+        if self.replay_player is not None:
+            return
+        self.mode = 'fast'
+        self.buttrun.configure(state='disabled')
+        if self.execute == False:
+            self.execute_code()
+
+    def add_breakpoint_command(self, event=None):
+        from tkinter import simpledialog
+        text = simpledialog.askstring(_('Add breakpoint'), _('Breakpoint, e.g. line 7 hits 1000, cell 5 9, '
+                                                             'direction up, steps 2000000, line 3 if moves > 10:'),
+                                      parent=self.root)
+        if text:
+            try:
+                self.debugger.add(text)
+            except ValueError as error:
+                self.messagebox.showerror(_('Add breakpoint'), str(error))
+            self.show_breakpoints()
+
+    def clear_breakpoints_command(self, event=None):
+        self.debugger.clear()
+        self.show_breakpoints()
+
+    def add_watch_command(self, event=None):
+        from tkinter import simpledialog
+        text = simpledialog.askstring(_('Add watch expression'), _('Expression of line, steps, moves, row, col, '
+                                                                   'direction, wall, exit, hits:'), parent=self.root)
+        if text:
+            try:
+                self.debugger.add_watch(text)
+            except ValueError as error:
+                self.messagebox.showerror(_('Add watch expression'), str(error))
+            self.show_watches()
+
+    def clear_watches_command(self, event=None):
+        self.debugger.clear_watches()
+        self.show_watches()
+
+    def toggle_breakpoint(self, event):
+        """Set or remove the breakpoint of the clicked line number"""
+        line = int(self.linebox.index('@%d,%d' % (event.x, event.y)).split('.')[0])
+        self.debugger.toggle_line(line)
+        self.show_breakpoints()
+        return 'break'
+
+    def show_breakpoints(self):
+        """Marking the lines with breakpoints"""
+        self.linebox.tag_remove('breakpoint', '1.0', 'end')
+        for line in self.debugger.lines:
+            if 0 < line <= self.lines:
+                self.linebox.tag_add('breakpoint', '%d.0' % line, '%d.2' % line)
+
+    def show_watches(self):
+        """Showing the values of the watch expressions in the current state of the run"""
+        if self.debugger.script is None or not self.execute:
+            values = [(expression, '') for expression in self.debugger.watches]
+        else:
+            values = self.debugger.watch_values()
+        self.watch_label.configure(text='\n'.join('%s = %s' % value for value in values))
             
     def speed_up(self, event=None):
         if self.run_timer > 2:
@@ -759,6 +1500,20 @@ class AlgoTaurusGui:
             if self.run_timer >= 500:
                 self.buttspdown.configure(state='disabled')
 
+    def show_current_line(self, line):
+        """Marking the current line next to the coder"""
+        self.linebox.config(state='normal')
+        self.linebox.delete(self.current_pos)
+        self.current_pos = str(line)+'.2'
+        self.linebox.insert(self.current_pos, '>')
+        self.linebox.config(state='disabled')
+
+    def clear_current_line(self):
+        self.linebox.configure(state='normal')
+        self.linebox.delete(self.current_pos)
+        self.linebox.configure(state='disabled')
+        self.current_pos = 'end'
+
     def execute_code(self):
         """Running the script from the coder"""
         self.execute = True
@@ -771,64 +1526,169 @@ class AlgoTaurusGui:
             result = _('There is no command to execute!')
         else:
             result = 'go on'
-        self.canvas.delete('all')
         lines = edited_text.count('\n')+1
 
-        # Resizing labyrinth to fit to the current window size
-        self.root.update()
-        w, h = self.root.winfo_width(), self.root.winfo_height()
-        self.x, self.y = (w-self.padding[0])//self.size, (h-self.padding[1])//self.size
-        self.canvas.configure(width=self.size*(self.x+4), height=self.size*(self.y+4))
-        self.root.update()
+        # The labyrinth fits to the canvas, unless a fixed size is set
+        view_x, view_y = self.fit_canvas()
+        if self.labyr_size.get():
+            self.x = self.y = self.labyr_size.get()
+        else:
+            self.x, self.y = view_x, view_y
         # Drawing the labyrinth
         lab = Labyrinth(x=self.x, y=self.y, labyr_type=self.labyr_type.get())
-        labyr = lab.labyr
         robot = Robot(lab)
-        script = Script(edited_text, robot, max_line=lines)
-        self.draw_labyr(labyr)
+        if self.record_trace.get():
+            from runtrace import TraceRecorder
+            recorder = TraceRecorder(robot, edited_text)
+        else:
+            recorder = None
+        script = Script(edited_text, robot, max_line=lines, recorder=recorder)
+        self.debugger.attach(script)
+        # Stepping back would break the recorded trace
+        self.history = History(script) if recorder is None else None
+        if self.history is not None:
+            self.buttback.configure(state='normal')
+        self.draw_labyr(lab.labyr, robot)
         self.canvas.update()
         self.canvas.after(1000)
-        current_pos = 'end'
         while result == 'go on' and not self.exit_flag:
             if self.mode in ['run', 'step']:
-                self.linebox.config(state='normal')
-                self.linebox.delete(current_pos)
-                current_pos = str(script.current_line)+'.2'
-                self.linebox.insert(current_pos, '>')
-                self.linebox.config(state='disabled')
-                result = script.execute_command()
-                self.move_robot(labyr)
+                self.show_current_line(script.current_line)
+                result = (self.history or script).execute_command()
+                self.move_robot(robot)
                 if self.mode == 'run':
                     self.canvas.after(int(self.run_timer))
                 if self.mode == 'step':
                     self.mode = 'wait'
+                    self.show_watches()
+            elif self.mode == 'fast':
+                # Run in chunks without drawing, so the window can still stop the run. The lines run here are not
+                # stored in the history, so stepping back could only jump to the state before the run.
+                result = self.debugger.run()
+                if self.history is not None:
+                    self.history.clear()
+                if result == 'go on':
+                    self.canvas.update()
+                    continue
+                self.show_current_line(script.current_line)
+                self.move_robot(robot)
+                self.show_watches()
+                if result == 'break':
+                    result = 'go on'
+                    self.mode = 'wait'
+                    self.buttrun.configure(state='normal')
+            elif self.mode == 'back':
+                if self.back_line is None:
+                    self.history.step_back()
+                else:
+                    self.history.run_back_to_line(self.back_line)
+                    self.back_line = None
+                self.show_current_line(script.current_line)
+                self.move_robot(robot)
+                self.show_watches()
+                self.mode = 'wait'
             elif self.mode == 'wait':
                 self.canvas.after(200)
                 self.canvas.update()
             elif self.mode == 'stop':
                 break
+        if recorder is not None:
+            self.last_trace = recorder.trace(result if self.mode != 'stop' else _('Running stopped.'))
+            if self.record:
+                self.last_trace.save(self.record)
+        self.history = None
         if not self.exit_flag:
             if not self.mode == 'stop':
                 self.messagebox.showinfo('Result', result)
-            self.linebox.configure(state='normal')
-            self.linebox.delete(current_pos)
-            self.linebox.configure(state='disabled')
+            self.clear_current_line()
+            self.buttstop.configure(state='disabled')
+            self.buttback.configure(state='disabled')
+            self.buttstep.configure(state='normal')
+            self.buttrun.configure(state='normal')
+            self.textPad.configure(state='normal', bg='white')
+            self.execute = False
+
+    def replay(self, trace):
+        """Replaying a recorded trace.
+        F5 replays continuously, F6 steps forward, F8 steps back, F9 jumps to a step and F7 stops the replay.
+        """
+        from runtrace import TracePlayer
+        if self.execute:
+            return
+        if self.textPad.get('1.0', 'end'+'-1c') != '' and self.textPad.get('1.0', 'end'+'-1c') != trace.code:
+            if not self.messagebox.askokcancel(_('Warning'),
+                                               _('The replayed code replaces the content of the coder.\n'
+                                                 'Do you want to continue?')):
+                return
+        self.execute = True
+        self.mode = 'wait'
+        player = self.replay_player = TracePlayer(trace)
+        self.textPad.delete('1.0', 'end')
+        self.textPad.insert('1.0', trace.code)
+        self.textPad.configure(state='disabled', bg='white smoke')
+        self.buttstop.configure(state='normal')
+        self.buttback.configure(state='normal')
+        self.draw_labyr(player.labyr, player)
+        self.show_current_line(player.current_line)
+        while not self.exit_flag:
+            if self.mode in ['run', 'step', 'back']:
+                moved = player.back() if self.mode == 'back' else player.forward()
+                self.show_current_line(player.current_line)
+                self.move_robot(player)
+                if self.mode != 'run' or not moved:
+                    self.mode = 'wait'
+                    if player.finished() and moved:
+                        self.messagebox.showinfo('Result', trace.result)
+                else:
+                    self.canvas.after(int(self.run_timer))
+            elif self.mode == 'wait':
+                self.canvas.after(200)
+                self.canvas.update()
+            elif self.mode == 'stop':
+                break
+        self.replay_player = None
+        if not self.exit_flag:
+            self.clear_current_line()
             self.buttstop.configure(state='disabled')
+            self.buttback.configure(state='disabled')
             self.buttstep.configure(state='normal')
             self.buttrun.configure(state='normal')
             self.textPad.configure(state='normal', bg='white')
             self.execute = False
 
 
+# Phases measured by the --profile option, see telemetry.py
+profiled_phases = [('labyrinth generation', Labyrinth, ['__init__']),
+                   ('robot commands', Robot, ['step', 'left', 'right', 'robot_quit', 'wall', 'robot_exit']),
+                   ('script dispatch', Script, ['execute_command']),
+                   ('canvas drawing', AlgoTaurusGui, ['render_view', 'draw_robot']),
+                   ('curses repainting', AlgoTaurusTui, ['display_labyr', 'display_result'])]
+
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ['-t', '-tui']:  # Run TUI version
-            labyr = AlgoTaurusTui()
-        else:
-            print('''Use of AlgoTaurus:
-algotaurus -t
-    run in text user interface mode
-algotaurus
-    run in graphical user interface mode''')
+    import argparse
+    parser = argparse.ArgumentParser(prog='algotaurus', description='An educational game to teach programming. '
+                                     'Runs in graphical user interface mode by default.')
+    parser.add_argument('-t', '-tui', dest='tui', action='store_true', help='run in text user interface mode')
+    parser.add_argument('-r', '--record', metavar='FILE',
+                        help='record the runs into a trace file, the last run is kept')
+    parser.add_argument('-p', '--replay', metavar='FILE', help='replay a trace file')
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help='measure the time of the main phases and print a summary at exit; '
+                             'write cProfile statistics into FILE if given')
+    args = parser.parse_args()
+    if args.profile is not None:
+        import telemetry
+        telemetry.enable(profiled_phases)
+        if args.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+    if args.tui:  # Run TUI version
+        labyr = AlgoTaurusTui(record=args.record, replay=args.replay)
     else:  # Run GUI version
-        root = AlgoTaurusGui()
+        root = AlgoTaurusGui(replay=args.replay, profile=args.profile is not None, record=args.record)
+    if args.profile is not None:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        telemetry.print_summary()
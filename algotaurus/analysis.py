@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Labyrinth analysis
+==================
+Vectorized measures of AlgoTaurus labyrinths.
+
+The functions work on labyrinth arrays as created by the Labyrinth class (0: path, 1: wall, 2: exit, 10-13: robot),
+or on a stack of such arrays of the same size (N x rows x cols), which are then processed together.
+The labyrinths are surrounded by a two squares wide exit ring, so the flat neighbours of the squares inside never
+cross the border of a labyrinth.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import numpy as np
+
+
+def flat_offsets(labyr):
+    """returns: flat index offsets of the right, down, left and up neighbours"""
+    cols = labyr.shape[-1]
+    return np.array([1, cols, -1, -cols])
+
+
+def distance_field(labyr):
+    """Distance of every square from the nearest exit with breadth first search.
+    The whole frontier is expanded at once with array operations, and a stack of labyrinths is searched in a
+    single pass.
+
+    returns: int32 array of the shape of labyr
+    0: exit
+    n: a robot standing here needs n-1 steps to get next to an exit (and the nth one would step out)
+    -1: wall or a path square, from which no exit can be reached
+    """
+    flat = labyr.ravel()
+    passable = (flat == 0) | (flat >= 10)  # the robot stands on a path
+    dist = np.full(flat.size, -1, dtype=np.int32)
+    frontier = np.flatnonzero(flat == 2)
+    dist[frontier] = 0
+    offsets = flat_offsets(labyr)
+    # The squares reached from more frontier squares are kept once: the last one writing its position here wins.
+    # It does not sort the frontier like np.unique.
+    claims = np.empty(flat.size, dtype=np.intp)
+    distance = 0
+    while frontier.size:
+        distance += 1
+        neighbs = (frontier[:, np.newaxis] + offsets).ravel()
+        neighbs = neighbs[(neighbs >= 0) & (neighbs < flat.size)]
+        neighbs = neighbs[passable[neighbs] & (dist[neighbs] < 0)]
+        positions = np.arange(neighbs.size)
+        claims[neighbs] = positions
+        neighbs = neighbs[claims[neighbs] == positions]
+        dist[neighbs] = distance
+        frontier = neighbs
+    return dist.reshape(labyr.shape)
+
+
+def optimal_steps(labyr, index):
+    """Shortest way out of the labyrinth.
+    labyr: labyrinth array
+    index: flat index of the starting square (Robot.index)
+
+    returns: number of steps to reach an exit including stepping out, or -1 if there is no way out
+    """
+    return int(distance_field(labyr).ravel()[index])
+
+
+def efficiency(moves, optimum):
+    """Efficiency score of a successful run.
+    moves: steps made by the robot
+    optimum: optimal_steps() of the starting position
+
+    returns: moves / optimal moves, 1.0 is the best, both counting the final step out through QUIT
+    """
+    return (moves+1) / optimum
+
+
+def free_neighbours(labyrs):
+    """Number of the neighbours of the squares inside the exit ring, which are not walls.
+    labyrs: stack of labyrinth arrays (N x rows x cols)
+    returns: array of N x (rows-4) x (cols-4)
+    """
+    free = (labyrs != 1).astype(np.int8)
+    return free[:, 1:-3, 2:-2] + free[:, 3:-1, 2:-2] + free[:, 2:-2, 1:-3] + free[:, 2:-2, 3:-1]
+
+
+def dead_ends(labyrs):
+    """returns: number of the path squares with a single free neighbour in every labyrinth of the stack"""
+    paths = labyrs[:, 2:-2, 2:-2] != 1
+    return np.count_nonzero(paths & (free_neighbours(labyrs) == 1), axis=(1, 2))
+
+
+def branching_factors(labyrs):
+    """Mean number of ways onward from the path squares which are not dead ends (the free neighbours except the
+    one the robot arrived from). It is 1 in a corridor and more than 1 with junctions.
+    returns: float array of the labyrinths of the stack
+    """
+    neighbours = free_neighbours(labyrs)
+    passages = (labyrs[:, 2:-2, 2:-2] != 1) & (neighbours >= 2)
+    counts = np.count_nonzero(passages, axis=(1, 2))
+    ways = np.where(passages, neighbours-1, 0).sum(axis=(1, 2))
+    return ways / np.maximum(counts, 1)
+
+
+def start_distances(labyrs, starts):
+    """optimal_steps() of the starting positions of a stack of labyrinths.
+    starts: int array of N x 2 of (flat index, direction)
+    returns: int array, -1 if there is no way out
+    """
+    dist = distance_field(labyrs).reshape(len(labyrs), -1)
+    return dist[np.arange(len(labyrs)), np.asarray(starts)[:, 0]]
+
+
+def wall_follower_moves(labyrs, starts, hand='right', max_moves=100000):
+    """Moves of the wall follower solver (see solvers.wall_follower) in a stack of labyrinths.
+    The robots of all labyrinths walk together: every iteration makes a step with all the robots which are still
+    in their labyrinths.
+    labyrs: stack of labyrinth arrays without the robot
+    starts: int array of N x 2 of (flat index, direction)
+    hand: 'right' or 'left'
+
+    returns: int array of the moves before stepping out, -1 if the robot did not get out in max_moves moves
+    """
+    n = len(labyrs)
+    flat = np.ascontiguousarray(labyrs).reshape(-1)
+    offsets = flat_offsets(labyrs)
+    turn = 1 if hand == 'right' else -1
+    starts = np.asarray(starts)
+    # Flat index of the robots in the whole stack
+    index = np.arange(n)*labyrs[0].size + starts[:, 0]
+    direction = starts[:, 1].astype(np.intp)
+    moves = np.full(n, -1)
+    active = np.arange(n)
+    # Turn towards the hand, then back until the way is free
+    turns = turn - turn*np.arange(4)
+    for move in range(max_moves):
+        if not active.size:
+            break
+        candidates = (direction[:, np.newaxis] + turns) % 4
+        neighbs = flat[index[:, np.newaxis] + offsets[candidates]]
+        free = neighbs != 1
+        first = free.argmax(axis=1)
+        rows = np.arange(active.size)
+        ahead = np.where(free[rows, first], neighbs[rows, first], 1)  # wall, if it is walled in
+        moves[active[ahead == 2]] = move
+        going = ahead == 0
+        direction = candidates[rows, first][going]
+        index = index[going] + offsets[direction]
+        active = active[going]
+    return moves
+
+
+class Heatmap:
+    """Visit counts of the squares of labyrinths of the same shape, summed over many runs.
+    A visit is the starting square of the robot or a square it stepped into, and it is also counted by the
+    direction of the robot.
+    The visits are collected as flat tokens (flat index*4 + direction, see native.run_script) and they are counted
+    in batches with np.bincount, so adding a run costs only extending a list.
+    """
+    def __init__(self, shape, batch_size=1000000):
+        """shape: (rows, cols) of the labyrinths
+        batch_size: number of collected tokens to count together
+        """
+        self.shape = tuple(shape)
+        self.batch_size = batch_size
+        self.counts = np.zeros(self.shape[0]*self.shape[1]*4, dtype=np.int64)
+        self.tokens = []
+        self.runs = 0
+
+    def add(self, trail):
+        """Add the tokens of a run"""
+        self.tokens.extend(trail)
+        self.runs += 1
+        if len(self.tokens) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.tokens:
+            self.counts += np.bincount(np.array(self.tokens, dtype=np.intp), minlength=self.counts.size)
+            self.tokens = []
+
+    def merge(self, other):
+        """Add the counts of another Heatmap of the same shape"""
+        other.flush()
+        self.flush()
+        self.counts += other.counts
+        self.runs += other.runs
+
+    @property
+    def directions(self):
+        """returns: rows x cols x 4 array of the visits by the direction of the robot (right, down, left, up)"""
+        self.flush()
+        return self.counts.reshape(self.shape + (4,))
+
+    @property
+    def cells(self):
+        """returns: rows x cols array of the visits"""
+        return self.directions.sum(axis=-1)
+
+    def save(self, filename):
+        """Export the heatmap as a numpy .npz file with cells, directions and runs arrays"""
+        np.savez_compressed(filename, cells=self.cells, directions=self.directions, runs=self.runs)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            heatmap = cls(data['directions'].shape[:2])
+            heatmap.counts += data['directions'].ravel()
+            heatmap.runs = int(data['runs'])
+        return heatmap
+
+
+class TrailRecorder:
+    """Recorder of a Script (see Script.recorder), which collects the moves of the robot as Heatmap tokens,
+    when the code is run by the interpreter.
+    """
+    def __init__(self, robot, trail):
+        self.trail = trail
+        self.moves = robot.moves
+
+    def record(self, script):
+        robot = script.robot
+        if robot.moves != self.moves:
+            self.moves = robot.moves
+            self.trail.append(robot.index*4 + robot.dir)
+
+
+class CoverageRecorder:
+    """Recorder of a Script (see Script.recorder), which collects the branch coverage of the run: the
+    (line, sensor result) pairs of the executed wall? and exit? lines.
+    """
+    def __init__(self, branches=None, line=1):
+        """branches: set to add the branches to
+        line: current line of the script
+        """
+        self.branches = set() if branches is None else branches
+        self.line = line
+
+    def record(self, script):
+        if 0 < self.line <= script.max_line and self.line < len(script.program):
+            command = script.program[self.line][0]
+            # The tests do not change the robot, so the sensor shows the result of the executed line
+            if command == 'wall?':
+                self.branches.add((self.line, script.robot.wall()))
+            elif command == 'exit?':
+                self.branches.add((self.line, script.robot.robot_exit()))
+        self.line = script.current_line
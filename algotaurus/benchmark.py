@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks
+==========
+Measure the speed of the interpreter and of the reference solvers on the same labyrinths and starting positions.
+With more workers, the batch evaluation of evaluate.py is also measured with a process pool and with a thread
+pool, which scales only on a free-threaded interpreter (e.g. python3.13t).
+
+Use from the command line:
+python benchmark.py -n 100 -x 51 -y 51
+python benchmark.py -n 20000 -x 7 -y 7 --workers 8
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import time
+
+import algotaurus
+import evaluate
+import generators
+import native
+import solvers
+
+# Codes of the wall followers, so the interpreter runs the same walk as the native solvers
+reference_codes = {'right hand': 'RIGHT\nEXIT? 8 3\nWALL? 4 6\nLEFT\nGOTO 2\nSTEP\nGOTO 1\nQUIT',
+                   'left hand': 'LEFT\nEXIT? 8 3\nWALL? 4 6\nRIGHT\nGOTO 2\nSTEP\nGOTO 1\nQUIT'}
+
+
+def make_labyrinths(n, x, y, labyr_type=1, seed=0):
+    """returns: list of (Robot, starting state) pairs"""
+    labyrs, starts = generators.generate_labyrinths(n, x, y, labyr_type, seed)
+    robots = [algotaurus.Robot(algotaurus.Labyrinth.from_array(labyr), start) for labyr, start in zip(labyrs, starts)]
+    return [(robot, robot.snapshot()) for robot in robots]
+
+
+def bench_solver(solver, robots, max_moves=1000000):
+    """returns: number of solved labyrinths, moves, executed lines (None for solvers), seconds"""
+    solved = moves = 0
+    start_time = time.perf_counter()
+    for robot, start in robots:
+        robot.restore(start)
+        solution = solver(robot, max_moves=max_moves)
+        solved += solution.success
+        moves += solution.moves
+    return solved, moves, None, time.perf_counter()-start_time
+
+
+def bench_code(code, robots, max_steps=1000000, backend='interpreter'):
+    """backend: 'interpreter' or 'native'
+    returns: number of solved labyrinths, moves, executed lines, seconds"""
+    solved = moves = steps = 0
+    success_message = algotaurus._('Congratulations! AlgoTaurus successfully reached the exit.')
+    start_time = time.perf_counter()
+    for robot, start in robots:
+        robot.restore(start)
+        script = algotaurus.Script(code, robot, max_line=code.count('\n')+1)
+        if backend == 'native':
+            result = native.run_script(script, max_steps)
+        else:
+            result = 'go on'
+            while result == 'go on' and script.steps < max_steps:
+                result = script.execute_command()
+        solved += result == success_message
+        moves += robot.moves - start[2]
+        steps += script.steps
+    return solved, moves, steps, time.perf_counter()-start_time
+
+
+def run_benchmarks(robots):
+    """returns: list of (name, solved, moves, executed lines, seconds)"""
+    results = []
+    for name, solver in solvers.solvers.items():
+        results.append(('solver: '+name,) + bench_solver(solver, robots))
+    for backend in ['interpreter', 'native']:
+        for name, code in reference_codes.items():
+            results.append(('%s: %s' % (backend, name),) + bench_code(code, robots, backend=backend))
+    return results
+
+
+def bench_pools(n, x, y, labyr_type=1, seed=0, workers=2, max_steps=1000000):
+    """Evaluate the right hand code with the native backend sequentially and with the pools of evaluate_codes().
+    returns: list of (name, solved, seconds)"""
+    results = []
+    for pool, pool_workers in [('sequential', 1), ('process', workers), ('thread', workers)]:
+        start_time = time.perf_counter()
+        runs = evaluate.evaluate_codes([reference_codes['right hand']], n, x, y, labyr_type, max_steps, seed, None,
+                                       'native', pool_workers, pool=pool)[0]
+        name = pool if pool_workers == 1 else '%s pool: %d workers' % (pool, pool_workers)
+        results.append((name, sum(result.outcome == 'success' for result in runs), time.perf_counter()-start_time))
+    return results
+
+
+def print_pool_results(results, n):
+    print('%-26s %8s %9s %12s %9s' % ('', 'solved', 'seconds', 'labyrs/s', 'speedup'))
+    for name, solved, seconds in results:
+        print('%-26s %8s %9.3f %12.0f %9.2f' % (name, '%d/%d' % (solved, n), seconds, n/seconds,
+                                                results[0][2]/seconds))
+
+
+def print_results(results, n):
+    print('%-26s %8s %12s %12s %9s %12s %12s' % ('', 'solved', 'mean moves', 'mean lines', 'seconds', 'moves/s',
+                                                 'lines/s'))
+    for name, solved, moves, steps, seconds in results:
+        print('%-26s %8s %12.1f %12s %9.3f %12.0f %12s' %
+              (name, '%d/%d' % (solved, n), moves/n, '-' if steps is None else '%.1f' % (steps/n), seconds,
+               moves/seconds, '-' if steps is None else '%.0f' % (steps/seconds)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmark', description='Measure the speed of AlgoTaurus runs.')
+    parser.add_argument('-n', type=int, default=100, help='number of labyrinths (default: 100)')
+    parser.add_argument('-x', type=int, default=51, help='width of the labyrinths (default: 51)')
+    parser.add_argument('-y', type=int, default=51, help='height of the labyrinths (default: 51)')
+    parser.add_argument('-t', '--type', type=int, default=1, choices=range(len(algotaurus.labyr_type_names)),
+                        help='labyrinth type (default: 1, depth first)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the labyrinths (default: 0)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of workers to compare the process and the thread pools (default: 1, no pools)')
+    args = parser.parse_args(argv)
+    print_results(run_benchmarks(make_labyrinths(args.n, args.x, args.y, args.type, args.seed)), args.n)
+    if args.workers > 1:
+        print('\nBatch evaluation, %s interpreter' % ('free-threaded' if evaluate.free_threaded() else 'GIL'))
+        print_pool_results(bench_pools(args.n, args.x, args.y, args.type, args.seed, args.workers), args.n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Labyrinth corpus
+================
+A fixed set of generated labyrinths on disk with difficulty metrics of every labyrinth, to evaluate the codes on
+labyrinths of balanced difficulty.
+
+The corpus is a directory:
+labyrs.npy: uint8 array of N x rows x cols, it is memory mapped when the corpus is opened
+starts.npy: int array of N x 2 of the starting poses (flat index, direction)
+metrics.npz: the metrics of the labyrinths (see metrics), and their orders: the indices of the labyrinths sorted
+by every metric
+
+A stratified sample splits the order of a metric into equally large buckets, and takes the same number of
+labyrinths from every bucket. The buckets are ranges of the sorted order, so a labyrinth is drawn from a bucket
+with a single random number.
+
+Use from the command line:
+python corpus.py mazes -n 100000 -x 11 -y 11 --seed 1
+python evaluate.py code.lab --corpus mazes -n 200 --strata 5 --stratify distance
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import os
+import numpy as np
+
+import analysis
+import generators
+
+# dead_ends: number of dead ends, branching: see analysis.branching_factors(),
+# distance: optimal steps out from the starting pose, right_hand, left_hand: moves of the wall followers from the
+# starting pose (-1 if they do not get out, these are sorted to the end)
+metrics = ['dead_ends', 'branching', 'distance', 'right_hand', 'left_hand']
+
+
+def measure(labyrs, starts, max_moves=100000):
+    """returns: {metric name: array} of the metrics of the labyrinths"""
+    return {'dead_ends': analysis.dead_ends(labyrs),
+            'branching': analysis.branching_factors(labyrs),
+            'distance': analysis.start_distances(labyrs, starts),
+            'right_hand': analysis.wall_follower_moves(labyrs, starts, 'right', max_moves),
+            'left_hand': analysis.wall_follower_moves(labyrs, starts, 'left', max_moves)}
+
+
+def sort_key(values):
+    """The failed runs (-1) are the most difficult ones"""
+    if values.dtype.kind == 'f':
+        return values
+    return np.where(values < 0, np.iinfo(values.dtype).max, values)
+
+
+class Corpus:
+    """Labyrinths, starting poses and metrics of a corpus directory, see the module documentation."""
+    def __init__(self, directory, mmap_mode='r'):
+        """mmap_mode: memory map mode of the labyrinths, None to read them into memory"""
+        self.directory = directory
+        self.labyrs = np.load(os.path.join(directory, 'labyrs.npy'), mmap_mode=mmap_mode)
+        self.starts = np.load(os.path.join(directory, 'starts.npy'))
+        with np.load(os.path.join(directory, 'metrics.npz')) as data:
+            self.metrics = {name: data[name] for name in metrics}
+            self.orders = {name: data['order_' + name] for name in metrics}
+            self.description = str(data['description'])
+
+    def __len__(self):
+        return len(self.labyrs)
+
+    @classmethod
+    def build(cls, directory, n, x=11, y=11, labyr_type=1, seed=None, workers=1, chunk_size=10000,
+              max_moves=100000):
+        """Generate a corpus of n labyrinths into directory (see generators.generate_labyrinths).
+        The labyrinths are written into a memory mapped file, and the metrics are measured in chunks.
+        chunk_size: number of labyrinths measured together
+        max_moves: maximum moves of the wall followers
+        """
+        os.makedirs(directory, exist_ok=True)
+        labyrs = np.lib.format.open_memmap(os.path.join(directory, 'labyrs.npy'), mode='w+', dtype=np.uint8,
+                                           shape=(n,) + generators.labyrinth_shape(x, y))
+        labyrs, starts = generators.generate_labyrinths(n, x, y, labyr_type, seed, labyrs, workers=workers)
+        labyrs.flush()
+        np.save(os.path.join(directory, 'starts.npy'), starts)
+        cls.write_metrics(directory, labyrs, starts, 'type %d, %d x %d, seed %s' % (labyr_type, x, y, seed),
+                          chunk_size, max_moves)
+        del labyrs
+        return cls(directory)
+
+    @classmethod
+    def save(cls, directory, labyrs, starts, description, max_moves=100000):
+        """Write existing labyrinths and starting poses as a corpus, e.g. a subset of another corpus"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'labyrs.npy'), labyrs)
+        np.save(os.path.join(directory, 'starts.npy'), starts)
+        cls.write_metrics(directory, labyrs, starts, description, max_moves=max_moves)
+        return cls(directory)
+
+    @staticmethod
+    def write_metrics(directory, labyrs, starts, description, chunk_size=10000, max_moves=100000):
+        """Measure the metrics of the labyrinths in chunks, and write them with their orders"""
+        chunks = [measure(labyrs[first:first+chunk_size], starts[first:first+chunk_size], max_moves)
+                  for first in range(0, len(labyrs), chunk_size)]
+        values = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in metrics}
+        orders = {'order_' + name: np.argsort(sort_key(values[name]), kind='stable') for name in metrics}
+        np.savez(os.path.join(directory, 'metrics.npz'), description=description, **values, **orders)
+
+    def bucket(self, metric, strata, stratum):
+        """returns: indices of the labyrinths in a bucket of the metric, from the easiest to the most difficult"""
+        order = self.orders[metric]
+        return order[stratum*len(order)//strata:(stratum+1)*len(order)//strata]
+
+    def sample(self, n, metric='distance', strata=5, seed=None):
+        """Stratified sample of n labyrinths without replacement, n//strata from every bucket (the remainder
+        from the first buckets).
+        returns: indices of the labyrinths, stratum of every sampled labyrinth
+        """
+        rng = np.random.default_rng(seed)
+        indices = []
+        labels = []
+        for stratum in range(strata):
+            bucket = self.bucket(metric, strata, stratum)
+            count = n//strata + (stratum < n % strata)
+            indices.append(bucket[rng.choice(len(bucket), count, replace=False)])
+            labels.append(np.full(count, stratum))
+        return np.concatenate(indices), np.concatenate(labels)
+
+    def labyrinths(self, indices):
+        """returns: the labyrinths and starting poses of the indices, read into memory"""
+        return np.array(self.labyrs[indices]), self.starts[indices]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='corpus', description='Generate an AlgoTaurus labyrinth corpus with '
+                                     'difficulty metrics.')
+    parser.add_argument('directory', help='corpus directory')
+    parser.add_argument('-n', type=int, default=100000, help='number of labyrinths (default: 100000)')
+    parser.add_argument('-x', type=int, default=11, help='width of the labyrinths (default: 11)')
+    parser.add_argument('-y', type=int, default=11, help='height of the labyrinths (default: 11)')
+    parser.add_argument('-t', '--type', type=int, default=1, help='labyrinth type (default: 1, depth first)')
+    parser.add_argument('--seed', type=int, help='random seed of the labyrinths')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (default: 1)')
+    parser.add_argument('--strata', type=int, default=5, help='number of buckets to summarize (default: 5)')
+    args = parser.parse_args(argv)
+    corpus = Corpus.build(args.directory, args.n, args.x, args.y, args.type, args.seed, args.workers)
+    print('%d labyrinths, %s' % (len(corpus), corpus.description))
+    print('%-12s' % 'bucket' + ''.join('%12s' % name for name in metrics))
+    for stratum in range(args.strata):
+        # Mean of the metrics in the buckets of the distance
+        bucket = corpus.bucket('distance', args.strata, stratum)
+        print('%-12d' % stratum + ''.join('%12.2f' % corpus.metrics[name][bucket].mean() for name in metrics))
+
+
+if __name__ == '__main__':
+    main()
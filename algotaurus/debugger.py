@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Debugger
+========
+Run a code at full speed until a breakpoint, and show watch expressions of the state where the run paused.
+
+Breakpoints:
+line n: pause before line n is executed
+cell row col: pause after the robot stepped into the square (row and column of the labyrinth array)
+direction right|down|left|up: pause after the robot turned into the direction
+steps n: pause when n lines are executed
+
+A breakpoint may have conditions:
+hits n: pause when the breakpoint is reached the nth time, and every time after it
+if expression: pause only if the watch expression is true
+e.g. 'line 7 hits 1000', 'cell 5 9 if moves > 100', 'direction up', 'steps 2000000'
+
+The breakpoints are checked in the debug variant of the native backend (see native.generate_source): the lines
+only check if the line, the cell or the direction is one of the breakpoints, and the hits and the conditions are
+checked by Debugger.probe() only then. The steps breakpoints are the step limits of the runs. The user interface
+is not updated until the run pauses. If the script records a trace, the lines are run by the interpreter instead,
+with the same breakpoints.
+
+Watch expressions are Python expressions of the state of the run: line, steps, moves, row, col, direction (0-3:
+right, down, left, up), wall, exit (the sensors of the robot) and hits (list of the hits of the breakpoints).
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import collections
+
+import native
+
+directions = ['right', 'down', 'left', 'up']
+
+# kind: 'line', 'cell', 'direction' or 'steps'
+# value: line number, (row, col), direction (0-3) or number of executed lines
+# hits: the breakpoint pauses from the hits-th time it is reached
+# condition: watch expression, the breakpoint pauses only if it is true, or None
+Breakpoint = collections.namedtuple('Breakpoint', 'kind value hits condition', defaults=(1, None))
+
+
+def parse_breakpoint(text):
+    """Parse the text form of a breakpoint, see the module documentation.
+    returns: Breakpoint
+    raises ValueError if the text is not a breakpoint
+    """
+    text, separator, condition = text.strip().partition(' if ')
+    words = text.lower().split()
+    hits = 1
+    if len(words) >= 2 and words[-2] == 'hits':
+        hits = int(words[-1])
+        words = words[:-2]
+    if not words:
+        raise ValueError('Empty breakpoint.')
+    kind, params = words[0], words[1:]
+    if kind in ['line', 'steps'] and len(params) == 1:
+        value = int(params[0])
+    elif kind == 'cell' and len(params) == 2:
+        value = (int(params[0]), int(params[1]))
+    elif kind == 'direction' and len(params) == 1 and params[0] in directions:
+        value = directions.index(params[0])
+    else:
+        raise ValueError('Unknown breakpoint: %s' % text)
+    condition = condition.strip() or None
+    if condition is not None:
+        compile_expression(condition)
+    return Breakpoint(kind, value, hits, condition)
+
+
+def format_breakpoint(breakpoint):
+    """returns: the text form of the breakpoint"""
+    kind, value, hits, condition = breakpoint
+    if kind == 'cell':
+        value = '%d %d' % value
+    elif kind == 'direction':
+        value = directions[value]
+    return '%s %s%s%s' % (kind, value, ' hits %d' % hits if hits > 1 else '',
+                          ' if %s' % condition if condition else '')
+
+
+def compile_expression(expression):
+    """raises ValueError if the expression is not valid"""
+    try:
+        return compile(expression, '<watch>', 'eval')
+    except SyntaxError as error:
+        raise ValueError('Invalid expression: %s' % error.msg)
+
+
+# Lines run between the updates of the user interface, when running to a breakpoint
+chunk_steps = 200000
+
+
+class Debugger:
+    """Breakpoints and watch expressions of the runs of a Script.
+    The breakpoints are kept for the next runs, a run is started with attach().
+    After the run paused at a breakpoint, paused is the index of the breakpoint.
+    """
+    def __init__(self, script=None, breakpoints=(), watches=()):
+        """script: Script object to attach
+        breakpoints: Breakpoint objects or their text forms
+        watches: watch expressions
+        """
+        self.script = None
+        self.breakpoints = []
+        self.conditions = []
+        self.hits = []
+        self.watches = []
+        self.attach(script)
+        for breakpoint in breakpoints:
+            self.add(breakpoint)
+        for watch in watches:
+            self.add_watch(watch)
+
+    def attach(self, script):
+        """Start debugging a new run of a script: the hits are counted from zero"""
+        self.script = script
+        self.hits = [0] * len(self.breakpoints)
+        self.paused = None
+        self.resume = False  # the run continues at the line where it paused, so the line is not checked again
+        self.line_pause = None  # state of the script where it paused at a line breakpoint
+        self.steps_limit = None  # step limit of the current run
+        self.update()
+
+    def add(self, breakpoint):
+        """breakpoint: Breakpoint or its text form"""
+        if isinstance(breakpoint, str):
+            breakpoint = parse_breakpoint(breakpoint)
+        self.breakpoints.append(breakpoint)
+        self.conditions.append(None if breakpoint.condition is None else compile_expression(breakpoint.condition))
+        self.hits.append(0)
+        self.update()
+
+    def remove(self, i):
+        for items in [self.breakpoints, self.conditions, self.hits]:
+            del items[i]
+        self.update()
+
+    def clear(self):
+        self.breakpoints, self.conditions, self.hits = [], [], []
+        self.update()
+
+    def toggle_line(self, line):
+        """Remove the breakpoints of the line, or add a line breakpoint without conditions"""
+        found = [i for i, breakpoint in enumerate(self.breakpoints)
+                 if breakpoint.kind == 'line' and breakpoint.value == line]
+        for i in reversed(found):
+            self.remove(i)
+        if not found:
+            self.add(Breakpoint('line', line))
+
+    def update(self):
+        """Collect the breakpoints for the native backend"""
+        cols = self.script.robot.cols if self.script is not None else 0
+        self.lines = tuple(sorted({breakpoint.value for breakpoint in self.breakpoints if breakpoint.kind == 'line'}))
+        self.cells = frozenset(breakpoint.value[0]*cols + breakpoint.value[1] for breakpoint in self.breakpoints
+                               if breakpoint.kind == 'cell')
+        self.facing = frozenset(breakpoint.value for breakpoint in self.breakpoints
+                                if breakpoint.kind == 'direction')
+
+    def breaks(self):
+        """returns: the breakpoints of the debug variant of the native backend"""
+        return self.lines, bool(self.cells), bool(self.facing)
+
+    def add_watch(self, expression):
+        compile_expression(expression)
+        self.watches.append(expression)
+
+    def clear_watches(self):
+        self.watches = []
+
+    def names(self, line=None, index=None, direction=None, moves=None, remaining=None):
+        """Names of the watch expressions. The state is the current state of the script, or the state of the run
+        in the native backend (remaining: lines to run until the step limit).
+        """
+        script, robot = self.script, self.script.robot
+        if line is None:
+            line, index, direction, moves, steps = script.snapshot()
+        else:
+            steps = self.steps_limit - remaining
+        row, col = divmod(index, robot.cols)
+        return {'line': line, 'steps': steps, 'moves': moves, 'row': row, 'col': col, 'direction': direction,
+                'wall': robot.walls[index] >> direction & 1 == 1, 'exit': robot.exits[index] >> direction & 1 == 1,
+                'hits': list(self.hits)}
+
+    def watch_values(self):
+        """returns: list of (expression, value text) of the watch expressions in the current state"""
+        names = self.names()
+        values = []
+        for expression in self.watches:
+            try:
+                value = repr(eval(expression, {'__builtins__': {}}, dict(names)))
+            except Exception as error:
+                value = '%s: %s' % (type(error).__name__, error)
+            values.append((expression, value))
+        return values
+
+    def probe(self, kind, line, index, direction, moves, remaining):
+        """Count the hits of the breakpoints of a line, a cell or a direction reached by the run.
+        returns: True if the run pauses
+        """
+        value = {'line': line, 'cell': (index // self.script.robot.cols, index % self.script.robot.cols),
+                 'direction': direction}[kind]
+        names = None
+        for i, breakpoint in enumerate(self.breakpoints):
+            if breakpoint.kind != kind or breakpoint.value != value:
+                continue
+            self.hits[i] += 1
+            if self.hits[i] < breakpoint.hits or self.paused is not None:
+                continue
+            if self.conditions[i] is not None:
+                if names is None:
+                    names = self.names(line, index, direction, moves, remaining)
+                try:
+                    if not eval(self.conditions[i], {'__builtins__': {}}, dict(names)):
+                        continue
+                except Exception:
+                    continue
+            self.paused = i
+        return self.paused is not None
+
+    def run(self, max_steps=chunk_steps):
+        """Run the script until a result, a breakpoint or until max_steps lines are executed.
+        returns: result message, 'go on' if the step limit was reached, 'break' if the run paused at a breakpoint
+        (see paused)
+        """
+        script = self.script
+        self.paused = None
+        self.resume = self.line_pause == script.snapshot()
+        limit = max_steps
+        for breakpoint in self.breakpoints:
+            if breakpoint.kind == 'steps' and breakpoint.value > script.steps:
+                limit = min(limit, breakpoint.value - script.steps)
+        self.steps_limit = script.steps + limit
+        if script.recorder is None:
+            result = native.run_script(script, limit, debugger=self)
+        else:
+            result = self.run_interpreted(limit)
+        if result == 'go on':
+            self.probe_steps()
+        paused_at_line = self.paused is not None and self.breakpoints[self.paused].kind == 'line'
+        self.line_pause = script.snapshot() if paused_at_line else None
+        return 'break' if self.paused is not None else result
+
+    def probe_steps(self):
+        """Check the steps breakpoints reached by the run"""
+        for i, breakpoint in enumerate(self.breakpoints):
+            if breakpoint.kind == 'steps' and breakpoint.value == self.script.steps and self.paused is None:
+                self.hits[i] += 1
+                names = self.names()
+                try:
+                    if self.conditions[i] is None or eval(self.conditions[i], {'__builtins__': {}}, names):
+                        self.paused = i
+                except Exception:
+                    pass
+
+    def run_interpreted(self, max_steps):
+        """Run the lines with Script.execute_command, so the recorder of the script records them.
+        returns: result message, 'go on' if the step limit was reached, 'break' if the run paused
+        """
+        script, robot = self.script, self.script.robot
+        for i in range(max_steps):
+            remaining = max_steps - i
+            if (script.current_line in self.lines and not (i == 0 and self.resume) and
+                    self.probe('line', script.current_line, robot.index, robot.dir, robot.moves, remaining)):
+                return 'break'
+            index, direction = robot.index, robot.dir
+            result = script.execute_command()
+            if result != 'go on':
+                return result
+            remaining -= 1
+            if robot.index != index and robot.index in self.cells and \
+                    self.probe('cell', script.current_line, robot.index, robot.dir, robot.moves, remaining):
+                return 'break'
+            if robot.dir != direction and robot.dir in self.facing and \
+                    self.probe('direction', script.current_line, robot.index, robot.dir, robot.moves, remaining):
+                return 'break'
+        return 'go on'
@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+"""
+Batch evaluation
+================
+Run an AlgoTaurus code on many labyrinths and summarize the results.
+
+Use from the command line:
+python evaluate.py code.lab -n 100
+python evaluate.py code1.lab code2.lab -n 100000 --workers 16
+python evaluate.py code.lab -n 100000 -x 5 -y 5 --workers 16 --pool thread
+python evaluate.py code.lab -n 100000 -x 5 -y 5 --index results.idx
+python evaluate.py code.lab -n 1000 --threshold 0.9
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import functools
+import math
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+import algotaurus
+import analysis
+import corpus
+import generators
+import native
+import solvers
+
+# outcome: 'success', 'failure' or 'timeout'
+# message: result message of the run
+# steps: executed lines, moves: steps of the robot
+# optimum: optimal number of steps out of the labyrinth, efficiency: see analysis.efficiency() (None if not successful)
+# reference: moves of the reference solver from the same starting position (None if not run or not successful)
+# duration: seconds of running the code
+Result = collections.namedtuple('Result', ['outcome', 'message', 'steps', 'moves', 'optimum', 'efficiency',
+                                           'reference', 'duration'])
+
+# verdict: 'pass' if the pass rate of the code is at least the threshold, 'fail' otherwise
+# decided: the verdict is decided at the confidence, otherwise it is the verdict of the observed pass rate at the
+# maximum number of labyrinths
+# passed, low, high: passed labyrinths, confidence interval of the pass rate (see wilson_interval())
+# results: Results of the evaluated labyrinths
+Grade = collections.namedtuple('Grade', ['verdict', 'decided', 'passed', 'low', 'high', 'results'])
+
+success_message = algotaurus._('Congratulations! AlgoTaurus successfully reached the exit.')
+
+
+def run_code(code, lab, max_steps=100000, reference=None, backend='native', start=None, trail=None):
+    """Run the code in a labyrinth.
+    code: multi line string
+    lab: Labyrinth object, the robot is placed in it
+    max_steps: maximum number of executed lines
+    reference: name of the reference solver in solvers.solvers to run from the same starting position
+    backend: 'native' (see native.py) or 'interpreter' (Script.execute_command)
+    start: starting pose of the robot (see Robot), random by default
+    trail: list to collect the visits of the robot as analysis.Heatmap tokens
+
+    returns: Result
+    """
+    code = code.rstrip()
+    robot = algotaurus.Robot(lab, start)
+    if trail is not None:
+        trail.append(robot.index*4 + robot.dir)
+    optimum = analysis.optimal_steps(lab.labyr, robot.index)
+    reference_moves = None
+    if reference is not None:
+        start = robot.snapshot()
+        solution = solvers.solvers[reference](robot, max_moves=max_steps)
+        reference_moves = solution.moves if solution.success else None
+        robot.restore(start)
+    if code == '':
+        return Result('failure', algotaurus._('There is no command to execute!'), 0, 0, optimum, None,
+                      reference_moves, 0.0)
+    start_time = time.perf_counter()
+    recorder = analysis.TrailRecorder(robot, trail) if trail is not None and backend != 'native' else None
+    script = algotaurus.Script(code, robot, max_line=code.count('\n')+1, recorder=recorder)
+    if backend == 'native':
+        result = native.run_script(script, max_steps, trail)
+    else:
+        result = 'go on'
+        while result == 'go on' and script.steps < max_steps:
+            result = script.execute_command()
+    duration = time.perf_counter() - start_time
+    if result == success_message:
+        return Result('success', result, script.steps, robot.moves, optimum,
+                      analysis.efficiency(robot.moves, optimum), reference_moves, duration)
+    return Result('timeout' if result == 'go on' else 'failure', result, script.steps, robot.moves, optimum, None,
+                  reference_moves, duration)
+
+
+def free_threaded():
+    """returns: True if the interpreter runs without the global interpreter lock (free-threaded build, e.g.
+    python3.13t)"""
+    return not getattr(sys, '_is_gil_enabled', lambda: True)()
+
+
+def evaluate(code, n=100, x=11, y=11, labyr_type=1, max_steps=100000, seed=None, reference='right hand',
+             backend='native', workers=1, pool='auto'):
+    """Run the code in n random labyrinths.
+    seed: seed of the random labyrinths and starting positions, to evaluate different codes on the same labyrinths
+    reference: name of the reference solver or None
+    backend: 'native' or 'interpreter'
+    workers, pool: number of workers and their pool, see evaluate_codes()
+
+    returns: list of Results
+    """
+    return evaluate_codes([code], n, x, y, labyr_type, max_steps, seed, reference, backend, workers, pool=pool)[0]
+
+
+def evaluate_codes(codes, n=100, x=11, y=11, labyr_type=1, max_steps=100000, seed=None, reference='right hand',
+                   backend='native', workers=1, return_heatmaps=False, dedupe=False, result_index=None,
+                   labyrinths=None, pool='auto'):
+    """Run every code in the same n random labyrinths.
+    The labyrinths are generated once (see generators.generate_labyrinths), and the (labyrinth index, code index)
+    items are run in chunks by the workers.
+    With a process pool, the labyrinths are placed in shared memory, and the worker processes get the codes when
+    they start, so only the items and the results are sent between the processes.
+    With a thread pool, the threads read the same read-only labyrinth arrays, and every run has its own Robot and
+    Script, so nothing is serialized. It scales across the cores only on a free-threaded interpreter, but it does
+    not pay the startup of the processes.
+    return_heatmaps: also collect the visits of the robot for every code
+    dedupe: run a code only once in the labyrinths which are the same up to rotation and reflection (see
+    fingerprint.py), the duplicates get the same Result
+    result_index: fingerprint.ResultIndex of earlier results, the known results are not run again, and the new ones
+    are added to it; it implies dedupe
+    labyrinths: (labyrinths array, starts array) to use instead of generating n labyrinths, e.g. a sample of a
+    corpus.Corpus
+    pool: 'process', 'thread', or 'auto' to use threads on a free-threaded interpreter and processes otherwise
+
+    returns: list of the lists of Results of the codes, and the list of analysis.Heatmap objects of the codes if
+    return_heatmaps is set
+    """
+    dedupe = dedupe or result_index is not None
+    if dedupe and return_heatmaps:
+        raise ValueError('the heatmaps cannot be collected with deduplication')
+    if labyrinths is not None:
+        n = len(labyrinths[0])
+        shape = labyrinths[0].shape[1:]
+    else:
+        shape = generators.labyrinth_shape(x, y)
+    heatmaps = [analysis.Heatmap(shape) for code in codes] if return_heatmaps else None
+    results = [[None]*n for code in codes]
+    items = [(index, code_id) for code_id in range(len(codes)) for index in range(n)]
+    keys = None
+    if pool == 'auto':
+        pool = 'thread' if free_threaded() else 'process'
+    if workers <= 1 or pool == 'thread':
+        if labyrinths is not None:
+            labyrs, starts = labyrinths
+        else:
+            labyrs, starts = generators.generate_labyrinths(n, x, y, labyr_type, seed)
+        if dedupe:
+            items, keys, known = _dedupe_items(codes, labyrs, starts, max_steps, reference, result_index)
+        if workers > 1:
+            # The threads share the labyrinths, a read-only view guards them
+            labyrs = np.asarray(labyrs).view()
+            labyrs.flags.writeable = False
+        run_chunk = functools.partial(run_items, labyrs, starts, codes, max_steps, reference, backend,
+                                      return_heatmaps)
+        if workers <= 1:
+            chunk_outputs = [run_chunk(items)]
+        else:
+            chunk_size = max(1, len(items) // (workers*16))
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                chunks = [items[first:first+chunk_size] for first in range(0, len(items), chunk_size)]
+                chunk_outputs = list(executor.map(run_chunk, chunks))
+        for chunk_results, chunk_heatmaps in chunk_outputs:
+            for index, code_id, result in chunk_results:
+                results[code_id][index] = result
+            for code_id, heatmap in chunk_heatmaps.items():
+                heatmaps[code_id].merge(heatmap)
+    else:
+        if labyrinths is not None:
+            shared = generators.SharedLabyrinths.from_arrays(*labyrinths)
+        else:
+            shared = generators.SharedLabyrinths.create(n, x, y, labyr_type, seed)
+        with shared:
+            if dedupe:
+                items, keys, known = _dedupe_items(codes, shared.labyrs, shared.starts, max_steps, reference,
+                                                   result_index)
+            chunk_size = max(1, len(items) // (workers*16))
+            with concurrent.futures.ProcessPoolExecutor(
+                    workers, initializer=_init_worker,
+                    initargs=(shared.descriptor, codes, max_steps, reference, backend, return_heatmaps)) as executor:
+                chunks = [items[first:first+chunk_size] for first in range(0, len(items), chunk_size)]
+                for chunk_results, chunk_visits in executor.map(_run_items, chunks):
+                    for index, code_id, result in chunk_results:
+                        results[code_id][index] = result
+                    for code_id, (tokens, counts, runs) in chunk_visits.items():
+                        heatmaps[code_id].counts[tokens] += counts
+                        heatmaps[code_id].runs += runs
+    if keys is not None:
+        # Copy the results of the run items and the known results to the duplicates
+        new = {keys[code_id][index]: results[code_id][index] for index, code_id in items}
+        if result_index is not None:
+            result_index.add(new)
+        known.update(new)
+        results = [[known[key] for key in code_keys] for code_keys in keys]
+    return (results, heatmaps) if return_heatmaps else results
+
+
+def _dedupe_items(codes, labyrs, starts, max_steps, reference, result_index):
+    """Select the items to run with deduplication, see evaluate_codes().
+    returns: items to run, fingerprint.result_key() of every labyrinth of every code, known results of the index
+    """
+    import fingerprint
+    digests, canonical = fingerprint.fingerprints(labyrs, starts)
+    keys = []
+    for code in codes:
+        programs = fingerprint.program_keys(code.rstrip())
+        keys.append([fingerprint.result_key(digest, transform, programs, reference, max_steps)
+                     for digest, transform in zip(digests, canonical)])
+    known = (result_index.get(key for code_keys in keys for key in code_keys) if result_index is not None
+             else {})
+    items = []
+    selected = set(known)
+    for code_id, code_keys in enumerate(keys):
+        for index, key in enumerate(code_keys):
+            if key not in selected:
+                selected.add(key)
+                items.append((index, code_id))
+    return items, keys, known
+
+
+def run_items(labyrs, starts, codes, max_steps, reference, backend, return_heatmaps, items):
+    """Run a chunk of (labyrinth index, code index) items of evaluate_codes().
+    The labyrinth arrays are only read, every run copies its labyrinth.
+    returns: list of (labyrinth index, code index, Result), and {code index: analysis.Heatmap} of the codes in the
+    chunk if return_heatmaps is set
+    """
+    results = []
+    heatmaps = {}
+    for index, code_id in items:
+        trail = [] if return_heatmaps else None
+        lab = algotaurus.Labyrinth.from_array(labyrs[index])
+        results.append((index, code_id, run_code(codes[code_id], lab, max_steps, reference, backend,
+                                                 starts[index], trail)))
+        if return_heatmaps:
+            heatmaps.setdefault(code_id, analysis.Heatmap(labyrs.shape[1:])).add(trail)
+    return results, heatmaps
+
+
+_worker = {}  # state of a worker process of evaluate_codes()
+
+
+def _init_worker(descriptor, codes, max_steps, reference, backend, return_heatmaps):
+    _worker['shared'] = generators.SharedLabyrinths.attach(descriptor)
+    _worker['args'] = codes, max_steps, reference, backend, return_heatmaps
+
+
+def _run_items(items):
+    """Run a chunk of items in a worker process, see run_items().
+    returns: list of (labyrinth index, code index, Result), and the visits of the codes in the chunk as
+    {code index: (tokens, counts, runs)}
+    """
+    shared = _worker['shared']
+    results, heatmaps = run_items(shared.labyrs, shared.starts, *_worker['args'], items)
+    visits = {}
+    for code_id, heatmap in heatmaps.items():
+        heatmap.flush()
+        # Only the visited tokens are sent back
+        tokens = np.flatnonzero(heatmap.counts)
+        visits[code_id] = tokens, heatmap.counts[tokens], heatmap.runs
+    return results, visits
+
+
+def wilson_interval(passed, n, confidence=0.95):
+    """Wilson score interval of a pass rate
+    returns: lower and upper bounds"""
+    if n == 0:
+        return 0.0, 1.0
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence/2)
+    rate = passed / n
+    center = (rate + z*z/(2*n)) / (1 + z*z/n)
+    half_width = z*math.sqrt(rate*(1-rate)/n + z*z/(4*n*n)) / (1 + z*z/n)
+    return max(0.0, center-half_width), min(1.0, center+half_width)
+
+
+def sprt_verdict(passed, n, threshold, confidence=0.95, indifference=0.05):
+    """Sequential probability ratio test of the pass rate being threshold+indifference against
+    threshold-indifference, with both error rates 1-confidence.
+    returns: 'pass', 'fail' or None if it is not decided yet
+    """
+    low, high = max(threshold-indifference, 0.0), min(threshold+indifference, 1.0)
+    ratio = 0.0
+    for count, p_high, p_low in [(passed, high, low), (n-passed, 1-high, 1-low)]:
+        if count:
+            if p_high == 0:
+                return 'fail'
+            if p_low == 0:
+                return 'pass'
+            ratio += count * math.log(p_high/p_low)
+    error = 1 - confidence
+    if ratio >= math.log((1-error)/error):
+        return 'pass'
+    if ratio <= math.log(error/(1-error)):
+        return 'fail'
+    return None
+
+
+def grade(code, threshold=0.9, confidence=0.95, method='wilson', min_mazes=10, max_mazes=1000, x=11, y=11,
+          labyr_type=1, max_steps=100000, seed=None, reference=None, backend='native', batch_size=20):
+    """Decide whether the pass rate of the code is at least the threshold, evaluating only as many labyrinths
+    as needed. The labyrinths are generated in batches, in the same order as by evaluate() with the same seed,
+    and the verdict is checked after every labyrinth.
+    method: 'wilson': stop when the Wilson interval at the confidence is above or below the threshold;
+    'sprt': stop when the sequential probability ratio test decides (see sprt_verdict())
+    min_mazes: minimum number of labyrinths to evaluate
+    max_mazes: the evaluation stops here without a decision
+
+    returns: Grade
+    """
+    shape = generators.labyrinth_shape(x, y)
+    labyrs = np.empty((batch_size,) + shape, dtype=np.uint8)
+    starts = np.empty((batch_size, 2), dtype=np.int64)
+    results = []
+    passed = 0
+    verdict = None
+    for first in range(0, max_mazes, batch_size):
+        count = min(batch_size, max_mazes-first)
+        generators.fill_labyrinths(labyrs[:count], starts[:count], labyr_type, seed, first)
+        for labyr, start in zip(labyrs[:count], starts[:count]):
+            result = run_code(code, algotaurus.Labyrinth.from_array(labyr), max_steps, reference, backend, start)
+            results.append(result)
+            passed += result.outcome == 'success'
+            if len(results) < min_mazes:
+                continue
+            if method == 'sprt':
+                verdict = sprt_verdict(passed, len(results), threshold, confidence)
+            else:
+                low, high = wilson_interval(passed, len(results), confidence)
+                verdict = 'pass' if low >= threshold else 'fail' if high < threshold else None
+            if verdict is not None:
+                break
+        if verdict is not None:
+            break
+    low, high = wilson_interval(passed, len(results), confidence)
+    if verdict is None:
+        return Grade('pass' if passed >= threshold*len(results) else 'fail', False, passed, low, high, results)
+    return Grade(verdict, True, passed, low, high, results)
+
+
+def summary(results):
+    """returns: dictionary of the summary statistics of the results"""
+    passed = [result for result in results if result.outcome == 'success']
+    references = [result.reference for result in passed if result.reference is not None]
+    return {'labyrinths': len(results),
+            'passed': len(passed),
+            'pass rate': len(passed) / len(results) if results else 0.0,
+            'timeouts': sum(result.outcome == 'timeout' for result in results),
+            'mean steps': np.mean([result.steps for result in passed]) if passed else None,
+            'mean moves': np.mean([result.moves for result in passed]) if passed else None,
+            'mean efficiency': np.mean([result.efficiency for result in passed]) if passed else None,
+            'mean reference moves': np.mean(references) if references else None}
+
+
+def print_summary(stats):
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = '%.3f' % value
+        print('%-22s %s' % (key.capitalize()+':', value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='evaluate', description='Run an AlgoTaurus code on many labyrinths.')
+    parser.add_argument('codes', nargs='+', metavar='code', help='AlgoTaurus code file (.lab)')
+    parser.add_argument('-n', type=int, default=100, help='number of labyrinths (default: 100)')
+    parser.add_argument('-x', type=int, default=11, help='width of the labyrinths (default: 11)')
+    parser.add_argument('-y', type=int, default=11, help='height of the labyrinths (default: 11)')
+    parser.add_argument('-t', '--type', type=int, default=1, choices=range(len(algotaurus.labyr_type_names)),
+                        help='labyrinth type (default: 1, depth first)')
+    parser.add_argument('--max-steps', type=int, default=100000,
+                        help='maximum number of executed lines in a labyrinth (default: 100000)')
+    parser.add_argument('--seed', type=int, help='random seed of the labyrinths')
+    parser.add_argument('--reference', choices=list(solvers.solvers) + ['none'],
+                        help='reference solver to compare the moves with (default: right hand, none with '
+                             '--threshold, as the grading uses only the pass rate)')
+    parser.add_argument('--backend', default='native', choices=['native', 'interpreter'],
+                        help='run the code translated to Python or with the interpreter (default: native)')
+    parser.add_argument('--workers', type=int, default=1, help='number of workers (default: 1)')
+    parser.add_argument('--pool', default='auto', choices=['auto', 'process', 'thread'],
+                        help='pool of the workers, auto uses threads on a free-threaded interpreter and processes '
+                             'otherwise (default: auto)')
+    parser.add_argument('--heatmaps', action='store_true',
+                        help='export the visits of the robot of every code into a code.heatmap.npz file')
+    parser.add_argument('--store', metavar='DATABASE', help='store the results in a results database (see store.py)')
+    parser.add_argument('--name', default='', help='name of the submitter in the results database')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='run the codes only once in the labyrinths which are the same up to rotation and '
+                             'reflection')
+    parser.add_argument('--index', metavar='FILE',
+                        help='reuse the results of the same labyrinths and codes from an index file, and add the new '
+                             'results to it (see fingerprint.py)')
+    parser.add_argument('--threshold', type=float,
+                        help='grade the codes adaptively: decide whether their pass rate is at least this, '
+                             'evaluating at most n labyrinths')
+    parser.add_argument('--min-mazes', type=int, default=10,
+                        help='minimum number of labyrinths of the adaptive grading (default: 10)')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='confidence of the adaptive grading (default: 0.95)')
+    parser.add_argument('--method', default='wilson', choices=['wilson', 'sprt'],
+                        help='stopping rule of the adaptive grading (default: wilson)')
+    parser.add_argument('--corpus', metavar='DIRECTORY',
+                        help='sample the labyrinths from a corpus (see corpus.py) instead of generating them')
+    parser.add_argument('--suite', metavar='DIRECTORY',
+                        help='evaluate on all labyrinths of a corpus, e.g. of a test suite (see suite.py)')
+    parser.add_argument('--strata', type=int, default=5,
+                        help='number of difficulty buckets of the corpus sample (default: 5)')
+    parser.add_argument('--stratify', default='distance',
+                        choices=corpus.metrics,
+                        help='difficulty metric of the buckets (default: distance)')
+    args = parser.parse_args(argv)
+    if args.threshold is not None:
+        # The adaptive grading runs the generated labyrinths one by one
+        unsupported = [option for option, value in [('--corpus', args.corpus), ('--suite', args.suite),
+                                                    ('--workers', args.workers > 1), ('--heatmaps', args.heatmaps),
+                                                    ('--store', args.store), ('--dedupe', args.dedupe),
+                                                    ('--index', args.index)] if value]
+        if unsupported:
+            parser.error('--threshold cannot be used with %s' % ', '.join(unsupported))
+    codes = []
+    for code_filename in args.codes:
+        with open(code_filename, encoding='utf-8') as code_file:
+            codes.append(code_file.read())
+    if args.reference is None:
+        reference = None if args.threshold is not None else 'right hand'
+    else:
+        reference = None if args.reference == 'none' else args.reference
+    if args.threshold is not None:
+        for code_filename, code in zip(args.codes, codes):
+            code_grade = grade(code, args.threshold, args.confidence, args.method, min_mazes=args.min_mazes,
+                               max_mazes=args.n, x=args.x, y=args.y, labyr_type=args.type, max_steps=args.max_steps,
+                               seed=args.seed, reference=reference, backend=args.backend)
+            print('%-22s %s%s' % (code_filename+':', code_grade.verdict, '' if code_grade.decided else
+                                  ' (not decided)'))
+            print('%-22s %d' % ('Labyrinths:', len(code_grade.results)))
+            print('%-22s %d' % ('Passed:', code_grade.passed))
+            print('%-22s %.3f-%.3f' % ('Pass rate interval:', code_grade.low, code_grade.high))
+        return
+    result_index = None
+    if args.index:
+        import fingerprint
+        result_index = fingerprint.ResultIndex(args.index)
+    labyrinths = mazes = strata = None
+    maze_set = 'type %d, %d x %d, seed %s' % (args.type, args.x, args.y, args.seed)
+    if args.corpus:
+        maze_corpus = corpus.Corpus(args.corpus)
+        mazes, strata = maze_corpus.sample(args.n, args.stratify, args.strata, args.seed)
+        labyrinths = maze_corpus.labyrinths(mazes)
+        mazes = mazes.tolist()
+        maze_set = 'corpus %s, %d %s strata, seed %s' % (maze_corpus.description, args.strata, args.stratify,
+                                                         args.seed)
+    elif args.suite:
+        maze_corpus = corpus.Corpus(args.suite, mmap_mode=None)
+        labyrinths = maze_corpus.labyrs, maze_corpus.starts
+        maze_set = 'suite %s' % maze_corpus.description
+    results = evaluate_codes(codes, args.n, args.x, args.y, args.type, args.max_steps, args.seed, reference,
+                             args.backend, args.workers, args.heatmaps, args.dedupe, result_index, labyrinths,
+                             args.pool)
+    if result_index is not None:
+        result_index.close()
+    if args.heatmaps:
+        results, heatmaps = results
+        for code_filename, heatmap in zip(args.codes, heatmaps):
+            heatmap.save(os.path.splitext(code_filename)[0] + '.heatmap.npz')
+    if args.store:
+        import store
+        with store.ResultStore(args.store) as result_store:
+            for code, code_results in zip(codes, results):
+                result_store.add_results(result_store.add_submission(code, maze_set, args.name), code_results,
+                                         mazes)
+    for code_filename, code_results in zip(args.codes, results):
+        if len(args.codes) > 1:
+            print('\n' + code_filename)
+        print_summary(summary(code_results))
+        if strata is not None:
+            passed = np.array([result.outcome == 'success' for result in code_results])
+            print('%-22s %s' % ('Pass rate by stratum:', ' '.join('%.3f' % passed[strata == stratum].mean()
+                                                                   for stratum in range(args.strata))))
+
+
+if __name__ == '__main__':
+    main()
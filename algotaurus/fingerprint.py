@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Labyrinth fingerprints
+======================
+Canonical fingerprints of labyrinths with the starting pose of the robot, to find the labyrinths which are the same
+up to rotation and reflection, and to evaluate them only once.
+
+The fingerprint is the hash of the smallest one of the 8 rotated and reflected variants of the labyrinth and the
+pose (the dihedral transforms), so all the variants get the same fingerprint. The transforms are numpy views of the
+whole stack of labyrinths, and the pose is transformed with them.
+
+The commands of the robot are relative to its direction, so a code gives the same result in a rotated labyrinth.
+A reflection swaps left and right, so in a reflected labyrinth the code gives the same result as the mirrored code
+(left and right commands swapped) in the original one. The results are keyed with the fingerprint and the code
+seen in the frame of the canonical variant, see result_key().
+
+ResultIndex is an SQLite file of the results keyed this way, so the duplicates of a labyrinth in later
+evaluations are not run again.
+
+Use from the command line:
+python fingerprint.py -n 10000 --seed 1
+python evaluate.py code.lab -n 10000 --seed 1 --index results.idx
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import numpy as np
+
+import generators
+import store
+
+# Reference solvers which are the same in a rotated labyrinth, and their mirrored pairs in a reflected one
+rotation_invariant_solvers = {'right hand', 'left hand', 'tremaux'}
+mirrored_solvers = {'right hand': 'left hand', 'left hand': 'right hand'}
+
+
+def transforms(labyrs, starts):
+    """The 8 dihedral transforms of a stack of labyrinths and poses.
+    labyrs: uint8 array of N x rows x cols, without the robot
+    starts: int array of N x 2 of (flat index, direction)
+
+    yields: transform number (0-3: rotated 0-3 times counterclockwise, 4-7: the same after a reflection), view of
+    the transformed labyrinths, transformed starts
+    """
+    labyrs = np.asarray(labyrs)
+    starts = np.asarray(starts, dtype=np.int64)
+    for reflection in range(2):
+        variants = labyrs
+        rows, cols = divmod(starts[:, 0], labyrs.shape[2])
+        directions = starts[:, 1]
+        if reflection:
+            # Reflect the columns: right and left are swapped
+            variants = labyrs[:, :, ::-1]
+            cols = labyrs.shape[2]-1 - cols
+            directions = (2-directions) % 4
+        for rotation in range(4):
+            if rotation:
+                # Rotate counterclockwise: (row, col) -> (width-1-col, row), right -> up, down -> right...
+                rows, cols = variants.shape[2]-1 - cols, rows
+                variants = np.rot90(variants, axes=(1, 2))
+                directions = (directions+3) % 4
+            yield reflection*4 + rotation, variants, np.stack([rows*variants.shape[2] + cols, directions], axis=1)
+
+
+def fingerprints(labyrs, starts, chunk_size=10000):
+    """Canonical fingerprints of the labyrinths with their starting poses.
+    The keys of the 8 variants are built together for a chunk of the stack: the shape and the pose as a header and
+    the squares of the labyrinth. The smallest key of every labyrinth is hashed.
+    chunk_size: number of labyrinths whose keys are built together, it limits the memory of the keys
+
+    returns: list of hexadecimal fingerprints, int8 array of the transforms giving the canonical variants
+    """
+    digests = []
+    canonical = np.empty(len(labyrs), dtype=np.int8)
+    for first in range(0, len(labyrs), chunk_size):
+        chunk = slice(first, first+chunk_size)
+        chunk_digests, canonical[chunk] = _chunk_fingerprints(labyrs[chunk], starts[chunk])
+        digests.extend(chunk_digests)
+    return digests, canonical
+
+
+def _chunk_fingerprints(labyrs, starts):
+    """Fingerprints of a chunk of the labyrinths, see fingerprints()"""
+    labyrs = np.asarray(labyrs, dtype=np.uint8)
+    n = len(labyrs)
+    keys = []
+    for transform, variants, poses in transforms(labyrs, starts):
+        header = np.empty((n, 4), dtype='>u4')
+        header[:, :2] = variants.shape[1:]
+        header[:, 2:] = poses
+        keys.append(np.hstack([header.view(np.uint8), variants.reshape(n, -1)]))
+    keys = np.stack(keys, axis=1)
+    length = keys.shape[2]
+    data = keys.tobytes()
+    digests = []
+    canonical = np.empty(n, dtype=np.int8)
+    for i in range(n):
+        offset = i*8*length
+        key, canonical[i] = min((data[offset+t*length:offset+(t+1)*length], t) for t in range(8))
+        digests.append(hashlib.blake2b(key, digest_size=16).hexdigest())
+    return digests, canonical
+
+
+def fingerprint(labyr, start):
+    """Fingerprint of a single labyrinth, see fingerprints().
+    returns: hexadecimal fingerprint, transform giving the canonical variant
+    """
+    digests, canonical = fingerprints(np.asarray(labyr)[None], [start])
+    return digests[0], int(canonical[0])
+
+
+def unique(digests):
+    """returns: indices of the first labyrinth of every fingerprint, and the index of the first labyrinth of
+    the fingerprint for every labyrinth
+    """
+    first = {}
+    representatives = np.array([first.setdefault(digest, i) for i, digest in enumerate(digests)], dtype=np.intp)
+    return np.array(sorted(first.values()), dtype=np.intp), representatives
+
+
+def mirrored_program(program):
+    """Swap the left and right commands of a program of store.canonical_program()"""
+    swap = {('left',): ('right',), ('right',): ('left',)}
+    return tuple(swap.get(instruction, instruction) for instruction in program)
+
+
+def program_keys(code):
+    """returns: hashes of the code and of the mirrored code like store.program_hash()"""
+    program = store.canonical_program(code)
+    return tuple(hashlib.sha1(repr(variant).encode('utf-8')).hexdigest()
+                 for variant in [program, mirrored_program(program)])
+
+
+def reference_key(reference, transform):
+    """Name of the reference solver seen in the frame of the canonical variant. The solvers which depend on the
+    orientation get the transform too, so their results are shared only by the identical labyrinths.
+    """
+    if reference is None:
+        return ''
+    if reference in rotation_invariant_solvers:
+        if transform < 4:
+            return reference
+        if reference in mirrored_solvers:
+            return mirrored_solvers[reference]
+    return '%s %d' % (reference, transform)
+
+
+def result_key(digest, transform, programs, reference, max_steps):
+    """Key of the result of a code in a labyrinth, which is the same for every rotated and reflected variant of
+    the labyrinth with the code mirrored for the reflected ones.
+    digest, transform: fingerprint of the labyrinth and its canonical transform
+    programs: program_keys() of the code
+    returns: (fingerprint, program key, reference key, max_steps)
+    """
+    return digest, programs[1 if transform >= 4 else 0], reference_key(reference, transform), max_steps
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS results (
+    fingerprint TEXT NOT NULL,
+    program TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    max_steps INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    message TEXT NOT NULL,
+    steps INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    optimum INTEGER NOT NULL,
+    efficiency REAL,
+    reference_moves INTEGER,
+    duration REAL NOT NULL,
+    PRIMARY KEY (fingerprint, program, reference, max_steps)
+) WITHOUT ROWID;
+'''
+
+
+class ResultIndex:
+    """SQLite file of the evaluate.Result objects keyed by result_key()."""
+    def __init__(self, filename, batch_size=10000):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(schema)
+        self.batch_size = batch_size
+
+    def get(self, keys):
+        """returns: {key: evaluate.Result} of the known keys"""
+        import evaluate
+        keys = list(set(keys))
+        found = {}
+        # The keys of a program are looked up together, selecting the fingerprints in batches
+        by_program = {}
+        for key in keys:
+            by_program.setdefault(key[1:], []).append(key[0])
+        for (program, reference, max_steps), digests in by_program.items():
+            for first in range(0, len(digests), 500):
+                batch = digests[first:first+500]
+                for row in self.connection.execute(
+                        'SELECT fingerprint, outcome, message, steps, moves, optimum, efficiency, reference_moves, '
+                        'duration FROM results WHERE program = ? AND reference = ? AND max_steps = ? AND '
+                        'fingerprint IN (%s)' % ', '.join('?'*len(batch)),
+                        [program, reference, max_steps] + batch):
+                    found[(row[0], program, reference, max_steps)] = evaluate.Result(*row[1:])
+        return found
+
+    def add(self, results):
+        """results: {key: evaluate.Result}"""
+        rows = [key + tuple(result) for key, result in results.items()]
+        with self.connection:
+            for first in range(0, len(rows), self.batch_size):
+                self.connection.executemany('INSERT OR REPLACE INTO results VALUES (%s)' % ', '.join('?'*12),
+                                            rows[first:first+self.batch_size])
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='fingerprint', description='Count the duplicate AlgoTaurus labyrinths up '
+                                     'to rotation and reflection.')
+    parser.add_argument('-n', type=int, default=10000, help='number of labyrinths (default: 10000)')
+    parser.add_argument('-x', type=int, default=11, help='width of the labyrinths (default: 11)')
+    parser.add_argument('-y', type=int, default=11, help='height of the labyrinths (default: 11)')
+    parser.add_argument('-t', '--type', type=int, default=1, help='labyrinth type (default: 1, depth first)')
+    parser.add_argument('--seed', type=int, help='random seed of the labyrinths')
+    args = parser.parse_args(argv)
+    labyrs, starts = generators.generate_labyrinths(args.n, args.x, args.y, args.type, args.seed)
+    digests, canonical = fingerprints(labyrs, starts)
+    first, representatives = unique(digests)
+    print('%-22s %d' % ('Labyrinths:', args.n))
+    print('%-22s %d' % ('Unique:', len(first)))
+    print('%-22s %.3f' % ('Duplicate rate:', 1 - len(first)/args.n))
+    # These duplicates get the result of the mirrored code
+    print('%-22s %d' % ('Reflected duplicates:', np.count_nonzero((canonical >= 4) !=
+                                                                  (canonical[representatives] >= 4))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Labyrinth generators
+====================
+Generate AlgoTaurus labyrinths one by one (used by the Labyrinth class) or many at once into a preallocated
+N x rows x cols uint8 array.
+
+A generator gets the cells of an empty labyrinth (a two squares wide exit ring around a free area) as a flat
+bytearray, and builds the walls in place:
+generator(cells, shape, rng)
+cells: bytearray of the labyrinth in row-major order (0: path, 1: wall, 2: exit)
+shape: (rows, cols) of the labyrinth
+rng: random.Random object or the random module
+The generators are listed in labyr_generators, in the order of algotaurus.labyr_type_names.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import concurrent.futures
+import mmap
+from multiprocessing import shared_memory
+import random
+import numpy as np
+
+
+def four_walls(cells, shape, rng=random):
+    view = np.frombuffer(cells, dtype=np.uint8).reshape(shape)
+    #view[-3, -3] = 1  # TODO on GUI (not sure about TUI) these are y and x coordinates, not x and y
+    view[5:-5, 3] = 1
+    view[5:-5, -4] = 1
+    view[3, 5:-5] = 1
+    view[-4, 5:-5] = 1
+
+
+def depth_first(cells, shape, rng=random):
+    # Depth first search algorithm
+    # http://en.wikipedia.org/wiki/Maze_generation_algorithm
+    # This one is building the wall, not carving the path.
+    # An explicit stack is used instead of recursion, so large labyrinths do not hit the recursion limit.
+    cols = shape[1]
+    neighb_offsets = [-2*cols, 2*cols, 2, -2]  # up, down, right, left
+
+    def new_neighb_cells():
+        neighb_cells = neighb_offsets[:]
+        rng.shuffle(neighb_cells)
+        return iter(neighb_cells)
+
+    start = 2*cols + 2
+    cells[start] = 1
+    stack = [(start, new_neighb_cells())]
+    while stack:
+        current_cell, neighb_cells = stack[-1]
+        for offset in neighb_cells:
+            next_cell = current_cell + offset
+            if cells[next_cell] == 0:
+                cells[current_cell + offset//2] = 1
+                cells[next_cell] = 1
+                stack.append((next_cell, new_neighb_cells()))
+                break
+        else:
+            stack.pop()
+
+
+def wall_nodes(cells, shape):
+    """Wall building helpers of the vectorized generators.
+    The walls are built as a spanning tree of the wall nodes at the even rows and columns inside the exit ring,
+    like in depth_first().
+    returns: view of the labyrinth, view of the wall nodes
+    """
+    view = np.frombuffer(cells, dtype=np.uint8).reshape(shape)
+    nodes = view[2:-2:2, 2:-2:2]
+    nodes[...] = 1
+    return view, nodes
+
+
+def random_array(rng, shape):
+    """returns: array of random numbers in [0, 1) from the bits of rng"""
+    size = int(np.prod(shape))
+    if size == 0:
+        return np.zeros(shape)
+    return (np.frombuffer(rng.getrandbits(32*size).to_bytes(4*size, 'little'), dtype=np.uint32) /
+            2.0**32).reshape(shape)
+
+
+def binary_tree(cells, shape, rng=random):
+    # Binary tree algorithm: every wall node is connected to its upper or to its left neighbour randomly
+    # http://weblog.jamisbuck.org/2011/2/1/maze-generation-binary-tree-algorithm
+    view, nodes = wall_nodes(cells, shape)
+    up = random_array(rng, nodes.shape) < 0.5
+    up[0, :] = False  # the first row can only be connected to the left
+    up[:, 0] = True  # the first column can only be connected upwards
+    up[0, 0] = False  # root of the tree
+    left = ~up
+    left[0, 0] = False
+    view[3:-2:2, 2:-2:2][up[1:, :]] = 1  # walls between a node and its upper neighbour
+    view[2:-2:2, 3:-2:2][left[:, 1:]] = 1  # walls between a node and its left neighbour
+
+
+def sidewinder(cells, shape, rng=random):
+    # Sidewinder algorithm: the wall nodes of a row are joined into runs randomly, and every run is connected to the
+    # previous row at a random node of the run; the first row is a single run
+    # http://weblog.jamisbuck.org/2011/2/3/maze-generation-sidewinder-algorithm
+    view, nodes = wall_nodes(cells, shape)
+    rows, cols = nodes.shape
+    join = random_array(rng, (rows, cols-1)) < 0.5  # join a node to its right neighbour
+    join[0, :] = True
+    view[2:-2:2, 3:-2:2][join] = 1
+    # First nodes of the runs in the flat node array
+    starts = np.ones((rows, cols), dtype=bool)
+    starts[:, 1:] = ~join
+    starts = np.flatnonzero(starts[1:]) + cols  # the first row is not connected upwards
+    lengths = np.diff(np.append(starts, rows*cols))  # every row starts with a run, so the runs end in their row
+    row, col = np.divmod(starts + (random_array(rng, starts.size) * lengths).astype(np.intp), cols)
+    view[2*row+1, 2*col+2] = 1  # wall above the node
+
+
+def kruskal(cells, shape, rng=random, braid=0.0):
+    """Randomized Kruskal algorithm: the walls between the wall nodes are added in a random order, if they connect
+    two separate wall trees.
+    braid: fraction of the walls removed afterwards, every removed wall adds a loop to the paths
+    """
+    # http://weblog.jamisbuck.org/2011/1/3/maze-generation-kruskal-s-algorithm
+    # Instead of adding the walls one by one, the disjoint sets are merged in rounds with array operations: every
+    # set takes its wall with the lowest rank, which Kruskal's algorithm would also add (Boruvka's algorithm), so
+    # the result is the same. The sets are stored as a flat parent array, which is compressed after every round by
+    # pointer jumping, so every node points to the root of its set.
+    view, nodes = wall_nodes(cells, shape)
+    rows, cols = nodes.shape
+    ids = np.arange(rows*cols).reshape(rows, cols)
+    # Possible walls between the neighbouring nodes: to the right neighbours, then to the lower neighbours
+    first = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    second = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    order = np.argsort(random_array(rng, first.size), kind='stable')  # walls by rank
+    rank = np.empty(first.size, dtype=np.intp)
+    rank[order] = np.arange(first.size)
+    added = np.zeros(first.size, dtype=bool)
+    parent = np.arange(rows*cols)
+    walls = np.arange(first.size)  # walls which may still connect two sets
+    while True:
+        set_a, set_b = parent[first[walls]], parent[second[walls]]
+        crossing = set_a != set_b
+        if not crossing.any():
+            break
+        walls, set_a, set_b = walls[crossing], set_a[crossing], set_b[crossing]
+        lowest = np.full(rows*cols, first.size)
+        np.minimum.at(lowest, set_a, rank[walls])
+        np.minimum.at(lowest, set_b, rank[walls])
+        sets = np.flatnonzero(lowest < first.size)
+        chosen = order[lowest[sets]]
+        added[chosen] = True
+        # Link every set to the set on the other side of its wall; two sets choosing the same wall would link to
+        # each other, then the smaller one stays the root
+        link = np.arange(rows*cols)
+        link[sets] = np.where(parent[first[chosen]] == sets, parent[second[chosen]], parent[first[chosen]])
+        mutual = (link[link] == np.arange(rows*cols)) & (link < np.arange(rows*cols))
+        link[mutual] = np.flatnonzero(mutual)
+        while True:
+            jumped = link[link]
+            if (jumped == link).all():
+                break
+            link = jumped
+        parent = link[parent]
+    if braid > 0:
+        added_walls = np.flatnonzero(added)
+        removed = added_walls[np.argsort(random_array(rng, added_walls.size), kind='stable')]
+        added[removed[:int(round(braid * added_walls.size))]] = False
+    # The wall is between its nodes
+    (row_a, col_a), (row_b, col_b) = np.divmod(first[added], cols), np.divmod(second[added], cols)
+    view[2+row_a+row_b, 2+col_a+col_b] = 1
+
+
+def braided_kruskal(cells, shape, rng=random):
+    kruskal(cells, shape, rng, braid=0.1)
+
+
+labyr_generators = [four_walls, depth_first, binary_tree, sidewinder, kruskal, braided_kruskal]
+
+
+def generator_of(labyr_type):
+    """labyr_type: index in labyr_generators, or a generator function, e.g. functools.partial(kruskal, braid=0.3)
+    returns: generator function, or None if there is no such labyrinth type
+    """
+    if callable(labyr_type):
+        return labyr_type
+    return labyr_generators[labyr_type] if 0 <= labyr_type < len(labyr_generators) else None
+
+
+def labyrinth_shape(x, y):
+    """x, y: size of the labyrinth, it is decreased to odd numbers
+    returns: shape of the labyrinth array including the exit ring
+    """
+    x = x if x % 2 else x-1
+    y = y if y % 2 else y-1
+    return y+4, x+4
+
+
+def empty_labyrinth(shape):
+    """returns: uint8 array of the exit ring and a free area inside"""
+    labyr = np.full(shape, 2, dtype=np.uint8)
+    labyr[2:-2, 2:-2] = 0
+    return labyr
+
+
+def labyrinth(x=11, y=11, labyr_type=1, rng=random):
+    """returns: uint8 labyrinth array"""
+    shape = labyrinth_shape(x, y)
+    cells = bytearray(empty_labyrinth(shape).tobytes())
+    generator = generator_of(labyr_type)
+    if generator is not None:
+        generator(cells, shape, rng)
+    return np.frombuffer(cells, dtype=np.uint8).reshape(shape).copy()
+
+
+def start_pose(labyr, rng=random):
+    """Random starting position somewhere in the middle of the labyrinth, and a random direction.
+    returns: flat index, direction
+    """
+    while True:
+        pos = (labyr.shape[0]//2 + rng.choice([-1, -0, 1]),
+               labyr.shape[1]//2 + rng.choice([-1, -0, 1]))
+        if labyr[pos] == 0:
+            break
+    return pos[0]*labyr.shape[1] + pos[1], rng.choice(range(4))  # right, down, left, up
+
+
+def fill_labyrinths(out, starts, labyr_type=1, seed=None, first=0):
+    """Generate labyrinths into out and their starting poses into starts.
+    The same scratch buffer is used for all labyrinths.
+    out: uint8 array of N x rows x cols
+    starts: int array of N x 2
+    seed: if not None, the random generator is seeded for every labyrinth with the seed and the index
+    first + i of the labyrinth, so the labyrinths do not depend on how they are split into chunks
+    """
+    shape = out.shape[1:]
+    template = empty_labyrinth(shape).tobytes()
+    cells = bytearray(template)
+    view = np.frombuffer(cells, dtype=np.uint8).reshape(shape)
+    generator = generator_of(labyr_type)
+    rng = random.Random()
+    for i in range(len(out)):
+        if seed is not None:
+            rng.seed('%d-%d' % (seed, first+i))
+        cells[:] = template
+        generator(cells, shape, rng)
+        out[i] = view
+        starts[i] = start_pose(view, rng)
+
+
+def _generate_chunk(first, count, shape, labyr_type, seed, target):
+    """Worker of generate_labyrinths.
+    target: (file name, offset) of the memory mapped output, or None to return the labyrinths
+    returns: labyrinths (None if they are written to the target), starting poses
+    """
+    starts = np.empty((count, 2), dtype=np.int64)
+    if target is None:
+        out = np.empty((count,) + shape, dtype=np.uint8)
+    else:
+        filename, offset = target
+        out = np.memmap(filename, dtype=np.uint8, mode='r+', offset=offset + first*shape[0]*shape[1],
+                        shape=(count,) + shape)
+    fill_labyrinths(out, starts, labyr_type, seed, first)
+    if target is None:
+        return out, starts
+    out.flush()
+    return None, starts
+
+
+def generate_labyrinths(n, x=11, y=11, labyr_type=1, seed=None, out=None, starts=None, workers=1,
+                        chunk_size=None):
+    """Generate n labyrinths into a single array.
+    x, y: size of the labyrinths (see labyrinth_shape)
+    seed: seed of the labyrinths and starting poses; the result does not depend on workers and chunk_size
+    out: preallocated uint8 array of n x rows x cols to fill, e.g. a numpy.memmap or a view of a shared memory
+    starts: preallocated int array of n x 2 to fill
+    workers: number of processes to generate the chunks in parallel; the chunks are written directly to an
+    out memory mapped from a file (opened with mode 'w+' or 'r+'), otherwise they are copied into out
+    chunk_size: number of labyrinths in a chunk, by default the labyrinths are split evenly among the workers
+
+    returns: labyrinths array, starts array of (flat index, direction) of the robot in the labyrinths
+    """
+    shape = labyrinth_shape(x, y)
+    if out is None:
+        out = np.empty((n,) + shape, dtype=np.uint8)
+    elif out.shape != (n,) + shape or out.dtype != np.uint8:
+        raise ValueError('out should be a uint8 array of shape %s' % ((n,) + shape,))
+    if starts is None:
+        starts = np.empty((n, 2), dtype=np.int64)
+    elif starts.shape != (n, 2):
+        raise ValueError('starts should be an array of shape %s' % ((n, 2),))
+    if workers <= 1 or n <= 1:
+        fill_labyrinths(out, starts, labyr_type, seed)
+        return out, starts
+
+    target = None
+    if isinstance(out, np.memmap) and isinstance(out.base, mmap.mmap) and out.mode in ['r+', 'w+']:
+        out.flush()
+        target = (out.filename, out.offset)
+    chunk_size = chunk_size or -(-n // workers)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(_generate_chunk, first, min(chunk_size, n-first), shape, labyr_type, seed,
+                                   target): first for first in range(0, n, chunk_size)}
+        for future in concurrent.futures.as_completed(futures):
+            first = futures[future]
+            labyrs, chunk_starts = future.result()
+            if labyrs is not None:
+                out[first:first+len(labyrs)] = labyrs
+            starts[first:first+len(chunk_starts)] = chunk_starts
+    return out, starts
+
+
+class SharedLabyrinths:
+    """Labyrinths and starting poses in a shared memory block, so processes can use them without copying.
+
+    Create the block in the main process, and attach to it with its descriptor in the other processes:
+    with SharedLabyrinths.create(n, x, y) as shared:
+        SharedLabyrinths.attach(shared.descriptor)  # in a worker process
+    The creator unlinks the block when it is closed.
+    """
+    def __init__(self, shm, n, shape, owner):
+        """Use create() or attach()"""
+        self.shm = shm
+        self.owner = owner
+        self.descriptor = (shm.name, n, shape)
+        size = n*shape[0]*shape[1]
+        starts_offset = -(-size // 8) * 8  # aligned for the int64 starts
+        self.labyrs = np.ndarray((n,) + shape, dtype=np.uint8, buffer=shm.buf)
+        self.starts = np.ndarray((n, 2), dtype=np.int64, buffer=shm.buf, offset=starts_offset)
+        if not owner:
+            self.labyrs.flags.writeable = False
+            self.starts.flags.writeable = False
+
+    @staticmethod
+    def block_size(n, shape):
+        return -(-n*shape[0]*shape[1] // 8) * 8 + n*2*8
+
+    @classmethod
+    def create(cls, n, x=11, y=11, labyr_type=1, seed=None, workers=1):
+        """Generate n labyrinths into a new shared memory block, see generate_labyrinths()"""
+        shape = labyrinth_shape(x, y)
+        shm = shared_memory.SharedMemory(create=True, size=cls.block_size(n, shape))
+        shared = cls(shm, n, shape, owner=True)
+        try:
+            generate_labyrinths(n, x, y, labyr_type, seed, shared.labyrs, shared.starts, workers)
+        except BaseException:
+            shared.close()
+            raise
+        return shared
+
+    @classmethod
+    def from_arrays(cls, labyrs, starts):
+        """Copy existing labyrinths and starting poses into a new shared memory block"""
+        n, rows, cols = labyrs.shape
+        shm = shared_memory.SharedMemory(create=True, size=cls.block_size(n, (rows, cols)))
+        shared = cls(shm, n, (rows, cols), owner=True)
+        shared.labyrs[:] = labyrs
+        shared.starts[:] = starts
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor):
+        """Attach to the block of the descriptor of a SharedLabyrinths object with read-only views"""
+        name, n, shape = descriptor
+        return cls(shared_memory.SharedMemory(name=name), n, tuple(shape), owner=False)
+
+    def close(self):
+        # The views must be released before the shared memory is closed
+        del self.labyrs, self.starts
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
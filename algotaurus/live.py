@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Live evaluation
+===============
+Evaluate the code in the background on a fixed suite of labyrinths, while it is edited in the GUI. The suite has
+small (11 x 11) labyrinths of the labyrinth type selected in the GUI, so the evaluation is fast.
+
+A single worker thread runs the latest submitted code with the native backend (see native.py), so it holds the
+interpreter only for a few bytecodes of every labyrinth, and the editor stays responsive. When a new code is
+submitted, the running evaluation stops before its next labyrinth, and the new code is evaluated.
+The result of a labyrinth depends only on the lines executed in it. The native backend reports the branches of the
+executed tests, and the executed lines are the lines reached from line 1 following only these branches (with the
+lines after the last executed one, which are kept too). So the executed lines of every labyrinth are kept, and the
+result is reused if none of these lines changed since the last evaluation.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import threading
+
+import algotaurus
+import generators
+import native
+
+success_message = algotaurus._('Congratulations! AlgoTaurus successfully reached the exit.')
+
+
+def line_instruction(program, max_line, line):
+    """Meaning of a line for the Script: the lines after max_line end the code, the others outside of the code are
+    empty lines
+    """
+    if line > max_line:
+        return ('ended',)
+    return program[line] if 0 < line < len(program) else ('empty',)
+
+
+def executed_lines(program, max_line, branches):
+    """Lines executed by a run, from the branch coverage of the run.
+    branches: set of the (line, sensor result) branches of the executed tests, see native.run_script()
+    returns: set of the lines reached from line 1 following only these branches
+    """
+    lines = set()
+    todo = [1]
+    while todo:
+        line = todo.pop()
+        if line in lines:
+            continue
+        lines.add(line)
+        instruction = line_instruction(program, max_line, line)
+        command = instruction[0]
+        if command in ['step', 'right', 'left', 'empty']:
+            todo.append(line+1)
+        elif command == 'goto':
+            todo.append(instruction[1])
+        elif command in ['wall?', 'exit?']:
+            todo.extend(target for target, sensed in zip(instruction[1:], [True, False])
+                        if (line, sensed) in branches)
+    return lines
+
+
+class LiveEvaluator:
+    def __init__(self, n=50, x=11, y=11, labyr_type=1, seed=0, max_steps=10000):
+        """n, x, y, labyr_type, seed: the labyrinth suite, see generators.generate_labyrinths()
+        max_steps: maximum number of executed lines in a labyrinth
+        """
+        self.labyr_type = labyr_type
+        labyrs, starts = generators.generate_labyrinths(n, x, y, labyr_type, seed)
+        self.robots = []
+        for labyr, start in zip(labyrs, starts):
+            robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyr), start)
+            self.robots.append((robot, robot.snapshot()))
+        self.max_steps = max_steps
+        # Last evaluation of every labyrinth: program, max_line, executed lines, passed
+        self.cache = [None] * n
+        # Status of the latest code: (generation, passed, evaluated labyrinths, labyrinths)
+        self.status = None
+        self.generation = 0
+        self.job = None
+        self.closed = False
+        self.condition = threading.Condition()
+        thread = threading.Thread(target=self.work, daemon=True)
+        thread.start()
+
+    def submit(self, code):
+        """Evaluate the code instead of the previous one.
+        returns: generation of the code in the status
+        """
+        with self.condition:
+            self.generation += 1
+            self.job = code, self.generation
+            self.status = (self.generation, 0, 0, len(self.robots))
+            self.condition.notify()
+        return self.generation
+
+    def cancel(self):
+        """Stop the running evaluation"""
+        with self.condition:
+            self.generation += 1
+            self.job = None
+            self.status = None
+
+    def close(self):
+        """Stop the running evaluation and the worker thread"""
+        with self.condition:
+            self.cancel()
+            self.closed = True
+            self.condition.notify()
+
+    def work(self):
+        while True:
+            with self.condition:
+                while self.job is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                code, generation = self.job
+                self.job = None
+            self.evaluate(code, generation)
+
+    def evaluate(self, code, generation):
+        code = code.rstrip()
+        program = algotaurus.compile_code(code)
+        max_line = code.count('\n')+1
+        passed = 0
+        for i, (robot, start) in enumerate(self.robots):
+            if generation != self.generation:
+                return  # a newer code is submitted
+            cached = self.cache[i]
+            if cached is not None and all(line_instruction(program, max_line, line) ==
+                                          line_instruction(cached[0], cached[1], line) for line in cached[2]):
+                success = cached[3]
+            else:
+                robot.restore(start)
+                script = algotaurus.Script(code, robot, max_line=max_line)
+                branches = set()
+                success = native.run_script(script, self.max_steps, branches=branches) == success_message
+                self.cache[i] = program, max_line, executed_lines(program, max_line, branches), success
+            passed += success
+            with self.condition:
+                if generation == self.generation:
+                    self.status = (generation, passed, i+1, len(self.robots))
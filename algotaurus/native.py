@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+Native backend
+==============
+Translate a compiled AlgoTaurus code (see algotaurus.compile_code) into a Python function, and run it.
+
+The generated function is a state machine of basic blocks. A block starts at line 1 or at a jump target, and it
+runs the following lines and follows the unconditional jumps until a test, a result or a line already in the
+block. The robot state is kept in local variables and the sensors are inlined lookups of the tables of the Robot.
+The executed lines are counted per block, and a block only runs if the step limit allows running it completely,
+otherwise the lines are run one by one. So the results, the executed lines and the moves are the same as with the
+Script interpreter.
+
+The blocks are generated from the optimized program (see peephole.py): the jumps are threaded, the turns are
+folded and the unreachable lines are left out. The executed lines are counted with its side table, and the lines
+run one by one are the original ones.
+
+The functions are cached by the program and the maximum line number.
+
+A corridor loop is a cycle of the program of only step, empty and goto lines and wall? and exit? tests, which
+returns to its first line if there is no wall and no exit ahead, e.g. STEP, WALL? 4 1. While the straight corridor
+ahead of the robot is longer than the steps of the loop, every test of the loop continues the loop and every step
+is successful, so the robot is moved to the end of the corridor with all these cycles at once. The executed lines
+and the moves of the cycles are added, so they are the same as with the interpreter. The lengths of the
+corridors are measured when the robot first needs them, see CorridorRuns.
+
+The trail variant of a function also reports every move of the robot as a token index*4 + direction to an
+append function, so the visited squares can be counted (see analysis.Heatmap).
+
+The coverage variant reports the branches of the executed wall? and exit? tests as tokens line*2 + sensor result
+to an add function, so the branch coverage of the run is collected (see analysis.CoverageRecorder).
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import functools
+
+import algotaurus
+import peephole
+
+_ = algotaurus._
+messages = {'wall': _('Bad news. AlgoTaurus run into wall.'),
+            'exit': _('Bad news. AlgoTaurus stepped into exit.'),
+            'success': _('Congratulations! AlgoTaurus successfully reached the exit.'),
+            'not exit': _('Bad news. AlgoTaurus was not in the exit yet.'),
+            'ended': _('Bad news. Code ended.')}
+max_block_lines = 64  # limit of following the unconditional jumps
+min_corridor_cycles = 2  # the corridor loops are fast-forwarded only by at least so many cycles
+
+
+def run_line(program, max_line, walls, exits, offsets, line, index, direction, moves):
+    """Run a single line like Script.run_line.
+    returns: result message (None for going on), line, index, direction, moves
+    """
+    if line > max_line:
+        return messages['ended'], line, index, direction, moves
+    instruction = peephole.instruction_at(program, line)
+    command = instruction[0]
+    if command == 'step':
+        if walls[index] >> direction & 1:
+            return messages['wall'], line+1, index, direction, moves
+        if exits[index] >> direction & 1:
+            return messages['exit'], line+1, index, direction, moves
+        return None, line+1, index+offsets[direction], direction, moves+1
+    elif command == 'wall?':
+        return None, instruction[1] if walls[index] >> direction & 1 else instruction[2], index, direction, moves
+    elif command == 'exit?':
+        return None, instruction[1] if exits[index] >> direction & 1 else instruction[2], index, direction, moves
+    elif command == 'goto':
+        return None, instruction[1], index, direction, moves
+    elif command == 'right':
+        return None, line+1, index, (direction+1) % 4, moves
+    elif command == 'left':
+        return None, line+1, index, (direction-1) % 4, moves
+    elif command == 'quit':
+        return (messages['success'] if exits[index] >> direction & 1 else messages['not exit'],
+                line, index, direction, moves)
+    elif command == 'empty':
+        return None, line+1, index, direction, moves
+    else:  # syntax error
+        return instruction[1], line, index, direction, moves
+
+
+class CorridorRuns(dict):
+    """Lengths of the straight corridors: the number of path squares ahead of a square in a direction before a wall
+    or an exit, keyed by flat index*4 + direction. A corridor is measured when it is first looked up.
+    """
+    def __init__(self, walls, exits, offsets):
+        """walls, exits, offsets: the tables of the Robot"""
+        super().__init__()
+        self.walls, self.exits, self.offsets = walls, exits, offsets
+
+    def __missing__(self, token):
+        # The squares along the corridor are measured together
+        first = token
+        index, direction = divmod(token, 4)
+        step = self.offsets[direction]*4
+        walls, exits = self.walls, self.exits
+        tokens = []
+        while not (walls[index] | exits[index]) >> direction & 1:
+            tokens.append(token)
+            token += step
+            index = token >> 2
+        self[token] = 0
+        for run, token in enumerate(reversed(tokens), 1):
+            self[token] = run
+        return self[first]
+
+
+def corridor_loop(optimized, leader):
+    """Find the corridor loop starting at the leader line.
+    optimized: peephole.Optimized program
+    returns: number of executed lines and number of steps of a cycle, and the lines where the wall? tests of the
+    loop continue it (or the exit? tests if it has no wall? test); None if it is not a corridor loop
+    """
+    line = leader
+    length = steps = 0
+    seen = set()
+    targets = {'wall?': set(), 'exit?': set()}
+    while True:
+        if line > optimized.max_line or line in seen or length >= max_block_lines:
+            return None
+        seen.add(line)
+        instruction, costs = optimized.at(line)
+        command = instruction[0]
+        length += costs[-1]
+        if command in ['step', 'empty']:
+            steps += command == 'step'
+            line += 1
+        elif command == 'goto':
+            line = instruction[1]
+        elif command in ['wall?', 'exit?']:
+            line = instruction[2]  # no wall and no exit ahead
+            targets[command].add(line)
+        elif command == 'turn' and not instruction[1]:
+            line = instruction[2]
+        else:
+            return None
+        if line == leader:
+            return (length, steps, targets['wall?'] or targets['exit?']) if steps else None
+
+
+def generate_block(optimized, leader, trail=False, breaks=None, coverage=False):
+    """optimized: peephole.Optimized program
+    trail: report the moves to append()
+    breaks: breakpoints of the debug variant, see generate_source()
+    coverage: report the branches of the tests to add()
+    returns: number of executed lines needed to run the block, number of executed lines before its last line
+    continues, list of source lines"""
+    source = []
+    line = leader
+    length = 0
+    extra = 0
+    seen = set()
+    lines, cells, directions = breaks or ((), False, False)
+    while True:
+        if (line > optimized.max_line or line in seen or length >= max_block_lines or
+                line in lines and line != leader):
+            # Continue in the dispatcher
+            source.append('line = %d' % line)
+            break
+        seen.add(line)
+        instruction, costs = optimized.at(line)
+        command = instruction[0]
+        length += 1
+        source.append('# %d %s' % (line, ' '.join(str(i) for i in instruction)))
+        # Executed lines, if the block ends at this line: all lines of the block are counted in advance
+        ended = '%%(length)d-%d' % length
+        if command == 'step':
+            for sensor, message in [('walls', 'wall'), ('exits', 'exit')]:
+                source.append('if %s[index] >> direction & 1:' % sensor)
+                source.append('    return messages[%r], %d, index, direction, moves, remaining+%s' %
+                              (message, line+1, ended))
+            source.append('index += offsets[direction]')
+            source.append('moves += 1')
+            if trail:
+                source.append('append(index*4 + direction)')
+            if cells:
+                source.extend(pause_source('cell', line+1, ended))
+            line += 1
+        elif command == 'turn':
+            if instruction[1]:
+                source.append('direction = (direction+%d) & 3' % instruction[1])
+                if directions:
+                    # The turn lines are not folded, so this is a single turn
+                    source.extend(pause_source('direction', line+1, ended))
+            length += costs[0]-1
+            line = instruction[2]
+        elif command == 'empty':
+            line += 1
+        elif command == 'goto':
+            length += costs[0]-1
+            line = instruction[1]
+        elif command in ['wall?', 'exit?']:
+            test = '%s[index] >> direction & 1' % ('walls' if command == 'wall?' else 'exits')
+            if coverage:
+                source.append('sensed = %s' % test)
+                source.append('add(%d + sensed)' % (line*2))
+                test = 'sensed'
+            if costs[0] == costs[1]:
+                source.append('line = %d if %s else %d' % (instruction[1], test, instruction[2]))
+                length += costs[0]-1
+            else:
+                # The threaded jumps of the two ways skip different numbers of lines
+                source.append('if %s:' % test)
+                for target, cost in zip(instruction[1:], costs):
+                    source.append('    line = %d' % target)
+                    if cost > 1:
+                        source.append('    remaining -= %d' % (cost-1))
+                    source.append('else:')
+                source.pop()
+                extra = max(costs)-1
+            break
+        elif command == 'quit':
+            source.append("return messages['success' if exits[index] >> direction & 1 else 'not exit'], %d, index, "
+                          "direction, moves, remaining+%s" % (line, ended))
+            break
+        else:  # syntax error
+            source.append('return %r, %d, index, direction, moves, remaining+%s' % (instruction[1], line, ended))
+            break
+    return length + extra, length, [source_line.replace('%(length)d', str(length)) for source_line in source]
+
+
+def pause_source(kind, line, ended):
+    """Source lines of pausing at a cell or a direction breakpoint after a line of a block"""
+    return ['if %s in %s and probe(%r, %d, index, direction, moves, remaining+%s):' %
+            ('index' if kind == 'cell' else 'direction', 'cells' if kind == 'cell' else 'facing', kind, line, ended),
+            "    return 'break', %d, index, direction, moves, remaining+%s" % (line, ended)]
+
+
+def generate_source(program, max_line, trail=False, breaks=None, coverage=False):
+    """Generate the source of the run function of the program.
+    The function runs the code until a result, or until max_steps lines are executed.
+    trail: the function has an append argument to report the moves; the corridor loops are not fast-forwarded
+    in this variant
+    coverage: the function has an add argument to report the branches of the tests; the corridor loops are not
+    fast-forwarded in this variant
+    breaks: generate the debug variant, which pauses at breakpoints (see debugger.py): (tuple of the lines of the
+    line breakpoints, cell breakpoints are set, direction breakpoints are set). The line breakpoints and the turns
+    (if there are direction breakpoints) are not skipped by the optimization, and the corridor loops are not
+    fast-forwarded.
+    returns: source code string
+    """
+    barriers = frozenset()
+    if breaks is not None:
+        barriers = frozenset(breaks[0])
+        if breaks[2]:
+            barriers |= {line for line, instruction in enumerate(program) if instruction[0] in ['right', 'left']}
+    optimized = peephole.optimize(program, max_line, barriers)
+    leaders = sorted(set(optimized.leaders()) | {line for line in barriers if 0 < line <= max_line})
+    # The blocks end at the tests, so the loop is checked where its first wall? test continues it, which is run by
+    # the dispatcher in every cycle, and where the robot usually has a free way ahead. A loop without tests is a
+    # single block, it is checked at all of its leaders.
+    loops = {}
+    for leader in [] if trail or breaks or coverage else leaders:
+        loop = corridor_loop(optimized, leader)
+        if loop is not None and (not loop[2] or leader == min(loop[2])):
+            loops[leader] = loop[:2]
+    source = ['def run(walls, exits, offsets, line, index, direction, moves, max_steps%s):' %
+              (', append' if trail else ', probe, cells, facing, resume' if breaks else ', add' if coverage else
+               ', runs' if loops else ''),
+              '    remaining = max_steps']
+    if breaks:
+        # A run resumed at a line breakpoint runs that line first without pausing there again
+        source.append('    if resume and remaining > 0:')
+        source.extend(debug_line_source(breaks, '        '))
+    source.append('    while True:')
+    if breaks and breaks[0]:
+        source.extend(['        if line in {%s} and remaining and probe(%r, line, index, direction, moves, '
+                       'remaining):' % (', '.join(str(line) for line in sorted(breaks[0])), 'line'),
+                       "            return 'break', line, index, direction, moves, remaining"])
+    condition = 'if'
+    for leader in leaders:
+        required, length, block = generate_block(optimized, leader, trail, breaks, coverage)
+        source.append('        %s line == %d and remaining >= %d:' % (condition, leader, required))
+        if leader in loops:
+            # Fast-forward the whole cycles in the corridor, the rest is run by the block
+            cycle_length, steps = loops[leader]
+            source.extend(['            if remaining >= %d and runs[index*4 + direction] > %d:' %
+                           (cycle_length*min_corridor_cycles, steps*min_corridor_cycles),
+                           '                cycles = (runs[index*4 + direction]-1) // %d' % steps,
+                           '                if cycles*%d > remaining:' % cycle_length,
+                           '                    cycles = remaining // %d' % cycle_length,
+                           '                remaining -= cycles*%d' % cycle_length,
+                           '                moves += cycles*%d' % steps,
+                           '                index += cycles*%d*offsets[direction]' % steps,
+                           '                continue'])
+        source.append('            remaining -= %d' % length)
+        source.extend('            ' + block_line for block_line in block)
+        condition = 'elif'
+    source.extend(['        %s remaining > 0:' % condition,
+                   '            # Lines outside of the blocks, and the lines close to the step limit'])
+    if breaks:
+        source.extend(debug_line_source(breaks, '            '))
+        source.extend(['        else:',
+                       "            return 'go on', line, index, direction, moves, remaining"])
+        return '\n'.join(source) + '\n'
+    source.append('            remaining -= 1')
+    if trail:
+        source.append('            previous_moves = moves')
+    if coverage:
+        condition = 'if'
+        for command, sensor in [('wall?', 'walls'), ('exit?', 'exits')]:
+            tests = [line for line, instruction in enumerate(program) if instruction[0] == command and
+                     0 < line <= max_line]
+            if tests:
+                source.extend(['            %s line in {%s}:' % (condition, ', '.join(str(line) for line in tests)),
+                               '                add(line*2 + (%s[index] >> direction & 1))' % sensor])
+                condition = 'elif'
+    source.append('            result, line, index, direction, moves = run_line(program, max_line, walls, exits, '
+                  'offsets, line, index, direction, moves)')
+    if trail:
+        source.extend(['            if moves != previous_moves:',
+                       '                append(index*4 + direction)'])
+    source.extend(['            if result is not None:',
+                   '                return result, line, index, direction, moves, remaining',
+                   '        else:',
+                   "            return 'go on', line, index, direction, moves, remaining"])
+    return '\n'.join(source) + '\n'
+
+
+def debug_line_source(breaks, indent):
+    """Source lines of running a single line with run_line() in the debug variant, pausing at the cell and the
+    direction breakpoints after it
+    """
+    source = ['remaining -= 1',
+              'previous_index, previous_direction = index, direction',
+              'result, line, index, direction, moves = run_line(program, max_line, walls, exits, offsets, line, '
+              'index, direction, moves)',
+              'if result is not None:',
+              '    return result, line, index, direction, moves, remaining']
+    for kind, changed, enabled in [('cell', 'index != previous_index', breaks[1]),
+                                   ('direction', 'direction != previous_direction', breaks[2])]:
+        if enabled:
+            source.extend(['if %s and %s in %s and probe(%r, line, index, direction, moves, remaining):' %
+                           (changed, 'index' if kind == 'cell' else 'direction',
+                            'cells' if kind == 'cell' else 'facing', kind),
+                           "    return 'break', line, index, direction, moves, remaining"])
+    return [indent + source_line for source_line in source]
+
+
+@functools.lru_cache(maxsize=256)
+def compile_program(program, max_line, trail=False, breaks=None, coverage=False):
+    """Compile the program to a Python function.
+    program: tuple of instructions (see algotaurus.compile_code)
+    trail: compile the trail variant
+    breaks: compile the debug variant with these breakpoints, see generate_source()
+    coverage: compile the coverage variant
+
+    returns: run(walls, exits, offsets, line, index, direction, moves, max_steps) function, which returns
+    (result message, line, index, direction, moves, remaining steps); the result is 'go on' if the step limit was
+    reached
+    The trail variant has an additional append argument, the coverage variant an add argument. If the program has corridor loops, the corridors
+    attribute of the function is set, and it has an additional runs argument of a CorridorRuns object.
+    The debug variant has additional probe, cells, facing and resume arguments (see debugger.Debugger), and its
+    result is 'break' if it paused at a breakpoint.
+    """
+    namespace = {'messages': messages, 'run_line': run_line, 'program': program, 'max_line': max_line}
+    exec(compile(generate_source(program, max_line, trail, breaks, coverage),
+                 '<algotaurus native %x>' % hash((program, max_line, trail, breaks, coverage)), 'exec'),
+         namespace)
+    run = namespace['run']
+    run.corridors = 'runs' in run.__code__.co_varnames[:run.__code__.co_argcount]
+    return run
+
+
+def run_script(script, max_steps, trail=None, debugger=None, branches=None):
+    """Run the script with the native backend, until a result or until max_steps lines are executed.
+    The script and its robot are updated, as if the lines were executed by Script.execute_command.
+    The recorder of the script is not used.
+    trail: list to append the moves to as index*4 + direction tokens
+    debugger: debugger.Debugger to pause at its breakpoints
+    branches: set to add the (line, sensor result) branches of the executed wall? and exit? tests to, like
+    analysis.CoverageRecorder
+
+    returns: result message, 'go on' if the step limit was reached, 'break' if the run paused at a breakpoint
+    """
+    robot = script.robot
+    args = (robot.walls, robot.exits, robot.offsets, script.current_line, robot.index, robot.dir, robot.moves,
+            max_steps)
+    if debugger is not None:
+        run = compile_program(tuple(script.program), script.max_line, breaks=debugger.breaks())
+        args += (debugger.probe, debugger.cells, debugger.facing, debugger.resume)
+    elif branches is not None:
+        run = compile_program(tuple(script.program), script.max_line, coverage=True)
+        tokens = set()
+        args += (tokens.add,)
+    elif trail is None:
+        run = compile_program(tuple(script.program), script.max_line)
+        if run.corridors:
+            args += (CorridorRuns(robot.walls, robot.exits, robot.offsets),)
+    else:
+        run = compile_program(tuple(script.program), script.max_line, True)
+        args += (trail.append,)
+    result, script.current_line, index, direction, robot.moves, remaining = run(*args)
+    script.steps += max_steps - remaining
+    if branches is not None:
+        branches.update((token >> 1, token & 1 == 1) for token in tokens)
+    robot.previous_index = robot.index
+    robot.index, robot.dir = index, direction
+    robot.update_robot()
+    return result
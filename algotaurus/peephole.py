@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Peephole optimizer
+==================
+Simplify a compiled AlgoTaurus code (see algotaurus.compile_code) for the native backend, while keeping the exact
+number of executed lines of the original code.
+
+The optimized program has the same line numbers as the original one, and every line is rewritten so that it does
+the same as running the original code from that line:
+- jump threading: the targets of the gotos and the tests skip the goto and empty lines, e.g. GOTO 5 where line 5 is
+  GOTO 1 becomes GOTO 1
+- turn folding: a sequence of right and left lines is a single ('turn', rotation, next line) instruction, where
+  rotation is the net number of right turns (0-3), e.g. RIGHT RIGHT RIGHT is a single left turn
+- unreachable lines: the lines which cannot be reached from line 1 are left out of the reachable lines, so no code
+  is generated for them
+
+The barrier lines are never skipped or folded into the line before them, so the run arrives at them as in the
+original code, e.g. the lines of the breakpoints (see debugger.py).
+
+The side table (costs) keeps the number of the original lines executed by every optimized line for every way it
+continues, so the executed lines (the steps of the Script) are counted exactly. The step lines are not changed,
+so the moves of the robot are the same too.
+
+Use from the command line:
+python peephole.py code.lab
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+
+import algotaurus
+
+max_thread_lines = 64  # limit of following the jumps and the turns
+
+
+def instruction_at(program, line):
+    """Lines outside of the code are empty lines, as in the Script"""
+    return program[line] if 0 < line < len(program) else ('empty',)
+
+
+def thread(program, max_line, line, barriers=frozenset()):
+    """Follow the goto and empty lines from the line until a barrier line.
+    returns: first line which is not skipped, number of skipped lines
+    """
+    skipped = 0
+    seen = set()
+    while line <= max_line and line not in seen and line not in barriers and skipped < max_thread_lines:
+        instruction = instruction_at(program, line)
+        if instruction[0] == 'goto':
+            seen.add(line)
+            line = instruction[1]
+        elif instruction[0] == 'empty':
+            seen.add(line)
+            line += 1
+        else:
+            break
+        skipped += 1
+    return line, skipped
+
+
+def fold_turns(program, max_line, line, barriers=frozenset()):
+    """Fold the right and left lines from the line until a barrier line into a single turn, and thread the line
+    after them.
+    returns: net number of right turns, next line, number of executed lines
+    """
+    rotation = 0
+    length = 0
+    while (line <= max_line and length < max_thread_lines and instruction_at(program, line)[0] in ['right', 'left']
+           and not (length and line in barriers)):
+        rotation += 1 if instruction_at(program, line)[0] == 'right' else 3
+        line += 1
+        length += 1
+    line, skipped = thread(program, max_line, line, barriers)
+    return rotation % 4, line, length + skipped
+
+
+class Optimized:
+    """Optimized program with the side table of the executed lines, see the module documentation.
+    program: list of the optimized instructions indexed by the line
+    costs: list of the numbers of the executed original lines of the lines, a tuple for every line: (yes, no) for
+    the tests and a single number for the others
+    reachable: set of the lines which can be reached from line 1
+    """
+    def __init__(self, program, max_line, barriers=frozenset()):
+        """program: compiled code (see algotaurus.compile_code)
+        barriers: lines which are not skipped
+        """
+        self.max_line = max_line
+        self.program = []
+        self.costs = []
+        for line, instruction in enumerate(program):
+            command = instruction[0]
+            if command == 'goto':
+                target, skipped = thread(program, max_line, instruction[1], barriers)
+                instruction, costs = ('goto', target), (1 + skipped,)
+            elif command in ['wall?', 'exit?']:
+                (yes, yes_skipped), (no, no_skipped) = [thread(program, max_line, target, barriers)
+                                                        for target in instruction[1:]]
+                instruction, costs = (command, yes, no), (1 + yes_skipped, 1 + no_skipped)
+            elif command in ['right', 'left']:
+                rotation, following, length = fold_turns(program, max_line, line, barriers)
+                instruction, costs = ('turn', rotation, following), (length,)
+            else:
+                costs = (1,)
+            self.program.append(instruction)
+            self.costs.append(costs)
+        self.reachable = self.find_reachable()
+
+    def at(self, line):
+        """returns: optimized instruction of the line, its costs"""
+        if 0 < line < len(self.program):
+            return self.program[line], self.costs[line]
+        return ('empty',), (1,)
+
+    def successors(self, line):
+        """returns: list of the lines where the line continues"""
+        instruction = self.at(line)[0]
+        command = instruction[0]
+        if command in ['step', 'empty']:
+            return [line + 1]
+        elif command == 'goto':
+            return [instruction[1]]
+        elif command in ['wall?', 'exit?']:
+            return list(instruction[1:])
+        elif command == 'turn':
+            return [instruction[2]]
+        return []  # quit and syntax error
+
+    def find_reachable(self):
+        reachable = set()
+        lines = [1]
+        while lines:
+            line = lines.pop()
+            if line in reachable or line > self.max_line:
+                continue
+            reachable.add(line)
+            lines.extend(self.successors(line))
+        return reachable
+
+    def leaders(self):
+        """returns: sorted list of line 1 and the jump targets of the reachable lines"""
+        leaders = {1}
+        for line in self.reachable:
+            instruction = self.at(line)[0]
+            if instruction[0] in ['goto', 'wall?', 'exit?']:
+                leaders.update(instruction[1:])
+        return sorted(leader for leader in leaders if 0 < leader <= self.max_line)
+
+
+def optimize(program, max_line, barriers=frozenset()):
+    """program: compiled code (see algotaurus.compile_code)
+    barriers: lines which are not skipped
+    returns: Optimized object
+    """
+    return Optimized(program, max_line, barriers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='peephole', description='Show the optimized form of an AlgoTaurus code.')
+    parser.add_argument('code', help='AlgoTaurus code file (.lab)')
+    parser.add_argument('--max-line', type=int, help='maximum line number (default: the length of the code)')
+    args = parser.parse_args(argv)
+    with open(args.code, encoding='utf-8') as code_file:
+        code = code_file.read().rstrip()
+    program = algotaurus.compile_code(code)
+    optimized = optimize(program, args.max_line or len(program)-1)
+    for line in range(1, len(program)):
+        instruction, costs = optimized.at(line)
+        print('%3d %-24s %-24s %-10s%s' % (line, ' '.join(str(i) for i in program[line]),
+                                           ' '.join(str(i) for i in instruction), costs,
+                                           '' if line in optimized.reachable else ' unreachable'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Off-screen rendering
+====================
+Render labyrinths, the robot and its path into images without Tk, and write them as PNG files, or write traces
+as animated GIF files. Only numpy and the standard library are used.
+
+The images are rendered as palette indices of the squares (see palette), which are upscaled with np.repeat, and
+the robot is drawn on them as a triangle like in the GUI. render() converts them to RGB arrays.
+
+Use from the command line:
+python render.py lab01.attrace lab01.png
+python render.py lab01.attrace lab01.gif --every 5
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import functools
+import struct
+import zlib
+import numpy as np
+
+PATH, WALL, EXIT, ROBOT, TRAIL = range(5)
+# Colors of the palette indices, the first three are the same as in the GUI
+palette = np.array([[255, 255, 255], [0, 0, 0], [190, 190, 190], [255, 0, 0], [255, 200, 200]], dtype=np.uint8)
+
+
+@functools.lru_cache(maxsize=16)
+def robot_masks(cell_size):
+    """Triangles of the robot in a square, pointing right, down, left and up, as drawn by the GUI.
+    returns: bool array of 4 x cell_size x cell_size
+    """
+    # Corners of the triangles in (x, y) square units, see AlgoTaurusGui.draw_robot()
+    triangles = [[(0, 0), (0, 1), (1, 0.5)], [(0, 0), (0.5, 1), (1, 0)],
+                 [(0, 0.5), (1, 1), (1, 0)], [(0.5, 0), (0, 1), (1, 1)]]
+    y, x = (np.mgrid[0:cell_size, 0:cell_size] + 0.5) / cell_size  # centers of the pixels
+    masks = np.zeros((4, cell_size, cell_size), dtype=bool)
+    for direction, corners in enumerate(triangles):
+        sides = []
+        for (x0, y0), (x1, y1) in zip(corners, corners[1:] + corners[:1]):
+            sides.append((x1-x0)*(y-y0) - (y1-y0)*(x-x0))
+        sides = np.array(sides)
+        masks[direction] = (sides >= 0).all(axis=0) | (sides <= 0).all(axis=0)
+    return masks
+
+
+def square_indices(labyr, path=None):
+    """Palette indices of the squares.
+    labyr: labyrinth array, the robot codes are drawn as path
+    path: flat indices of the squares visited by the robot
+    """
+    squares = np.where(labyr < 10, labyr, PATH).astype(np.uint8)
+    if path is not None and len(path):
+        flat = squares.reshape(-1)
+        path = np.asarray(path, dtype=np.intp)
+        flat[path[flat[path] == PATH]] = TRAIL
+    return squares
+
+
+def draw_robot(image, pose, cell_size):
+    """Draw the robot on an image of palette indices in place.
+    pose: ((row, col), direction)
+    """
+    (row, col), direction = pose
+    square = image[row*cell_size:(row+1)*cell_size, col*cell_size:(col+1)*cell_size]
+    square[robot_masks(cell_size)[direction]] = ROBOT
+
+
+def render_indices(labyr, pose=None, path=None, cell_size=10):
+    """Render the labyrinth as palette indices.
+    labyr: labyrinth array; if pose is None, the robot is drawn where the array contains its code
+    pose: ((row, col), direction) of the robot
+    path: flat indices of the squares visited by the robot
+    cell_size: size of the squares in pixels
+
+    returns: uint8 array of (rows*cell_size) x (cols*cell_size)
+    """
+    if pose is None:
+        robot = np.flatnonzero(labyr.ravel() >= 10)
+        if robot.size:
+            pose = divmod(int(robot[0]), labyr.shape[1]), int(labyr.flat[robot[0]]) - 10
+    image = np.repeat(np.repeat(square_indices(labyr, path), cell_size, axis=0), cell_size, axis=1)
+    if pose is not None:
+        draw_robot(image, pose, cell_size)
+    return image
+
+
+def render(labyr, pose=None, path=None, cell_size=10):
+    """Render the labyrinth as an RGB image, see render_indices().
+    returns: uint8 array of (rows*cell_size) x (cols*cell_size) x 3
+    """
+    return palette[render_indices(labyr, pose, path, cell_size)]
+
+
+def png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def write_png(filename, image):
+    """Write a PNG file.
+    image: uint8 array of palette indices (rows x cols) or of RGB colors (rows x cols x 3)
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    indexed = image.ndim == 2
+    chunks = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3 if indexed else 2, 0, 0, 0))]
+    if indexed:
+        chunks.append(png_chunk(b'PLTE', palette.tobytes()))
+    # Every row starts with filter type 0 (none)
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, -1)])
+    chunks.append(png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+    chunks.append(png_chunk(b'IEND', b''))
+    with open(filename, 'wb') as png_file:
+        png_file.write(b'\x89PNG\r\n\x1a\n' + b''.join(chunks))
+
+
+def lzw_encode(data, min_code_size):
+    """GIF variant of the LZW compression.
+    data: bytes of palette indices
+    returns: compressed bytes (without the sub-block structure)
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+    bits = n_bits = 0  # bits waiting to be written
+    code_size = min_code_size + 1
+    codes = {}  # (prefix code << 8 | next index) -> code
+    next_code = end + 1
+    bits |= clear << n_bits
+    n_bits += code_size
+    prefix = data[0]
+    for index in data[1:]:
+        key = prefix << 8 | index
+        code = codes.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        bits |= prefix << n_bits
+        n_bits += code_size
+        if next_code < 4096:
+            codes[key] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        else:
+            # The table is full, start a new one
+            bits |= clear << n_bits
+            n_bits += code_size
+            codes = {}
+            code_size = min_code_size + 1
+            next_code = end + 1
+        while n_bits >= 8:
+            out.append(bits & 255)
+            bits >>= 8
+            n_bits -= 8
+        prefix = index
+    for code in [prefix, end]:
+        bits |= code << n_bits
+        n_bits += code_size
+    while n_bits > 0:
+        out.append(bits & 255)
+        bits >>= 8
+        n_bits -= 8
+    return bytes(out)
+
+
+def gif_image(image, left=0, top=0, delay=10):
+    """returns: graphic control extension, image descriptor and data of a GIF frame"""
+    height, width = image.shape
+    min_code_size = 3  # the palette has 8 colors
+    data = lzw_encode(np.ascontiguousarray(image, dtype=np.uint8).tobytes(), min_code_size)
+    blocks = b''.join(bytes([len(data[i:i+255])]) + data[i:i+255] for i in range(0, len(data), 255))
+    return (b'\x21\xf9\x04' + struct.pack('<BHBB', 4, delay, 0, 0) +  # do not dispose the frame
+            b'\x2c' + struct.pack('<HHHHB', left, top, width, height, 0) +
+            bytes([min_code_size]) + blocks + b'\x00')
+
+
+def write_gif(filename, frames, delay=10, loop=0):
+    """Write an animated GIF file.
+    frames: iterable of palette index images; the first one is the full image, the others are (image, left, top)
+    parts of the image that changed
+    delay: time between the frames in 1/100 seconds
+    loop: number of repetitions, 0 is forever
+    """
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape
+    colors = np.zeros((8, 3), dtype=np.uint8)
+    colors[:len(palette)] = palette
+    with open(filename, 'wb') as gif_file:
+        gif_file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0xf2, 0, 0) + colors.tobytes())
+        gif_file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\x00')
+        gif_file.write(gif_image(first, delay=delay))
+        for image, left, top in frames:
+            gif_file.write(gif_image(image, left, top, delay))
+        gif_file.write(b'\x3b')
+
+
+def trace_frames(trace, cell_size=10, every=1, max_frames=None):
+    """Frames of a trace for write_gif(). The path of the robot is drawn, and only the changed squares of the
+    image are updated from frame to frame.
+    trace: runtrace.Trace object
+    every: number of executed lines between the frames
+    """
+    rows, cols = trace.labyr.shape
+    states = trace.states()
+    line, pos, direction = next(states)
+    image = render_indices(trace.labyr, (pos, direction), [pos[0]*cols + pos[1]], cell_size)
+    yield image.copy()
+    changed = [pos]
+    frames = 1
+    for step, (line, pos, direction) in enumerate(states, 1):
+        changed.append(pos)
+        if step % every and step != trace.steps:
+            continue
+        if max_frames is not None and frames >= max_frames:
+            return
+        # Redraw the path in the changed squares and the robot in its new position
+        changed = np.array(changed)
+        for row, col in changed:
+            image[row*cell_size:(row+1)*cell_size, col*cell_size:(col+1)*cell_size] = TRAIL
+        draw_robot(image, (pos, direction), cell_size)
+        (top, left), (bottom, right) = changed.min(axis=0)*cell_size, (changed.max(axis=0)+1)*cell_size
+        yield image[top:bottom, left:right], left, top
+        changed = [pos]
+        frames += 1
+
+
+def write_trace_gif(filename, trace, cell_size=10, every=1, delay=10, max_frames=None):
+    write_gif(filename, trace_frames(trace, cell_size, every, max_frames), delay)
+
+
+def write_trace_png(filename, trace, step=None, cell_size=10):
+    """Write the state of a trace at step (by default at the end) with the path of the robot"""
+    rows, cols = trace.labyr.shape
+    path = []
+    for current, (line, pos, direction) in enumerate(trace.states()):
+        path.append(pos[0]*cols + pos[1])
+        if current == step:
+            break
+    write_png(filename, render_indices(trace.labyr, (pos, direction), path, cell_size))
+
+
+def main(argv=None):
+    from runtrace import Trace
+    parser = argparse.ArgumentParser(prog='render', description='Render an AlgoTaurus trace into a PNG or an '
+                                     'animated GIF file.')
+    parser.add_argument('trace', help='trace file (.attrace)')
+    parser.add_argument('image', help='image file (.png or .gif)')
+    parser.add_argument('--cell-size', type=int, default=10, help='size of the squares in pixels (default: 10)')
+    parser.add_argument('--step', type=int, help='step to render into the PNG file (default: the last one)')
+    parser.add_argument('--every', type=int, default=1, help='executed lines between the GIF frames (default: 1)')
+    parser.add_argument('--delay', type=int, default=10, help='delay between the GIF frames in 1/100 s (default: 10)')
+    parser.add_argument('--max-frames', type=int, help='maximum number of GIF frames')
+    args = parser.parse_args(argv)
+    trace = Trace.load(args.trace)
+    if args.image.lower().endswith('.gif'):
+        write_trace_gif(args.image, trace, args.cell_size, args.every, args.delay, args.max_frames)
+    else:
+        write_trace_png(args.image, trace, args.step, args.cell_size)
+
+
+if __name__ == '__main__':
+    main()
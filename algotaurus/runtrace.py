@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Run traces
+==========
+Record the run of an AlgoTaurus code into a compact binary file, and replay it.
+
+A trace stores the code, the labyrinth, and one event for every executed line: the change of the current line
+and the action of the robot. The events are varint encoded, repeated events are run-length encoded and the
+whole event stream is zlib compressed. After every keyframe_interval events the full state (line, position,
+direction) is stored as a keyframe, so any step can be reached by decoding at most keyframe_interval events.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b'ATTRACE1'
+HEADER = struct.Struct('<IIIIQ')  # keyframe interval, labyrinth rows, labyrinth columns, number of keyframes, steps
+NONE, STEP, RIGHT, LEFT = range(4)  # actions of the robot in an event
+dir_vectors = {0: (0, 1), 1: (1, 0), 2: (0, -1), 3: (-1, 0)}  # right, down, left, up, as in the Robot
+
+
+def write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(buffer, offset):
+    """returns: the value and the offset after the value"""
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class TraceRecorder:
+    """Record the run of a script.
+    Pass the recorder to the Script, which calls record() after every executed line.
+    """
+    def __init__(self, robot, code, current_line=1, keyframe_interval=1024):
+        """robot: Robot object before the first step
+        code: the code of the script as a multi line string
+        """
+        self.labyr = np.where(robot.labyr < 10, robot.labyr, 0).astype(np.uint8)  # labyrinth without the robot
+        self.code = code
+        self.keyframe_interval = keyframe_interval
+        self.line = current_line
+        self.index = robot.index
+        self.dir = robot.dir
+        self.keyframes = [(self.line,) + robot.pos + (self.dir, 0)]
+        self.events = bytearray()
+        self.steps = 0
+        self.token = None  # the last event, which is not written yet, because it may repeat
+        self.count = 0
+
+    def flush(self):
+        if self.count == 1:
+            write_varint(self.events, self.token)
+        elif self.count > 1:
+            write_varint(self.events, self.token | 1)
+            write_varint(self.events, self.count)
+        self.token = None
+        self.count = 0
+
+    def record(self, script):
+        """Record the event of the last executed line of the script"""
+        robot = script.robot
+        if robot.index != self.index:
+            action = STEP
+        elif robot.dir != self.dir:
+            action = RIGHT if robot.dir == (self.dir+1) % 4 else LEFT
+        else:
+            action = NONE
+        delta = script.current_line - self.line
+        token = ((delta << 1) ^ (delta >> 63)) << 3 | action << 1  # zigzag encoded line change, action, run flag
+        if token == self.token:
+            self.count += 1
+        else:
+            self.flush()
+            self.token = token
+            self.count = 1
+        self.line, self.index, self.dir = script.current_line, robot.index, robot.dir
+        self.steps += 1
+        if self.steps % self.keyframe_interval == 0:
+            # Runs never span keyframes, so decoding can start at the keyframe offset
+            self.flush()
+            self.keyframes.append((self.line,) + robot.pos + (self.dir, len(self.events)))
+
+    def trace(self, result=''):
+        """Finish the recording.
+        result: the result message of the run
+        returns: Trace object
+        """
+        self.flush()
+        return Trace(self.labyr, self.code, bytes(self.events), np.array(self.keyframes, dtype=np.int64),
+                     self.keyframe_interval, self.steps, result)
+
+
+class Trace:
+    """Recorded run of a script, which can be saved, loaded and decoded from any step."""
+    def __init__(self, labyr, code, events, keyframes, keyframe_interval, steps, result):
+        self.labyr = labyr
+        self.code = code
+        self.events = events
+        self.keyframes = keyframes
+        self.keyframe_interval = keyframe_interval
+        self.steps = steps
+        self.result = result
+
+    def save(self, filename):
+        with open(filename, 'wb') as trace_file:
+            trace_file.write(MAGIC)
+            trace_file.write(HEADER.pack(self.keyframe_interval, self.labyr.shape[0], self.labyr.shape[1],
+                                         len(self.keyframes), self.steps))
+            for blob in [zlib.compress(self.labyr.tobytes()), zlib.compress(self.events),
+                         zlib.compress(self.keyframes.astype('<i8').tobytes()),
+                         self.code.encode('utf-8'), self.result.encode('utf-8')]:
+                trace_file.write(struct.pack('<Q', len(blob)))
+                trace_file.write(blob)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as trace_file:
+            if trace_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not an AlgoTaurus trace file: %s' % filename)
+            keyframe_interval, rows, cols, keyframe_n, steps = HEADER.unpack(trace_file.read(HEADER.size))
+            blobs = []
+            for i in range(5):
+                length, = struct.unpack('<Q', trace_file.read(8))
+                blobs.append(trace_file.read(length))
+        labyr = np.frombuffer(zlib.decompress(blobs[0]), dtype=np.uint8).reshape(rows, cols)
+        keyframes = np.frombuffer(zlib.decompress(blobs[2]), dtype='<i8').reshape(keyframe_n, 5).astype(np.int64)
+        return cls(labyr, blobs[3].decode('utf-8'), zlib.decompress(blobs[1]), keyframes, keyframe_interval, steps,
+                   blobs[4].decode('utf-8'))
+
+    def states(self, step=0):
+        """Generate the states from step to the end of the trace.
+        The state after the nth executed line is (line, (row, col), dir), the first state is the starting one.
+        """
+        step = max(0, min(step, self.steps))
+        keyframe = step // self.keyframe_interval
+        line, row, col, direction, offset = (int(i) for i in self.keyframes[keyframe])
+        current = keyframe * self.keyframe_interval
+        count = 0
+        while True:
+            if current >= step:
+                yield line, (row, col), direction
+            if current == self.steps:
+                return
+            if count == 0:
+                token, offset = read_varint(self.events, offset)
+                if token & 1:
+                    count, offset = read_varint(self.events, offset)
+                else:
+                    count = 1
+                zigzag, action = token >> 3, token >> 1 & 3
+                delta = (zigzag >> 1) ^ -(zigzag & 1)
+            count -= 1
+            line += delta
+            if action == STEP:
+                row, col = row+dir_vectors[direction][0], col+dir_vectors[direction][1]
+            elif action == RIGHT:
+                direction = (direction+1) % 4
+            elif action == LEFT:
+                direction = (direction-1) % 4
+            current += 1
+
+    def state(self, step):
+        return next(self.states(step))
+
+
+class TracePlayer:
+    """Replay a trace forward and backward.
+    The labyrinth array with the robot codes, the current line, and the position and direction of the robot are
+    kept up to date like in the Labyrinth, Script and Robot objects, so the user interfaces can display them.
+    """
+    def __init__(self, trace):
+        self.trace = trace
+        self.labyr = trace.labyr.astype(float)
+        self.pos = np.array(trace.state(0)[1])
+        self.seek(0)
+
+    def update(self, state):
+        self.labyr[tuple(self.pos)] = 0
+        self.current_line, pos, self.dir = state
+        self.pos = np.array(pos)
+        self.labyr[pos] = self.dir+10
+
+    def seek(self, step):
+        """Jump to the state after the stepth executed line"""
+        self.step = max(0, min(step, self.trace.steps))
+        self.next_states = self.trace.states(self.step)
+        self.update(next(self.next_states))
+
+    def forward(self):
+        """returns: False if the end of the trace is reached"""
+        if self.step >= self.trace.steps:
+            return False
+        self.step += 1
+        self.update(next(self.next_states))
+        return True
+
+    def back(self):
+        """returns: False if the beginning of the trace is reached"""
+        if self.step == 0:
+            return False
+        self.seek(self.step-1)
+        return True
+
+    def finished(self):
+        return self.step >= self.trace.steps
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Reference solvers
+=================
+Native solvers working with the same sensors as an AlgoTaurus code: the robot can only see whether there is a
+wall or an exit in front of it, and it can turn, step and quit.
+The solvers run directly on the lookup tables of the Robot, and they leave the robot in its final state.
+They are the baselines of the benchmarks and of the batch evaluation.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import collections
+import random
+
+# success: the robot reached the exit, moves: steps made, turns: left and right turns made
+Solution = collections.namedtuple('Solution', ['success', 'moves', 'turns'])
+
+
+def finish(robot, index, direction, moves, turns, success):
+    """Store the final state in the robot.
+    returns: Solution
+    """
+    robot.previous_index = robot.index
+    robot.index, robot.dir = index, direction
+    robot.moves += moves
+    robot.update_robot()
+    return Solution(success, moves, turns)
+
+
+def wall_follower(robot, hand='right', max_moves=1000000):
+    """Keep a hand on the wall.
+    hand: 'right' or 'left'
+    """
+    walls, exits, offsets = robot.walls, robot.exits, robot.offsets
+    index, direction = robot.index, robot.dir
+    turn = 1 if hand == 'right' else -1
+    moves = turns = 0
+    while moves < max_moves:
+        # Turn towards the hand, then back until the way is free
+        direction = (direction+turn) % 4
+        turns += 1
+        for i in range(4):
+            if exits[index] >> direction & 1:
+                return finish(robot, index, direction, moves, turns, True)
+            if not walls[index] >> direction & 1:
+                break
+            direction = (direction-turn) % 4
+            turns += 1
+        else:
+            break  # walled in
+        index += offsets[direction]
+        moves += 1
+    return finish(robot, index, direction, moves, turns, False)
+
+
+def right_hand(robot, max_moves=1000000):
+    return wall_follower(robot, 'right', max_moves)
+
+
+def left_hand(robot, max_moves=1000000):
+    return wall_follower(robot, 'left', max_moves)
+
+
+def tremaux(robot, max_moves=1000000):
+    """Trémaux's algorithm: mark the passages when walking through them, never walk through a passage a third time.
+    Every square is treated as a junction. To see the neighbours, the robot turns right until it finds a
+    free unmarked passage.
+    """
+    walls, exits, offsets = robot.walls, robot.exits, robot.offsets
+    index, direction = robot.index, robot.dir
+    marks = bytearray(len(walls)*4)  # number of times the passage in a direction of a square was walked through
+    visited = bytearray(len(walls))
+    back = None  # direction to the previous square
+    moves = turns = 0
+    while moves < max_moves:
+        choice = None
+        if back is not None and visited[index] and marks[index*4+back] == 1:
+            choice = back  # arrived to a known square through a new passage: go back
+        else:
+            visited[index] = 1
+            fallback = None
+            for i in range(4):
+                if i:
+                    direction = (direction+1) % 4
+                    turns += 1
+                if exits[index] >> direction & 1:
+                    return finish(robot, index, direction, moves, turns, True)
+                if walls[index] >> direction & 1:
+                    continue
+                mark = marks[index*4+direction]
+                if mark == 0 and direction != back:
+                    choice = direction
+                    break
+                if mark == 1 and fallback is None:
+                    fallback = direction
+            if choice is None:
+                choice = fallback
+            if choice is None:
+                break  # every passage is walked through twice
+        turns += min((choice-direction) % 4, (direction-choice) % 4)
+        direction = choice
+        marks[index*4+direction] += 1
+        index += offsets[direction]
+        back = (direction+2) % 4
+        marks[index*4+back] += 1
+        moves += 1
+    return finish(robot, index, direction, moves, turns, False)
+
+
+def random_walk(robot, max_moves=1000000, rng=None):
+    """Blind random walk: turn randomly and step if there is no wall ahead. No memory is used.
+    rng: random.Random object, by default it is seeded with the starting position, so the results are repeatable
+    """
+    walls, exits, offsets = robot.walls, robot.exits, robot.offsets
+    index, direction = robot.index, robot.dir
+    rng = rng or random.Random(index)
+    moves = turns = 0
+    while moves < max_moves:
+        turn = rng.randrange(4)
+        direction = (direction+turn) % 4
+        turns += min(turn, 4-turn)
+        if exits[index] >> direction & 1:
+            return finish(robot, index, direction, moves, turns, True)
+        if not walls[index] >> direction & 1:
+            index += offsets[direction]
+            moves += 1
+    return finish(robot, index, direction, moves, turns, False)
+
+
+solvers = collections.OrderedDict([('right hand', right_hand), ('left hand', left_hand), ('tremaux', tremaux),
+                                   ('random walk', random_walk)])
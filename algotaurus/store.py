@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Results store
+=============
+Store the results of the batch evaluation in an SQLite database, and list the leaderboards of the challenges:
+the shortest code, the fewest moves and the fewest executed lines.
+
+Tables:
+programs: canonical hash, code and length (number of lines) of the programs
+submissions: a code evaluated on a maze set (a description of the labyrinths, e.g. their size, type and seed)
+results: one row for every labyrinth of a submission: maze id, outcome, moves, executed lines, duration
+scores: totals of the results of the submissions, updated together with the results, so the leaderboards do not
+read the results table
+
+The results are inserted in batches inside transactions, and the database uses write-ahead logging, so it can be
+read while the results are written.
+
+Use from the command line:
+python evaluate.py code.lab -n 100 --seed 1 --store results.db --name Alice
+python store.py results.db --challenge moves
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import time
+
+import algotaurus
+
+outcomes = ['success', 'failure', 'timeout']  # stored as their index
+# Order of the leaderboards: shortest code, fewest mean moves and fewest mean executed lines, only for the
+# submissions which passed all their labyrinths
+challenges = {'length': 'scores.length', 'moves': 'CAST(moves AS REAL)/mazes',
+              'lines': 'CAST(lines AS REAL)/mazes'}
+
+schema = '''
+CREATE TABLE IF NOT EXISTS programs (
+    hash TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    program TEXT NOT NULL REFERENCES programs(hash),
+    maze_set TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    submission INTEGER NOT NULL REFERENCES submissions(id),
+    maze INTEGER NOT NULL,
+    program TEXT NOT NULL,
+    outcome INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    duration REAL,
+    PRIMARY KEY (submission, maze)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scores (
+    submission INTEGER PRIMARY KEY REFERENCES submissions(id),
+    maze_set TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    mazes INTEGER NOT NULL DEFAULT 0,
+    passed INTEGER NOT NULL DEFAULT 0,
+    moves INTEGER NOT NULL DEFAULT 0,
+    lines INTEGER NOT NULL DEFAULT 0,
+    duration REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_program ON results(program, maze);
+CREATE INDEX IF NOT EXISTS submissions_program ON submissions(program);
+CREATE INDEX IF NOT EXISTS scores_length ON scores(maze_set, length) WHERE passed = mazes;
+CREATE INDEX IF NOT EXISTS scores_moves ON scores(maze_set, CAST(moves AS REAL)/mazes) WHERE passed = mazes;
+CREATE INDEX IF NOT EXISTS scores_lines ON scores(maze_set, CAST(lines AS REAL)/mazes) WHERE passed = mazes;
+'''
+
+
+def canonical_program(code):
+    """Canonical form of a code: the compiled instructions (see algotaurus.compile_code) without the trailing
+    empty lines, so the commands written in any language and letter case are the same. The messages of the syntax
+    errors are left out, because they depend on the language.
+    returns: tuple of instructions
+    """
+    program = algotaurus.compile_code(code.rstrip())[1:]
+    return tuple(instruction[:1] if instruction[0] == 'error' else instruction for instruction in program)
+
+
+def program_hash(code):
+    return hashlib.sha1(repr(canonical_program(code)).encode('utf-8')).hexdigest()
+
+
+class ResultStore:
+    """SQLite database of evaluation results, see the module documentation."""
+    def __init__(self, filename, batch_size=10000):
+        """filename: database file, it is created if it does not exist
+        batch_size: number of results inserted with a single statement
+        """
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(schema)
+        self.batch_size = batch_size
+
+    def add_submission(self, code, maze_set, name=''):
+        """maze_set: description of the labyrinths, the leaderboards compare the submissions of the same maze set
+        returns: id of the submission
+        """
+        code = code.rstrip()
+        program = program_hash(code)
+        with self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO programs VALUES (?, ?, ?)',
+                                    (program, code, len(canonical_program(code))))
+            submission = self.connection.execute(
+                'INSERT INTO submissions (name, program, maze_set, created) VALUES (?, ?, ?, ?)',
+                (name, program, maze_set, time.time())).lastrowid
+            self.connection.execute('INSERT INTO scores (submission, maze_set, length) '
+                                    'SELECT ?, ?, length FROM programs WHERE hash = ?',
+                                    (submission, maze_set, program))
+        return submission
+
+    def add_results(self, submission, results, mazes=None):
+        """Insert the results of a submission, and update its scores.
+        results: iterable of evaluate.Result
+        mazes: ids of the labyrinths of the results, by default 0, 1, 2...
+        """
+        program = self.connection.execute('SELECT program FROM submissions WHERE id = ?',
+                                          (submission,)).fetchone()[0]
+        if mazes is None:
+            mazes = range(len(results))
+        rows = [(submission, maze, program, outcomes.index(result.outcome), result.moves, result.steps,
+                 result.duration) for maze, result in zip(mazes, results)]
+        with self.connection:
+            for first in range(0, len(rows), self.batch_size):
+                self.connection.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                            rows[first:first+self.batch_size])
+            # The moves and the executed lines are summed only for the passed labyrinths
+            passed = [row for row in rows if row[3] == 0]
+            self.connection.execute(
+                'UPDATE scores SET mazes = mazes + ?, passed = passed + ?, moves = moves + ?, lines = lines + ?, '
+                'duration = duration + ? WHERE submission = ?',
+                (len(rows), len(passed), sum(row[4] for row in passed), sum(row[5] for row in passed),
+                 sum(row[6] or 0 for row in rows), submission))
+
+    def leaderboard(self, maze_set, challenge='length', limit=10):
+        """Best submissions of the maze set, which passed all their labyrinths.
+        challenge: 'length', 'moves' or 'lines', see challenges
+        returns: list of (name, submission id, length, mean moves, mean executed lines, code)
+        """
+        return self.connection.execute(
+            'SELECT name, submission, scores.length, CAST(moves AS REAL)/mazes, CAST(lines AS REAL)/mazes, code '
+            'FROM scores JOIN submissions ON submissions.id = submission JOIN programs ON programs.hash = program '
+            'WHERE scores.maze_set = ? AND passed = mazes AND mazes > 0 '
+            'ORDER BY %s, submission LIMIT ?' % challenges[challenge], (maze_set, limit)).fetchall()
+
+    def maze_sets(self):
+        return [row[0] for row in self.connection.execute('SELECT DISTINCT maze_set FROM submissions')]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='store', description='Show the leaderboards of an AlgoTaurus results '
+                                     'database.')
+    parser.add_argument('database', help='results database file')
+    parser.add_argument('--challenge', default='length', choices=list(challenges),
+                        help='shortest code, fewest moves or fewest executed lines (default: length)')
+    parser.add_argument('--maze-set', help='maze set of the leaderboard (default: all of them)')
+    parser.add_argument('--limit', type=int, default=10, help='number of submissions to list (default: 10)')
+    args = parser.parse_args(argv)
+    with ResultStore(args.database) as store:
+        for maze_set in [args.maze_set] if args.maze_set else store.maze_sets():
+            print(maze_set)
+            print('%-20s %10s %8s %12s %12s' % ('name', 'submission', 'length', 'mean moves', 'mean lines'))
+            for name, submission, length, moves, lines, code in store.leaderboard(maze_set, args.challenge,
+                                                                                  args.limit):
+                print('%-20s %10d %8d %12.1f %12.1f' % (name, submission, length, moves, lines))
+            print()
+
+
+if __name__ == '__main__':
+    main()
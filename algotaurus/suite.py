@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Test suites
+===========
+Select a small set of labyrinths from a corpus, in which a code covers the same branches as in the whole
+corpus, to regrade the changed versions of the code quickly.
+
+The branch coverage of a run is the set of the (line, sensor result) pairs of the executed wall? and exit? lines
+(see native.run_script) and the result message of the run. The labyrinths are selected greedily: the
+next one is always the labyrinth which covers the most branches not covered yet.
+
+The wall follower reference solvers are covered as their codes. The other solvers are not codes, so they have no
+branches to cover.
+
+Use from the command line:
+python suite.py mazes mazes-suite --code code.lab
+python suite.py mazes mazes-suite --reference 'right hand'
+python evaluate.py code.lab --suite mazes-suite
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import argparse
+import numpy as np
+
+import algotaurus
+import corpus
+import native
+
+
+def wall_follower_code(hand='right'):
+    """The wall follower solver (see solvers.wall_follower) as a code in the current language"""
+    left, right, step, wall, exit_, quit_, goto = algotaurus.local_commands
+    towards, back = (right, left) if hand == 'right' else (left, right)
+    return '\n'.join([towards.upper(),
+                      '%s 8 3' % exit_.upper(),
+                      '%s 4 6' % wall.upper(),
+                      back.upper(),
+                      '%s 2' % goto.upper(),
+                      step.upper(),
+                      '%s 1' % goto.upper(),
+                      quit_.upper()])
+
+
+def branch_coverage(code, labyrs, starts, max_steps=100000):
+    """Run the code with the native backend in the labyrinths, and collect the branch coverage of the runs.
+    returns: list of the sets of (line, sensor result) and ('result', message) items of the labyrinths
+    """
+    code = code.rstrip()
+    coverages = []
+    for labyr, start in zip(labyrs, starts):
+        robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyr), start)
+        script = algotaurus.Script(code, robot, max_line=code.count('\n')+1)
+        branches = set()
+        branches.add(('result', native.run_script(script, max_steps, branches=branches)))
+        coverages.append(branches)
+    return coverages
+
+
+def coverage_matrix(coverages):
+    """returns: list of the covered branches, bool array of labyrinths x branches"""
+    branches = sorted(set().union(*coverages), key=repr)
+    columns = {branch: column for column, branch in enumerate(branches)}
+    matrix = np.zeros((len(coverages), len(branches)), dtype=bool)
+    for row, coverage in enumerate(coverages):
+        matrix[row, [columns[branch] for branch in coverage]] = True
+    return branches, matrix
+
+
+def select(matrix):
+    """Greedy set cover: take the labyrinth which covers the most new branches until all branches are covered.
+    Of the labyrinths covering the same number, the first one is taken.
+    returns: list of the selected rows
+    """
+    covered = np.zeros(matrix.shape[1], dtype=bool)
+    selected = []
+    while not covered.all():
+        gains = np.count_nonzero(matrix & ~covered, axis=1)
+        row = int(gains.argmax())
+        selected.append(row)
+        covered |= matrix[row]
+    return selected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='suite', description='Select the labyrinths of a corpus which cover the '
+                                     'branches of an AlgoTaurus code.')
+    parser.add_argument('corpus', help='corpus directory (see corpus.py)')
+    parser.add_argument('suite', help='directory of the selected labyrinths, written as a corpus')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--code', help='AlgoTaurus code file (.lab)')
+    group.add_argument('--reference', choices=['right hand', 'left hand'],
+                       help='wall follower solver, covered as its code (the other reference solvers are not codes)')
+    parser.add_argument('--max-steps', type=int, default=100000,
+                        help='maximum number of executed lines in a labyrinth (default: 100000)')
+    args = parser.parse_args(argv)
+    if args.code:
+        with open(args.code, encoding='utf-8') as code_file:
+            code = code_file.read()
+    else:
+        code = wall_follower_code(args.reference.split()[0])
+    maze_corpus = corpus.Corpus(args.corpus)
+    branches, matrix = coverage_matrix(branch_coverage(code, maze_corpus.labyrs, maze_corpus.starts,
+                                                       args.max_steps))
+    selected = select(matrix)
+    labyrs, starts = maze_corpus.labyrinths(selected)
+    corpus.Corpus.save(args.suite, labyrs, starts, '%s, %d labyrinths covering %s' %
+                       (maze_corpus.description, len(selected), args.code or args.reference))
+    print('%d branches covered by %d of %d labyrinths' % (len(branches), len(selected), len(maze_corpus)))
+
+
+if __name__ == '__main__':
+    main()
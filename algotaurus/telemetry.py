@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Telemetry
+=========
+Lightweight phase timers for the --profile option of AlgoTaurus.
+
+A phase is a group of methods, e.g. the commands of the Robot. When the telemetry is enabled, the methods are
+wrapped to count their calls and to sum their running time. The times are inclusive, and a method called inside
+another method of the same phase is not counted again. The methods are not wrapped without the --profile option,
+so they have no overhead then.
+
+Copyright, 2015-2021, Attila Krajcsi, Ádám Markója (GUI)
+
+AlgoTaurus is distributed under the terms of the GNU General Public License 3.
+"""
+
+import collections
+import functools
+import time
+
+timers = collections.OrderedDict()  # phase name -> [calls, seconds, depth of the running calls]
+start_time = None
+
+
+def wrap(function, timer):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        if timer[2]:
+            return function(*args, **kwargs)
+        timer[2] += 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer[1] += time.perf_counter() - start
+            timer[0] += 1
+            timer[2] -= 1
+    return timed
+
+
+def enable(phases):
+    """Start measuring the phases.
+    phases: list of (phase name, class, list of method names)
+    """
+    global start_time
+    for name, cls, methods in phases:
+        timer = timers.setdefault(name, [0, 0.0, 0])
+        for method in methods:
+            setattr(cls, method, wrap(getattr(cls, method), timer))
+    start_time = time.perf_counter()
+
+
+def enabled():
+    return start_time is not None
+
+
+def calls(name):
+    """returns: number of calls of the phase"""
+    return timers[name][0] if name in timers else 0
+
+
+def summary():
+    """returns: wall time in seconds, list of (phase name, calls, seconds, mean microseconds, share of the wall
+    time)
+    """
+    wall = time.perf_counter() - start_time
+    return wall, [(name, count, seconds, seconds/count*1e6 if count else 0.0, seconds/wall)
+                  for name, (count, seconds, depth) in timers.items()]
+
+
+def print_summary():
+    wall, rows = summary()
+    print('%-22s %10s %10s %10s %8s' % ('phase', 'calls', 'seconds', 'mean us', 'share'))
+    for name, count, seconds, mean, share in rows:
+        print('%-22s %10d %10.3f %10.1f %7.1f%%' % (name, count, seconds, mean, share*100))
+    print('%-22s %10s %10.3f' % ('wall time', '', wall))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+import pytest
+
+import algotaurus
+import analysis
+import debugger
+import generators
+
+right_hand = 'RIGHT\nEXIT? 8 3\nWALL? 4 6\nLEFT\nGOTO 2\nSTEP\nGOTO 1\nQUIT'
+commands = ['RIGHT', 'LEFT', 'STEP', 'STEP', 'QUIT', '', 'GOTO %d', 'WALL? %d %d', 'WALL? %d %d', 'EXIT? %d %d']
+
+
+def random_code(rng):
+    size = rng.randint(1, 10)
+    return '\n'.join(command.replace('%d', '{}').format(*[rng.randint(1, size+2)
+                                                           for i in range(command.count('%d'))])
+                     for command in (rng.choice(commands) for i in range(size)))
+
+
+def make_script(code=right_hand, seed=2, recorder=None):
+    labyrs, starts = generators.generate_labyrinths(1, 31, 31, 1, seed)
+    robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyrs[0]), starts[0])
+    return algotaurus.Script(code, robot, max_line=code.count('\n')+1, recorder=recorder)
+
+
+@pytest.mark.parametrize('text', ['line 7', 'line 7 hits 1000', 'cell 5 9 if moves > 100', 'direction up',
+                                  'steps 2000000', 'direction left hits 3 if wall and not exit'])
+def test_parse_format_round_trip(text):
+    breakpoint = debugger.parse_breakpoint(text)
+    assert debugger.format_breakpoint(breakpoint) == text
+    assert debugger.parse_breakpoint(debugger.format_breakpoint(breakpoint)) == breakpoint
+
+
+@pytest.mark.parametrize('text', ['', 'line', 'line x', 'cell 5', 'direction north', 'hits 3', 'line 3 if (',
+                                  'jump 3'])
+def test_parse_rejects_invalid_breakpoints(text):
+    with pytest.raises(ValueError):
+        debugger.parse_breakpoint(text)
+
+
+def test_line_breakpoint_pauses_before_the_line():
+    script = make_script()
+    debug = debugger.Debugger(script, ['line 6 hits 5'])
+    assert debug.run() == 'break'
+    assert (debug.paused, debug.hits, script.current_line) == (0, [5], 6)
+    expected = make_script()
+    executed = 0
+    while True:
+        if expected.current_line == 6:
+            executed += 1
+            if executed == 5:
+                break
+        expected.execute_command()
+    assert script.snapshot() == expected.snapshot()
+    # The run continues at the paused line without pausing at it again
+    assert debug.run() == 'break'
+    assert debug.hits == [6] and script.current_line == 6 and script.robot.moves == 5
+
+
+def test_conditions_and_steps_breakpoints():
+    script = make_script()
+    debug = debugger.Debugger(script, ['line 6 if moves > 10'])
+    assert debug.run() == 'break'
+    assert script.current_line == 6 and script.robot.moves == 11
+    debug.clear()
+    steps = script.steps + 50
+    debug.add('steps %d' % steps)
+    assert debug.run() == 'break'
+    assert script.steps == steps
+    assert debug.run(50) == 'go on'
+    assert script.steps == steps + 50
+
+
+def test_watch_values():
+    script = make_script()
+    debug = debugger.Debugger(script, watches=['steps', 'line == 1', 'undefined'])
+    row, col = divmod(script.robot.index, script.robot.cols)
+    debug.add_watch('(row, col)')
+    values = dict(debug.watch_values())
+    assert values['steps'] == '0' and values['line == 1'] == 'True'
+    assert values['undefined'].startswith('NameError')
+    assert values['(row, col)'] == repr((row, col))
+
+
+def random_breakpoints(rng, code, script):
+    # The cells around the start, so the runs reach them
+    row, col = divmod(script.robot.index, script.robot.cols)
+    cells = [cell for cell in np.argwhere(script.robot.labyr == 0) if abs(cell - (row, col)).sum() <= 4]
+    breakpoints = []
+    for i in range(rng.randint(1, 4)):
+        kind = rng.choice(['line', 'cell', 'direction', 'steps'])
+        if kind == 'line':
+            text = 'line %d' % rng.randint(1, code.count('\n')+1)
+        elif kind == 'cell':
+            text = 'cell %d %d' % tuple(cells[rng.randrange(len(cells))])
+        elif kind == 'direction':
+            text = 'direction %s' % rng.choice(debugger.directions)
+        else:
+            text = 'steps %d' % rng.randint(1, 300)
+        if rng.random() < 0.3:
+            text += ' hits %d' % rng.randint(2, 5)
+        if rng.random() < 0.3:
+            text += ' if %s' % rng.choice(['moves % 2', 'steps > 20', 'not wall', 'hits[0] > 1'])
+        breakpoints.append(text)
+    return breakpoints
+
+
+def test_native_debug_runs_as_the_interpreted_runs():
+    rng = random.Random(1)
+    for i in range(300):
+        code = rng.choice([right_hand, random_code(rng)])
+        seed = rng.randint(1, 5)
+        script = make_script(code, seed)
+        breakpoints = random_breakpoints(rng, code, script)
+        native_debug = debugger.Debugger(script, breakpoints)
+        # A script with a recorder is run by the interpreter
+        interpreted = make_script(code, seed, recorder=analysis.CoverageRecorder())
+        interpreted_debug = debugger.Debugger(interpreted, breakpoints)
+        for run in range(10):
+            result = native_debug.run(500)
+            assert result == interpreted_debug.run(500), (code, breakpoints)
+            assert script.snapshot() == interpreted.snapshot(), (code, breakpoints)
+            assert (native_debug.paused, native_debug.hits) == (interpreted_debug.paused, interpreted_debug.hits)
+            if result not in ['break', 'go on']:
+                break
+
+
+def test_history_is_cleared_after_a_fast_run():
+    script = make_script()
+    history = algotaurus.History(script)
+    for i in range(10):
+        history.execute_command()
+    assert debugger.Debugger(script, ['steps 100']).run() == 'break'
+    history.clear()
+    assert not history.step_back()
+    assert script.steps == 100
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import algotaurus
+import generators
+
+right_hand = 'RIGHT\nEXIT? 8 3\nWALL? 4 6\nLEFT\nGOTO 2\nSTEP\nGOTO 1\nQUIT'
+
+
+def make_script(code=right_hand, seed=2):
+    labyrs, starts = generators.generate_labyrinths(1, 15, 15, 1, seed)
+    robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyrs[0]), starts[0])
+    return algotaurus.Script(code, robot, max_line=code.count('\n')+1)
+
+
+def test_snapshot_restore_round_trip():
+    script = make_script()
+    for i in range(10):
+        script.execute_command()
+    state = script.snapshot()
+    labyr = script.robot.labyr.copy()
+    for i in range(25):
+        script.execute_command()
+    assert script.snapshot() != state
+    script.restore(state)
+    assert script.snapshot() == state
+    assert (script.robot.labyr == labyr).all()
+
+
+def test_step_back_restores_the_previous_states():
+    script = make_script()
+    history = algotaurus.History(script)
+    states = []
+    for i in range(30):
+        states.append(script.snapshot())
+        assert history.execute_command() == 'go on'
+    for state in reversed(states):
+        assert history.step_back()
+        assert script.snapshot() == state
+    assert not history.step_back()
+    assert script.snapshot() == states[0]
+
+
+def test_stepping_back_and_forward_repeats_the_run():
+    script = make_script()
+    history = algotaurus.History(script)
+    for i in range(20):
+        history.execute_command()
+    end = script.snapshot()
+    for i in range(7):
+        history.step_back()
+    for i in range(7):
+        history.execute_command()
+    assert script.snapshot() == end
+
+
+def test_run_back_to_line():
+    script = make_script()
+    history = algotaurus.History(script)
+    states = []
+    for i in range(40):
+        states.append(script.snapshot())
+        history.execute_command()
+    assert history.run_back_to_line(6)
+    # The last state before line 6 was executed
+    assert script.snapshot() == [state for state in states if state[0] == 6][-1]
+    current = script.snapshot()
+    assert not history.run_back_to_line(8)  # QUIT is not executed yet
+    assert script.snapshot() == current
+
+
+def test_ring_buffer_keeps_the_last_states():
+    script = make_script()
+    history = algotaurus.History(script, size=8)
+    states = []
+    for i in range(20):
+        states.append(script.snapshot())
+        history.execute_command()
+    for state in reversed(states[-8:]):
+        assert history.step_back()
+        assert script.snapshot() == state
+    assert not history.step_back()
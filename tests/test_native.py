@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+import algotaurus
+import analysis
+import generators
+import native
+import peephole
+
+right_hand = 'RIGHT\nEXIT? 8 3\nWALL? 4 6\nLEFT\nGOTO 2\nSTEP\nGOTO 1\nQUIT'
+commands = ['RIGHT', 'LEFT', 'STEP', 'STEP', 'QUIT', '', 'GOTO %d', 'WALL? %d %d', 'WALL? %d %d', 'EXIT? %d %d',
+            'JUMP']
+
+
+def random_code(rng):
+    """Random code with jumps also after the end of the code and syntax errors"""
+    size = rng.randint(1, 10)
+    return '\n'.join(command.replace('%d', '{}').format(*[rng.randint(1, size+2)
+                                                           for i in range(command.count('%d'))])
+                     for command in (rng.choice(commands) for i in range(size)))
+
+
+@pytest.fixture(scope='module')
+def labyrinths():
+    labyrs, starts = generators.generate_labyrinths(20, 11, 11, 1, 3)
+    return list(zip(labyrs, starts))
+
+
+def make_script(code, labyrinth, max_line=None, recorder=None):
+    labyr, start = labyrinth
+    robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyr), start)
+    return algotaurus.Script(code, robot, max_line=code.count('\n')+1 if max_line is None else max_line,
+                             recorder=recorder)
+
+
+def interpret(script, max_steps):
+    result = 'go on'
+    while result == 'go on' and script.steps < max_steps:
+        result = script.execute_command()
+    return result
+
+
+def test_random_codes_run_as_with_the_interpreter(labyrinths):
+    rng = random.Random(1)
+    for i in range(400):
+        code = random_code(rng)
+        max_line = code.count('\n')+1 + rng.choice([0, 0, 1, -1])
+        max_steps = rng.choice([1, 7, 100, 3000])
+        for labyrinth in rng.sample(labyrinths, 3):
+            expected = make_script(code, labyrinth, max_line)
+            expected_result = interpret(expected, max_steps)
+            script = make_script(code, labyrinth, max_line)
+            result = native.run_script(script, max_steps)
+            assert script.snapshot() == expected.snapshot(), code
+            assert result == expected_result, code
+            assert script.robot.labyr.flat[script.robot.index] == script.robot.dir + 10
+
+
+def test_runs_continue_in_chunks(labyrinths):
+    expected = make_script(right_hand, labyrinths[0])
+    expected_result = interpret(expected, 100000)
+    script = make_script(right_hand, labyrinths[0])
+    result = 'go on'
+    while result == 'go on':
+        result = native.run_script(script, 13)
+    assert (result, script.snapshot()) == (expected_result, expected.snapshot())
+
+
+def test_trail_matches_the_trail_recorder(labyrinths):
+    rng = random.Random(2)
+    for code in [right_hand] + [random_code(rng) for i in range(100)]:
+        for labyrinth in labyrinths[:3]:
+            expected_trail = []
+            expected = make_script(code, labyrinth)
+            expected.recorder = analysis.TrailRecorder(expected.robot, expected_trail)
+            interpret(expected, 2000)
+            trail = []
+            native.run_script(make_script(code, labyrinth), 2000, trail)
+            assert trail == expected_trail, code
+
+
+def test_branches_match_the_coverage_recorder(labyrinths):
+    rng = random.Random(3)
+    for code in [right_hand] + [random_code(rng) for i in range(200)]:
+        for labyrinth in labyrinths[:3]:
+            recorder = analysis.CoverageRecorder()
+            expected = make_script(code, labyrinth, recorder=recorder)
+            expected_result = interpret(expected, 500)
+            branches = set()
+            script = make_script(code, labyrinth)
+            assert native.run_script(script, 500, branches=branches) == expected_result
+            assert script.snapshot() == expected.snapshot()
+            assert branches == recorder.branches, code
+
+
+def test_compiled_functions_are_cached():
+    program = tuple(algotaurus.compile_code(right_hand))
+    assert native.compile_program(program, 8) is native.compile_program(program, 8)
+    assert native.compile_program(program, 8) is not native.compile_program(program, 7)
+
+
+def optimized(code):
+    program = algotaurus.compile_code(code)
+    return peephole.optimize(program, len(program)-1)
+
+
+@pytest.mark.parametrize('code, loop', [('STEP\nWALL? 3 1\nRIGHT\nGOTO 1', (2, 1, {1})),
+                                        ('STEP\nEXIT? 4 3\nGOTO 1\nQUIT', (3, 1, {1})),
+                                        ('STEP\nSTEP\n\nWALL? 6 1\nQUIT\nLEFT\nGOTO 1', (4, 2, {1})),
+                                        ('STEP\nRIGHT\nGOTO 1', None)])
+def test_corridor_loops(code, loop):
+    assert native.corridor_loop(optimized(code), 1) == loop
+
+
+def test_corridor_runs_measure_the_corridors(labyrinths):
+    labyr, start = labyrinths[0]
+    robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyr), start)
+    runs = native.CorridorRuns(robot.walls, robot.exits, robot.offsets)
+    for index in range(robot.labyr.size):
+        if robot.labyr.flat[index] in [1, 2]:
+            continue
+        for direction in range(4):
+            length = 0
+            square = index
+            while not (robot.walls[square] | robot.exits[square]) >> direction & 1:
+                square += robot.offsets[direction]
+                length += 1
+            assert runs[index*4 + direction] == length
+
+
+corridor_codes = ['STEP\nWALL? 3 1\nRIGHT\nGOTO 1',
+                  'EXIT? 6 2\nWALL? 4 3\nSTEP\nGOTO 1\nLEFT\nGOTO 1\nQUIT',
+                  'STEP\nSTEP\n\nWALL? 6 1\nQUIT\nLEFT\nGOTO 1',
+                  'RIGHT\nEXIT? 9 3\nWALL? 4 6\nLEFT\nGOTO 2\nSTEP\nWALL? 1 6\nGOTO 1\nQUIT']
+
+
+@pytest.mark.parametrize('labyr_type', [0, 2, 3])
+def test_corridor_loops_are_fast_forwarded_exactly(labyr_type):
+    labyrs, starts = generators.generate_labyrinths(4, 51, 51, labyr_type, 4)
+    rng = random.Random(labyr_type)
+    for code in corridor_codes:
+        assert native.compile_program(tuple(algotaurus.compile_code(code)), code.count('\n')+1).corridors
+        for labyrinth in zip(labyrs, starts):
+            # The step limits stop the runs also in the middle of the corridors
+            for max_steps in [rng.randint(1, 200) for i in range(5)] + [100000]:
+                expected = make_script(code, labyrinth)
+                expected_result = interpret(expected, max_steps)
+                script = make_script(code, labyrinth)
+                assert native.run_script(script, max_steps) == expected_result
+                assert script.snapshot() == expected.snapshot(), (code, max_steps)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+import algotaurus
+import peephole
+
+commands = ['RIGHT', 'LEFT', 'STEP', 'QUIT', '', 'GOTO %d', 'GOTO %d', 'WALL? %d %d', 'EXIT? %d %d']
+
+
+def random_code(rng):
+    size = rng.randint(1, 12)
+    return '\n'.join(command.replace('%d', '{}').format(*[rng.randint(1, size+2)
+                                                           for i in range(command.count('%d'))])
+                     for command in (rng.choice(commands) for i in range(size)))
+
+
+def optimize(code, barriers=frozenset()):
+    program = algotaurus.compile_code(code)
+    return program, peephole.optimize(program, code.count('\n')+1, barriers)
+
+
+def run_original(program, line, lines, branch=0):
+    """Run the lines of the original code without moving the robot, the first test continues on the branch.
+    returns: line after the executed lines, net number of right turns
+    """
+    rotation = 0
+    for i in range(lines):
+        instruction = peephole.instruction_at(program, line)
+        if instruction[0] == 'goto':
+            line = instruction[1]
+        elif instruction[0] in ['wall?', 'exit?']:
+            assert i == 0
+            line = instruction[1 + branch]
+        elif instruction[0] in ['right', 'left']:
+            rotation += 1 if instruction[0] == 'right' else 3
+            line += 1
+        else:
+            assert instruction[0] == 'empty' or i == 0
+            line += 1
+    return line, rotation % 4
+
+
+def test_turns_are_folded():
+    program, optimized = optimize('RIGHT\nRIGHT\nRIGHT\nSTEP\nLEFT\nRIGHT\n\nGOTO 1')
+    assert optimized.at(1) == (('turn', 3, 4), (3,))
+    assert optimized.at(2) == (('turn', 2, 4), (2,))
+    assert optimized.at(5) == (('turn', 0, 1), (4,))
+
+
+def test_jumps_are_threaded():
+    program, optimized = optimize('STEP\nGOTO 5\nWALL? 2 4\n\nGOTO 1\nQUIT')
+    assert optimized.at(2) == (('goto', 1), (2,))
+    assert optimized.at(3) == (('wall?', 1, 1), (3, 3))
+
+
+def test_self_loops_terminate():
+    program, optimized = optimize('GOTO 2\nGOTO 1')
+    assert optimized.at(1) == (('goto', 2), (3,))
+    program, optimized = optimize('RIGHT\nGOTO 1')
+    assert optimized.at(1) == (('turn', 1, 1), (2,))
+
+
+def test_unreachable_lines():
+    program, optimized = optimize('STEP\nGOTO 4\nRIGHT\nWALL? 1 6\nLEFT\nQUIT\nSTEP')
+    assert optimized.reachable == {1, 2, 4, 6}
+    assert optimized.leaders() == [1, 4, 6]
+
+
+def test_barriers_are_not_skipped():
+    program, optimized = optimize('RIGHT\nRIGHT\n\nGOTO 1', barriers={2, 3})
+    assert optimized.at(1) == (('turn', 1, 2), (1,))
+    assert optimized.at(2) == (('turn', 1, 3), (1,))
+    assert optimized.at(4) == (('goto', 1), (1,))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_costs_match_the_original_code(seed):
+    rng = random.Random(seed)
+    for i in range(300):
+        code = random_code(rng)
+        max_line = code.count('\n')+1
+        barriers = frozenset(rng.sample(range(1, max_line+1), rng.randint(0, min(2, max_line))))
+        program, optimized = optimize(code, barriers)
+        for line in range(1, max_line+1):
+            instruction, costs = optimized.at(line)
+            if instruction[0] in ['wall?', 'exit?']:
+                for branch in range(2):
+                    assert run_original(program, line, costs[branch], branch) == (instruction[1+branch], 0), code
+            elif instruction[0] == 'goto':
+                assert run_original(program, line, costs[0]) == (instruction[1], 0), code
+            elif instruction[0] == 'turn':
+                assert run_original(program, line, costs[0]) == (instruction[2], instruction[1]), code
+            else:
+                assert (instruction, costs) == (peephole.instruction_at(program, line), (1,)), code
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import algotaurus
+import generators
+
+dir_vectors = [(0, 1), (1, 0), (0, -1), (-1, 0)]  # right, down, left, up
+
+
+@pytest.mark.parametrize('labyr_type', range(len(algotaurus.labyr_type_names)))
+def test_sensor_tables_match_the_labyrinth(labyr_type):
+    labyr = generators.labyrinth(15, 13, labyr_type)
+    lab = algotaurus.Labyrinth.from_array(labyr)
+    rows, cols = np.nonzero(labyr[2:-2, 2:-2] == 0)
+    for row, col in zip(rows+2, cols+2):
+        for direction, (drow, dcol) in enumerate(dir_vectors):
+            robot = algotaurus.Robot(lab, (row*labyr.shape[1] + col, direction))
+            ahead = labyr[row+drow, col+dcol]
+            assert robot.wall() == (ahead == 1)
+            assert robot.robot_exit() == (ahead == 2)
+
+
+def find_square(labyr, ahead):
+    """returns: (flat index, direction) of a path square, where the square ahead is the ahead code"""
+    for row, col in np.argwhere(labyr == 0):
+        for direction, (drow, dcol) in enumerate(dir_vectors):
+            if labyr[row+drow, col+dcol] == ahead:
+                return row*labyr.shape[1] + col, direction
+
+
+def test_commands_move_the_robot_in_the_array():
+    labyr = generators.labyrinth(11, 11, 0)
+    lab = algotaurus.Labyrinth.from_array(labyr)
+    index, direction = find_square(labyr, 0)
+    robot = algotaurus.Robot(lab, (index, direction))
+    assert robot.step() == 'go on'
+    assert robot.index == index + lab.offsets[direction] and robot.moves == 1
+    assert lab.labyr.flat[index] == 0 and lab.labyr.flat[robot.index] == direction+10
+    robot.right()
+    assert robot.dir == (direction+1) % 4 and lab.labyr.flat[robot.index] == robot.dir+10
+    robot.left()
+    robot.left()
+    assert robot.dir == (direction+3) % 4
+
+
+def test_stepping_into_a_wall_and_an_exit():
+    labyr = generators.labyrinth(11, 11, 0)
+    lab = algotaurus.Labyrinth.from_array(labyr)
+    robot = algotaurus.Robot(lab, find_square(labyr, 1))
+    assert robot.wall() and not robot.robot_exit()
+    position = robot.pos
+    assert robot.step() == algotaurus._('Bad news. AlgoTaurus run into wall.')
+    assert robot.pos == position and robot.moves == 0
+    robot = algotaurus.Robot(lab, find_square(labyr, 2))
+    assert robot.robot_exit() and not robot.wall()
+    assert robot.robot_quit() == algotaurus._('Congratulations! AlgoTaurus successfully reached the exit.')
+    assert robot.step() == algotaurus._('Bad news. AlgoTaurus stepped into exit.')
+
+
+def test_from_array_copies_the_labyrinth():
+    labyr = generators.labyrinth(11, 11, 1)
+    original = labyr.copy()
+    lab = algotaurus.Labyrinth.from_array(labyr)
+    algotaurus.Robot(lab, generators.start_pose(labyr))
+    assert (labyr == original).all()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import algotaurus
+import generators
+import runtrace
+
+right_hand = 'RIGHT\nEXIT? 8 3\nWALL? 4 6\nLEFT\nGOTO 2\nSTEP\nGOTO 1\nQUIT'
+
+
+def record_run(code, seed=1, keyframe_interval=16, max_steps=5000):
+    """returns: Trace of the run, list of the states (line, (row, col), dir) after every executed line"""
+    labyrs, starts = generators.generate_labyrinths(1, 15, 15, 1, seed)
+    robot = algotaurus.Robot(algotaurus.Labyrinth.from_array(labyrs[0]), starts[0])
+    recorder = runtrace.TraceRecorder(robot, code, keyframe_interval=keyframe_interval)
+    script = algotaurus.Script(code, robot, max_line=code.count('\n')+1, recorder=recorder)
+    states = [(script.current_line, robot.pos, robot.dir)]
+    result = 'go on'
+    while result == 'go on' and script.steps < max_steps:
+        result = script.execute_command()
+        states.append((script.current_line, robot.pos, robot.dir))
+    return recorder.trace(result), states
+
+
+@pytest.mark.parametrize('value', [0, 1, 127, 128, 300, 2**35])
+def test_varint_round_trip(value):
+    buffer = bytearray()
+    runtrace.write_varint(buffer, value)
+    assert runtrace.read_varint(buffer, 0) == (value, len(buffer))
+
+
+@pytest.mark.parametrize('keyframe_interval', [1, 16, 1024])
+def test_states_replay_the_run(keyframe_interval):
+    trace, states = record_run(right_hand, keyframe_interval=keyframe_interval)
+    assert trace.steps == len(states)-1
+    assert list(trace.states()) == states
+
+
+def test_repeated_events_are_run_length_encoded():
+    # Turning around in place repeats the same event
+    trace, states = record_run('RIGHT\n' * 40 + 'QUIT', keyframe_interval=1024)
+    assert len(trace.events) < 10
+    assert list(trace.states()) == states
+
+
+def test_save_load_round_trip(tmp_path):
+    trace, states = record_run(right_hand)
+    filename = str(tmp_path / 'run.trace')
+    trace.save(filename)
+    loaded = runtrace.Trace.load(filename)
+    assert np.array_equal(loaded.labyr, trace.labyr)
+    assert (loaded.code, loaded.events, loaded.steps, loaded.result) == (trace.code, trace.events, trace.steps,
+                                                                         trace.result)
+    assert np.array_equal(loaded.keyframes, trace.keyframes)
+    assert list(loaded.states()) == states
+
+
+def test_load_rejects_other_files(tmp_path):
+    filename = tmp_path / 'code.lab'
+    filename.write_bytes(b'STEP\nQUIT')
+    with pytest.raises(ValueError):
+        runtrace.Trace.load(str(filename))
+
+
+def test_seek_and_step_the_player():
+    trace, states = record_run(right_hand)
+    player = runtrace.TracePlayer(trace)
+    for step in [0, 1, 15, 16, 17, len(states)//2, len(states)-1, len(states)+10]:
+        player.seek(step)
+        line, pos, direction = states[min(step, len(states)-1)]
+        assert (player.current_line, tuple(player.pos), player.dir) == (line, pos, direction)
+        assert player.labyr[pos] == direction + 10
+    player.seek(5)
+    assert player.forward()
+    assert player.current_line == states[6][0]
+    assert player.back() and player.back()
+    assert (player.step, player.current_line) == (4, states[4][0])
+    player.seek(trace.steps)
+    assert player.finished() and not player.forward()